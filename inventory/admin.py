@@ -1,3 +1,99 @@
+from contextlib import contextmanager
+
 from django.contrib import admin
+from django.db import router, transaction
+
+from . import sites
+from .models import Item, Barcode, Site, StockEvent
+from .stock import lock_stock
+
+
+class StockLockedAdmin(admin.ModelAdmin):
+    """
+    Takes the stock lock before the admin's own transaction reads the object
+    being changed or deleted, as Item.save() does for its own reads.
+    """
+
+    def changeform_view(self, request, *args, **kwargs):
+        with self.locked(request):
+            return super().changeform_view(request, *args, **kwargs)
+
+    def delete_view(self, request, *args, **kwargs):
+        with self.locked(request):
+            return super().delete_view(request, *args, **kwargs)
+
+    @contextmanager
+    def locked(self, request):
+        if request.method != 'POST':
+            yield
+            return
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            lock_stock()
+            yield
+
+
+# Saves and deletes made here go through the model signals, so the stock
+# counters and barcode cache stay current without anything admin-specific.
+# Items, barcodes and the ledger are listed for the site of the host they
+# are served on only; sites themselves are managed by superusers.
+@admin.register(Item)
+class ItemAdmin(StockLockedAdmin):
+    list_display = ['name', 'quantity', 'unit', 'quantity_needed', 'is_open', 'location']
+    search_fields = ['name']
+    # Moving an item to another site would leave its barcodes (and their
+    # copy of the site) behind
+    readonly_fields = ['site']
+
+
+@admin.register(Barcode)
+class BarcodeAdmin(StockLockedAdmin):
+    list_display = ['code', 'item', 'quantity', 'description']
+    list_select_related = ['item']
+    search_fields = ['code']
+    # Always the item's site (see Barcode.save)
+    readonly_fields = ['site']
+
+
+@admin.register(StockEvent)
+class StockEventAdmin(admin.ModelAdmin):
+    """The stock ledger, for auditing: append-only, so nothing here can be edited."""
+    list_display = ['created', 'action', 'item_id', 'quantity', 'quantity_needed', 'is_open']
+    list_filter = ['action']
+    date_hierarchy = 'created'
+
+    def get_queryset(self, request):
+        # Events have no site of their own: go through their items (so the
+        # events of deleted items are no longer listed)
+        queryset = super().get_queryset(request)
+        site_id = sites.active()
+        return queryset if site_id is None else queryset.filter(item__site_id=site_id)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Site)
+class SiteAdmin(admin.ModelAdmin):
+    """Every site at once, whichever host it is served on: for superusers only."""
+    list_display = ['name', 'domain']
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return request.user.is_superuser
+
+    def has_change_permission(self, request, obj=None):
+        return request.user.is_superuser
 
-# Register your models here.
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
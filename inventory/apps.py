@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "inventory"
+
+    def ready(self):
+        # Connect the cache invalidation receivers and the database connection setup
+        from . import metrics, signals, sqlite  # noqa: F401
@@ -0,0 +1,103 @@
+# inventory/async_views.py
+"""
+Async versions of the busiest views in views.py, routed instead of them when
+ASYNC_VIEWS is on (for ASGI deployments). Reads use the async ORM and the
+barcode cache's aresolve(), so a worker's event loop can keep many scanner
+stations in flight. A scan's write still runs in a thread: the stock
+updates depend on transaction.atomic(), which has no async counterpart.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from . import counters
+from .barcode_cache import barcode_cache
+from .feed import change_feed
+from .forms import BarcodeScanForm
+from .models import Item
+from .pagination import akeyset_paginate
+from .replica import lag, replica_reads
+from .stock import apply_scan
+from .views import (
+    FEED_LISTS, changed_rows, feed_request, list_validators, not_modified, recent_scans, render_page, report_scan,
+    rescan, set_validators,
+)
+
+
+async def arender_list(request, queryset, key, rows_name, template, rows_template, context):
+    page = await akeyset_paginate(request, queryset, key)
+    return render_page(request, page, rows_name, template, rows_template, context)
+
+
+@replica_reads
+async def inventory_list(request):
+    values = await counters.asnapshot()
+    validators = list_validators(request, values, [counters.ITEMS_VERSION])
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    context = {
+        'page_title': 'Items in Inventory',
+        'list_type': 'inventory',
+        'feed_cursor': change_feed.cursor(lag()),
+        'totals': counters.totals_from(values),
+    }
+    response = await arender_list(request, Item.objects.in_stock().rows(), 'name', 'items',
+                                  'inventory/item_list.html', 'inventory/item_rows.html', context)
+    return set_validators(response, validators)
+
+
+@replica_reads
+async def shopping_list(request):
+    values = await counters.asnapshot()
+    validators = list_validators(request, values, [counters.ITEMS_VERSION])
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    context = {
+        'page_title': 'Shopping List',
+        'list_type': 'shopping',
+        'feed_cursor': change_feed.cursor(lag()),
+        'totals': counters.totals_from(values),
+    }
+    response = await arender_list(request, Item.objects.needed().rows(), 'name', 'items',
+                                  'inventory/item_list.html', 'inventory/item_rows.html', context)
+    return set_validators(response, validators)
+
+
+async def scan_barcode(request):
+    if request.method == 'POST':
+        form = BarcodeScanForm(request.POST)
+        if form.is_valid():
+            barcode_value = form.cleaned_data['barcode']
+            action = form.cleaned_data['action']
+
+            barcode = await barcode_cache.aresolve(barcode_value)
+            applied = barcode is not None and await sync_to_async(apply_scan)(barcode, action)
+            if barcode is not None and not applied and action != 'remove':
+                barcode, applied = await sync_to_async(rescan)(barcode_value, action)
+            report_scan(request, barcode_value, barcode, action, applied)
+
+            form = BarcodeScanForm(initial={'action': action})
+    else:
+        form = BarcodeScanForm()
+
+    context = {
+        'form': form,
+        # Evaluated here: the template must not query from the event loop
+        'recent_scans': [barcode async for barcode in recent_scans()],
+        'page_title': 'Scan Barcode',
+    }
+    return render(request, 'inventory/scan_barcode.html', context)
+
+
+async def item_changes(request):
+    # Waiting happens on the event loop, so open pages cost no thread each
+    list_type, timeout = feed_request(request)
+    cursor, item_ids = await change_feed.await_changes(request.GET.get('cursor'), timeout)
+    if item_ids is None:
+        return JsonResponse({'cursor': cursor, 'reset': True})
+    if not item_ids:
+        return JsonResponse({'cursor': cursor, 'rows': {}})
+    items = [item async for item in FEED_LISTS[list_type]().filter(pk__in=item_ids)]
+    return changed_rows(request, list_type, cursor, item_ids, items, await counters.atotals())
@@ -0,0 +1,185 @@
+# inventory/barcode_cache.py
+"""
+Caches what a scan needs to know about a barcode (which item, pack size, unit,
+location) so the scan path does not have to look it up on every request.
+
+By default every process keeps its own bounded LRU. Set BARCODE_CACHE_ALIAS to
+the name of an entry in CACHES to share the entries between worker processes
+instead; invalidation then reaches every worker through that backend.
+Only fields that change through model saves are cached (never stock levels),
+so the post_save/post_delete receivers in inventory/signals.py keep it exact.
+Entries are dropped again when the invalidating transaction commits, as a
+scan in between still reads (and caches) the old row.
+Codes are unique per site only (inventory/sites.py), so entries are keyed by
+site and code, and lookups are made in the current site.
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import sites
+
+BarcodeInfo = namedtuple('BarcodeInfo', ['code', 'barcode_id', 'item_id', 'quantity', 'name', 'unit', 'location',
+                                         'site_id'])
+
+# Columns loaded for a BarcodeInfo, in field order
+INFO_FIELDS = ('code', 'id', 'item_id', 'quantity', 'item__name', 'item__unit', 'item__location', 'site_id')
+
+
+class BarcodeCache:
+    def __init__(self, max_size=10000, alias=None, warm=True):
+        self.max_size = max_size
+        self.alias = alias or None
+        self.warm_on_first_use = warm
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Sites warmed so far
+        self._warmed = set()
+
+    # --- Storage (local LRU or a shared Django cache) ---
+
+    @property
+    def backend(self):
+        return caches[self.alias] if self.alias else None
+
+    def _key(self, site_id, code):
+        # Barcodes can contain characters memcached-style backends reject
+        return f'inventory:barcode:{site_id}:' + hashlib.md5(code.encode()).hexdigest()
+
+    def _get(self, site_id, code):
+        if self.backend is not None:
+            return self.backend.get(self._key(site_id, code))
+        with self._lock:
+            info = self._entries.get((site_id, code))
+            if info is not None:
+                self._entries.move_to_end((site_id, code))
+            return info
+
+    def _set_many(self, infos):
+        if self.backend is not None:
+            self.backend.set_many({self._key(info.site_id, info.code): info for info in infos}, timeout=None)
+            return
+        with self._lock:
+            for info in infos:
+                self._entries[info.site_id, info.code] = info
+                self._entries.move_to_end((info.site_id, info.code))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _forget(self, keys):
+        """Drops the entries of (site id, code) `keys`, now and again once the current transaction commits."""
+        self._drop(keys)
+        # Until then a scan missing the cache reads the old committed row and
+        # would keep it cached
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: self._drop(keys))
+
+    def _drop(self, keys):
+        if self.backend is not None:
+            self.backend.delete_many([self._key(site_id, code) for site_id, code in keys])
+            return
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    # --- Public API ---
+
+    def resolve(self, code):
+        """Returns the BarcodeInfo for `code` in the current site, or None if no such barcode exists."""
+        site_id = sites.current()
+        if site_id not in self._warmed and self.warm_on_first_use:
+            self.warm(site_id)
+
+        info = self._get(site_id, code)
+        if info is not None:
+            self.hits += 1
+            return info
+
+        self.misses += 1
+        from .models import Barcode
+        row = Barcode.objects.filter(site_id=site_id, code=code).values_list(*INFO_FIELDS).first()
+        if row is None:
+            return None
+        info = BarcodeInfo(*row)
+        self._set_many([info])
+        return info
+
+    async def aresolve(self, code):
+        """Async resolve(): a hit never leaves the event loop, a miss uses the async ORM."""
+        site_id = sites.current()
+        if site_id not in self._warmed and self.warm_on_first_use:
+            await sync_to_async(self.warm)(site_id)
+
+        if self.backend is not None:
+            info = await self.backend.aget(self._key(site_id, code))
+        else:
+            info = self._get(site_id, code)
+        if info is not None:
+            self.hits += 1
+            return info
+
+        self.misses += 1
+        from .models import Barcode
+        row = await Barcode.objects.filter(site_id=site_id, code=code).values_list(*INFO_FIELDS).afirst()
+        if row is None:
+            return None
+        info = BarcodeInfo(*row)
+        if self.backend is not None:
+            await self.backend.aset(self._key(site_id, code), info, timeout=None)
+        else:
+            self._set_many([info])
+        return info
+
+    def warm(self, site_id=None):
+        """Preloads up to max_size barcodes of a site (default: the current one) with a single query."""
+        from .models import Barcode
+        site_id = sites.current() if site_id is None else site_id
+        self._warmed.add(site_id)
+        rows = Barcode.objects.filter(site_id=site_id).order_by('-id').values_list(*INFO_FIELDS)[:self.max_size]
+        self._set_many([BarcodeInfo(*row) for row in rows])
+
+    def invalidate(self, site_id, *codes):
+        self._forget([(site_id, code) for code in codes])
+
+    def invalidate_item(self, item_id):
+        """Drops every barcode pointing at `item_id` (its name, unit or location may have changed)."""
+        self.invalidate_items([item_id])
+
+    def invalidate_items(self, item_ids):
+        if self.backend is None and not self._entries:
+            return
+        from .models import Barcode
+        self._forget(list(Barcode.objects.filter(item_id__in=item_ids).values_list('site_id', 'code')))
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+        with self._lock:
+            self._entries.clear()
+        self.hits = self.misses = 0
+        self._warmed = set()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.alias or 'local',
+            'size': len(self._entries) if self.backend is None else None,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+        }
+
+
+barcode_cache = BarcodeCache(
+    max_size=getattr(settings, 'BARCODE_CACHE_SIZE', 10000),
+    alias=getattr(settings, 'BARCODE_CACHE_ALIAS', None),
+    warm=getattr(settings, 'BARCODE_CACHE_WARM', True),
+)
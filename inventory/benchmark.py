@@ -0,0 +1,414 @@
+# inventory/benchmark.py
+"""
+Load-testing harness behind `manage.py benchmark`.
+
+seed_catalog() fills the database with a synthetic catalog. Each scenario in
+SCENARIOS turns the catalog into a request against one of the inventory URLs;
+the requests are prepared (and any rows they need created) before timing
+starts, then replayed by one of the runners:
+
+- run_client: one at a time through the Django test client, counting queries
+- run_wsgi: concurrent HTTP requests against a threaded WSGI server
+- run_asgi: concurrent requests through the ASGI handler (AsyncClient)
+
+Each runner returns {scenario: summary} with latency percentiles, requests/s
+and (for run_client) queries per request.
+"""
+import asyncio
+import http.client
+import json
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.test.testcases import LiveServerThread
+from django.urls import reverse
+
+from . import counters, ledger, search, sites
+from .barcode_cache import barcode_cache
+from .feed import change_feed
+from .models import Item, Barcode
+
+LOCATIONS = ['Pantry', 'Fridge', 'Freezer', 'Spice rack', 'Cellar', None]
+UNITS = ['kg', 'g', 'l', 'can', 'box', None]
+
+# Any well-formed token passes the CSRF check when the cookie matches the header
+CSRF_TOKEN = 'benchmarkbenchmarkbenchmarkbench'
+
+# Sent with every request, for the scan batch API (see SCAN_API_TOKENS)
+SCAN_API_TOKEN = 'benchmark-scan-token'
+AUTH_HEADERS = {'Authorization': f'Bearer {SCAN_API_TOKEN}'}
+
+Request = namedtuple('Request', ['method', 'path', 'data', 'content_type'])
+
+
+def seed_catalog(items, barcodes_per_item=1, batch_size=5000, seed=0):
+    """Creates `items` items and about barcodes_per_item barcodes for each, in bulk."""
+    rng = random.Random(seed)
+    for start in range(0, items, batch_size):
+        created = Item.objects.bulk_create(
+            Item(
+                name=f'Item {number:07d}',
+                quantity=Decimal(rng.choice([0, 0, 1, 2, 3, 5, 10])),
+                unit=rng.choice(UNITS),
+                quantity_needed=Decimal(rng.choice([0, 0, 0, 0, 1, 2])),
+                is_open=rng.random() < 0.1,
+                location=rng.choice(LOCATIONS),
+            )
+            for number in range(start + 1, min(start + batch_size, items) + 1)
+        )
+        Barcode.objects.bulk_create(
+            Barcode(code=f'{item.pk:07d}-{copy}', item=item, quantity=Decimal(rng.choice([1, 1, 2, 6, 12])))
+            for item in created
+            for copy in range(barcodes_per_item)
+        )
+    # bulk_create bypasses the signals that keep these up to date
+    counters.rebuild()
+    barcode_cache.clear()
+    search.rebuild()
+    # The seeded stock starts the ledger instead of a million creation events
+    ledger.take_snapshot()
+    return Catalog(rng)
+
+
+class Catalog:
+    """Picks random existing rows (and makes fresh ones) for the scenarios."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.item_ids = list(Item.objects.values_list('pk', flat=True))
+        self.barcodes = list(Barcode.objects.values_list('pk', 'code'))
+        self.serial = 0
+
+    def item_id(self):
+        return self.rng.choice(self.item_ids)
+
+    def barcode_id(self):
+        return self.rng.choice(self.barcodes)[0]
+
+    def code(self):
+        return self.rng.choice(self.barcodes)[1]
+
+    def new_name(self, prefix):
+        self.serial += 1
+        return f'{prefix} {self.serial:07d}'
+
+
+def get(name, *args, query=None):
+    path = reverse(f'inventory:{name}', args=args)
+    return Request('GET', f'{path}?{urlencode(query)}' if query else path, None, None)
+
+
+def post(name, *args, data=None):
+    return Request('POST', reverse(f'inventory:{name}', args=args), data or {}, None)
+
+
+def edit_item(catalog):
+    item = Item.objects.get(pk=catalog.item_id())
+    data = {
+        'name': item.name, 'quantity': item.quantity + 1, 'unit': item.unit or '',
+        'quantity_needed': item.quantity_needed, 'location': item.location or '',
+    }
+    if item.is_open:
+        data['is_open'] = 'on'
+    return post('edit_item', item.pk, data=data)
+
+
+def scan(catalog, action):
+    return post('scan_barcode', data={'barcode': catalog.code(), 'action': action})
+
+
+def scan_batch(catalog, size=25):
+    events = [{'code': catalog.code(), 'action': catalog.rng.choice(['add', 'remove', 'open'])} for _ in range(size)]
+    return Request('POST', reverse('inventory:scan_batch'), json.dumps({'events': events}), 'application/json')
+
+
+def scan_sync(catalog, size=25):
+    """A flush of the scan page's offline queue: `size` scans, each with a new key."""
+    scanned = time.time()
+    scans = [
+        {'key': str(uuid.UUID(int=catalog.rng.getrandbits(128))), 'code': catalog.code(), 'action': catalog.rng.choice(['add', 'remove', 'open']),
+         'scanned': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(scanned + n))}
+        for n in range(size)
+    ]
+    return Request('POST', reverse('inventory:scan_sync'), json.dumps({'scans': scans}), 'application/json')
+
+
+def fresh_item(catalog):
+    return Item.objects.create(name=catalog.new_name('Doomed')).pk
+
+
+def fresh_barcode(catalog):
+    return Barcode.objects.create(code=catalog.new_name('doomed'), item_id=catalog.item_id()).pk
+
+
+def edit_barcode(catalog):
+    barcode = Barcode.objects.get(pk=catalog.barcode_id())
+    return post('edit_barcode', barcode.pk, data={
+        'code': barcode.code, 'item': barcode.item_id, 'quantity': barcode.quantity,
+        'description': barcode.description or '',
+    })
+
+
+def item_changes(catalog):
+    # The async view would hold the request for FEED_TIMEOUT without the timeout
+    return get('item_changes', query={'list': 'inventory', 'cursor': change_feed.cursor(), 'timeout': 0})
+
+
+def bulk_purchase(catalog, size=10):
+    items = {catalog.item_id() for _ in range(size)}
+    return post('bulk_action', data={'action': 'purchase', 'items': sorted(items), 'list_type': 'shopping'})
+
+
+# Scenario name -> (request factory taking the catalog, needs a staff login).
+# Together they cover every URL in inventory/urls.py, plus /metrics.
+SCENARIOS = {
+    'inventory_list': (lambda c: get('inventory_list'), False),
+    'inventory_list_next_page': (
+        lambda c: get('inventory_list', query={'after': f'Item {c.rng.randint(1, len(c.item_ids)):07d}', 'partial': 1}),
+        False),
+    'shopping_list': (lambda c: get('shopping_list'), False),
+    'item_changes': (item_changes, False),
+    'search': (lambda c: get('search', query={'q': f'item {c.rng.randint(1, 9)}'}), False),
+    'search_typeahead': (lambda c: get('search', query={'q': f'item {c.rng.randint(1, 9)}', 'typeahead': 1}), False),
+    'barcode_list': (lambda c: get('barcode_list'), False),
+    'add_item_form': (lambda c: get('add_item'), False),
+    'add_item': (lambda c: post('add_item', data={
+        'name': c.new_name('New'), 'quantity': 1, 'unit': 'box', 'quantity_needed': 0, 'location': 'Pantry'}), False),
+    'edit_item_form': (lambda c: get('edit_item', c.item_id()), False),
+    'edit_item': (edit_item, False),
+    'delete_item': (lambda c: post('delete_item', fresh_item(c)), False),
+    'add_to_shopping_form': (lambda c: get('add_to_shopping_list', c.item_id()), False),
+    'add_to_shopping': (lambda c: post('add_to_shopping_list', c.item_id(), data={'quantity_needed': 1}), False),
+    'remove_from_shopping': (lambda c: post('remove_from_shopping_list', c.item_id()), False),
+    'update_stock_form': (lambda c: get('update_stock', c.item_id()), False),
+    'update_stock': (lambda c: post('update_stock', c.item_id(), data={'quantity': 3, 'location': 'Pantry'}), False),
+    'purchase_form': (lambda c: get('mark_purchased', c.item_id()), False),
+    'purchase': (lambda c: post('mark_purchased', c.item_id(), data={'quantity_purchased': 1}), False),
+    'toggle_open': (lambda c: post('toggle_open', c.item_id()), False),
+    'bulk_purchase': (bulk_purchase, False),
+    'barcode_add_form': (lambda c: get('add_barcode'), False),
+    'barcode_add': (lambda c: post('add_barcode', data={
+        'code': c.new_name('new'), 'item': c.item_id(), 'quantity': 1, 'description': ''}), False),
+    'barcode_edit_form': (lambda c: get('edit_barcode', c.barcode_id()), False),
+    'barcode_edit': (edit_barcode, False),
+    'barcode_delete': (lambda c: post('delete_barcode', fresh_barcode(c)), False),
+    'scan_form': (lambda c: get('scan_barcode'), False),
+    'scan_add': (lambda c: scan(c, 'add'), False),
+    'scan_remove': (lambda c: scan(c, 'remove'), False),
+    'scan_open': (lambda c: scan(c, 'open'), False),
+    'scan_batch': (scan_batch, False),
+    'scan_sync': (scan_sync, False),
+    'barcode_cache_stats': (lambda c: get('barcode_cache_stats'), True),
+    'export_shopping_csv': (lambda c: get('export', 'shopping', 'csv'), False),
+    'request_metrics': (lambda c: Request('GET', reverse('metrics'), None, None), True),
+}
+
+
+def prepare_requests(catalog, names, count):
+    """Builds `count` requests for each named scenario, before any timing starts."""
+    return {name: [SCENARIOS[name][0](catalog) for _ in range(count)] for name in names}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(times, errors, elapsed, queries=None):
+    times = sorted(times)
+    summary = {
+        'requests': len(times),
+        'errors': errors,
+        'p50_ms': round(percentile(times, 0.50) * 1000, 3) if times else None,
+        'p95_ms': round(percentile(times, 0.95) * 1000, 3) if times else None,
+        'p99_ms': round(percentile(times, 0.99) * 1000, 3) if times else None,
+        'requests_per_s': round(len(times) / elapsed, 1) if elapsed else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+    return summary
+
+
+def is_error(status):
+    return status >= 400
+
+
+# --- Runners ---
+
+class BenchmarkWSGIServer(ThreadedWSGIServer):
+    # Room for every client to connect at once (the default backlog is 10)
+    request_queue_size = 1024
+
+
+class BenchmarkServerThread(LiveServerThread):
+    server_class = BenchmarkWSGIServer
+
+
+def run_client(requests, staff_user=None):
+    """Replays each scenario's requests in order through the test client, counting queries."""
+    client = Client(headers=AUTH_HEADERS)
+    staff_client = Client(headers=AUTH_HEADERS)
+    if staff_user is not None:
+        staff_client.force_login(staff_user)
+    # Loaded once per process, so not counted against the first request
+    sites.domains.site_for('testserver')
+
+    results = {}
+    for name, batch in requests.items():
+        use = staff_client if SCENARIOS[name][1] else client
+        times, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for request in batch:
+            executed = []
+            with connection.execute_wrapper(lambda execute, sql, *args: executed.append(sql) or execute(sql, *args)):
+                begin = time.perf_counter()
+                response = send_client(use, request)
+                times.append(time.perf_counter() - begin)
+            queries.append(len(executed))
+            errors += is_error(response.status_code)
+            # Flash messages would otherwise pile up and spill into the session
+            use.cookies.pop('messages', None)
+        results[name] = summarize(times, errors, time.perf_counter() - started, queries)
+    return results
+
+
+def send_client(client, request):
+    if request.method == 'GET':
+        response = client.get(request.path)
+    elif request.content_type:
+        response = client.post(request.path, request.data, content_type=request.content_type)
+    else:
+        response = client.post(request.path, request.data)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def run_wsgi(requests, concurrency, staff_user=None):
+    """Sends each scenario's requests from `concurrency` threads to a threaded WSGI server."""
+    server = BenchmarkServerThread('127.0.0.1', lambda handler: handler)
+    server.daemon = True
+    server.start()
+    server.is_ready.wait()
+    if server.error:
+        raise server.error
+
+    cookies = f'csrftoken={CSRF_TOKEN}'
+    staff_cookies = cookies
+    if staff_user is not None:
+        login = Client()
+        login.force_login(staff_user)
+        staff_cookies += f"; sessionid={login.cookies['sessionid'].value}"
+
+    def send(request, staff):
+        body = request.data
+        headers = {'Cookie': staff_cookies if staff else cookies, 'X-CSRFToken': CSRF_TOKEN, **AUTH_HEADERS}
+        if request.method == 'POST' and not request.content_type:
+            body = urlencode(body, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif request.content_type:
+            headers['Content-Type'] = request.content_type
+        conn = http.client.HTTPConnection('127.0.0.1', server.port)
+        try:
+            conn.request(request.method, request.path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    try:
+        return {
+            name: run_threads(batch, concurrency, lambda request: send(request, SCENARIOS[name][1]))
+            for name, batch in requests.items()
+        }
+    finally:
+        server.terminate()
+
+
+def run_threads(batch, concurrency, send):
+    pending = list(batch)
+    lock = threading.Lock()
+    times, errors = [], [0]
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                request = pending.pop()
+            begin = time.perf_counter()
+            try:
+                failed = is_error(send(request))
+            except OSError:
+                failed = True
+            elapsed = time.perf_counter() - begin
+            with lock:
+                times.append(elapsed)
+                errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(times, errors[0], time.perf_counter() - started)
+
+
+def run_asgi(requests, concurrency, staff_user=None):
+    """Runs each scenario's requests through the ASGI handler with `concurrency` tasks in flight."""
+    client = AsyncClient(headers=AUTH_HEADERS)
+    staff_client = AsyncClient(headers=AUTH_HEADERS)
+    if staff_user is not None:
+        login = Client()
+        login.force_login(staff_user)
+        staff_client.cookies = login.cookies
+
+    async def send(use, request):
+        if request.method == 'GET':
+            response = await use.get(request.path)
+        elif request.content_type:
+            response = await use.post(request.path, request.data, content_type=request.content_type)
+        else:
+            response = await use.post(request.path, request.data)
+        if response.streaming:
+            if response.is_async:
+                async for chunk in response.streaming_content:
+                    pass
+            else:
+                await sync_to_async(b''.join)(response.streaming_content)
+        use.cookies.pop('messages', None)
+        return response.status_code
+
+    async def run(name, batch):
+        use = staff_client if SCENARIOS[name][1] else client
+        pending = list(batch)
+        times, errors = [], 0
+
+        async def worker():
+            nonlocal errors
+            while pending:
+                request = pending.pop()
+                begin = time.perf_counter()
+                errors += is_error(await send(use, request))
+                times.append(time.perf_counter() - begin)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(times, errors, time.perf_counter() - started)
+
+    async def run_all():
+        return {name: await run(name, batch) for name, batch in requests.items()}
+
+    return asyncio.run(run_all())
@@ -0,0 +1,200 @@
+# inventory/counters.py
+"""
+Headline totals for the inventory page (items in stock, on the shopping list,
+open, in stock per location), stored as StockCounter rows.
+
+Every stock write reports the before/after state of the items it touched
+through the stock_changed signal; the receiver in inventory/signals.py turns
+that into +1/-1 deltas here. Reading the totals is a single query against a
+handful of rows no matter how many items there are. `manage.py
+rebuild_counters` recomputes them from scratch if they ever drift.
+
+Each site (inventory/sites.py) has its own counters and versions, stored
+under "site:<id>:<key>" and read by key range; the functions taking keys
+here take them without that prefix, for the current site unless told
+otherwise. Only CHANGES is global.
+"""
+import time
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Count, F, Q, Value, When
+from django.db.models.functions import Greatest
+
+from . import sites
+from .models import Item, StockCounter
+
+IN_STOCK = 'in_stock'
+NEEDED = 'needed'
+OPEN = 'open'
+LOCATION_PREFIX = 'location:'
+# Number of stock transactions; bumped first by stock.lock_stock()
+CHANGES = 'changes'
+# Versions of the item and barcode tables, for conditional GETs of the lists.
+# Every write moves them to max(value + 1, now in microseconds), so they only
+# ever grow and also tell when the table last changed.
+ITEMS_VERSION = 'version:items'
+BARCODES_VERSION = 'version:barcodes'
+VERSIONS = (ITEMS_VERSION, BARCODES_VERSION)
+
+
+def site_key(key, site_id=None):
+    return f'site:{sites.current() if site_id is None else site_id}:{key}'
+
+
+def site_keys(site_id=None):
+    """The key range holding a site's counters, as StockCounter filter arguments."""
+    prefix = site_key('', site_id)
+    # ';' follows ':', so this is a range scan of the primary key
+    return {'key__gte': prefix, 'key__lt': prefix[:-1] + ';'}
+
+
+def state_keys(state):
+    """The counter keys an item in `state` (a stock_state dict, or None) adds 1 to."""
+    if state is None:
+        return []
+    keys = []
+    if state['quantity'] > 0 or state['is_open']:
+        keys += [IN_STOCK, LOCATION_PREFIX + (state['location'] or '')]
+    if state['quantity_needed'] > 0:
+        keys.append(NEEDED)
+    if state['is_open']:
+        keys.append(OPEN)
+    return [site_key(key, state['site_id']) for key in keys]
+
+
+def increment(deltas, touch=()):
+    """
+    Adds {key: delta} to the counters and advances the `touch` version keys,
+    with one UPDATE, creating missing rows. Keys are complete (site_key()).
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas and not touch:
+        return
+    now = version_now()
+    whens = [When(key=key, then=F('value') + delta) for key, delta in deltas.items()]
+    whens += [When(key=key, then=Greatest(F('value') + 1, Value(now))) for key in touch]
+    keys = [*deltas, *touch]
+    updated = StockCounter.objects.filter(key__in=keys).update(
+        value=Case(*whens, default=F('value'), output_field=BigIntegerField())
+    )
+    if updated < len(keys):
+        existing = set(StockCounter.objects.filter(key__in=keys).values_list('key', flat=True))
+        StockCounter.objects.bulk_create(
+            [StockCounter(key=key, value=delta) for key, delta in deltas.items() if key not in existing]
+            + [StockCounter(key=key, value=now) for key in touch if key not in existing]
+        )
+
+
+def touch(*keys, site_id=None):
+    """Marks the tables behind the version `keys` as changed, for one site."""
+    increment({}, touch=[site_key(key, site_id) for key in keys])
+
+
+def version_now():
+    return int(time.time() * 1_000_000)
+
+
+def apply_changes(changes, touch=()):
+    """Applies a list of (before, after) item states to the counters, touching `touch` for every site involved."""
+    deltas = Counter()
+    site_ids = set()
+    for before, after in changes:
+        deltas.subtract(state_keys(before))
+        deltas.update(state_keys(after))
+        site_ids.add((before or after)['site_id'])
+    increment(deltas, [site_key(key, site_id) for site_id in sorted(site_ids) for key in touch])
+
+
+def unprefixed(rows):
+    """{key: value} of a site's counter rows, without the site prefix."""
+    return {key.split(':', 2)[2]: value for key, value in rows}
+
+
+def snapshot(site_id=None):
+    """Every counter of a site as {key: value}, in one query."""
+    return unprefixed(StockCounter.objects.filter(**site_keys(site_id)).values_list('key', 'value'))
+
+
+async def asnapshot(site_id=None):
+    return unprefixed([row async for row in StockCounter.objects.filter(**site_keys(site_id)).values_list('key', 'value')])
+
+
+def versions(*keys, site_id=None):
+    """Just the version counters `keys` of a site, as {key: value}."""
+    return unprefixed(StockCounter.objects.filter(key__in=[site_key(key, site_id) for key in keys])
+                      .values_list('key', 'value'))
+
+
+def totals(site_id=None):
+    """The current totals, read from the counter rows only."""
+    return totals_from(snapshot(site_id))
+
+
+async def atotals(site_id=None):
+    """Async totals()."""
+    return totals_from(await asnapshot(site_id))
+
+
+def totals_from(values):
+    locations = sorted(
+        (key[len(LOCATION_PREFIX):], value)
+        for key, value in values.items()
+        if key.startswith(LOCATION_PREFIX) and value
+    )
+    return {
+        'in_stock': values.get(IN_STOCK, 0),
+        'needed': values.get(NEEDED, 0),
+        'open': values.get(OPEN, 0),
+        'locations': locations,
+    }
+
+
+def compute():
+    """Counts the totals from scratch with aggregate queries over Item (of the active site, or of every site)."""
+    values = {}
+    counts = Item.objects.values('site_id').annotate(
+        in_stock=Count('pk', filter=Q(quantity__gt=0) | Q(is_open=True)),
+        needed=Count('pk', filter=Q(quantity_needed__gt=0)),
+        open=Count('pk', filter=Q(is_open=True)),
+    ).order_by()
+    for row in counts:
+        for key in (IN_STOCK, NEEDED, OPEN):
+            values[site_key(key, row['site_id'])] = row[key]
+    for site_id, location, count in (Item.objects.in_stock().values_list('site_id', 'location')
+                                     .annotate(Count('pk')).order_by()):
+        # NULL and blank locations are both "no location"
+        key = site_key(LOCATION_PREFIX + (location or ''), site_id)
+        values[key] = values.get(key, 0) + count
+    return values
+
+
+def stored_totals():
+    """The stored counters compute() recomputes (all but CHANGES and the versions), of the active site or of all."""
+    if sites.active() is not None:
+        counters = StockCounter.objects.filter(**site_keys())
+    else:
+        counters = StockCounter.objects.filter(key__startswith='site:')
+    for key in VERSIONS:
+        counters = counters.exclude(key__endswith=':' + key)
+    return counters
+
+
+def verify():
+    """Returns {key: (stored, actual)} for every counter that does not match the item table."""
+    actual = compute()
+    stored = dict(stored_totals().values_list('key', 'value'))
+    return {
+        key: (stored.get(key, 0), actual.get(key, 0))
+        for key in stored.keys() | actual.keys()
+        if stored.get(key, 0) != actual.get(key, 0)
+    }
+
+
+def rebuild():
+    """Replaces the stored totals with freshly computed ones."""
+    with transaction.atomic():
+        stored_totals().delete()
+        StockCounter.objects.bulk_create(
+            [StockCounter(key=key, value=value) for key, value in compute().items()]
+        )
@@ -0,0 +1,84 @@
+# inventory/export.py
+"""
+Streaming exports of items and barcodes as CSV or NDJSON.
+
+Rows are read with values_list().iterator(), so neither model instances nor
+the full result set are ever held in memory; the output is produced in
+chunks of CHUNK_SIZE rows while the response is being sent. That is after
+the view has returned, and with it the request's site (inventory/sites.py)
+and replica reads (inventory/replica.py), so the querysets and the database
+they read are chosen when the stream is created, not when it is first read.
+"""
+import csv
+import io
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Item, Barcode
+
+CHUNK_SIZE = 2000
+
+ITEM_COLUMNS = ('id', 'name', 'quantity', 'unit', 'quantity_needed', 'is_open', 'location', 'added_date')
+BARCODE_COLUMNS = ('code', 'item_id', 'item__name', 'quantity', 'description')
+
+# Export name -> (queryset factory, columns). The item exports apply the same
+# filters as the inventory and shopping list views.
+DATASETS = {
+    'items': (lambda: Item.objects.all(), ITEM_COLUMNS),
+    'inventory': (lambda: Item.objects.in_stock(), ITEM_COLUMNS),
+    'shopping': (lambda: Item.objects.needed(), ITEM_COLUMNS),
+    'barcodes': (lambda: Barcode.objects.order_by('code'), BARCODE_COLUMNS),
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def iter_rows(dataset):
+    """Yields the rows of `dataset` as tuples, fetching CHUNK_SIZE rows at a time."""
+    factory, columns = DATASETS[dataset]
+    queryset = factory()
+    return queryset.using(queryset.db).values_list(*columns).iterator(chunk_size=CHUNK_SIZE)
+
+
+def stream_csv(dataset):
+    """The export as an iterator of CSV text, one chunk of rows at a time, header first."""
+    return csv_chunks(DATASETS[dataset][1], iter_rows(dataset))
+
+
+def csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(dataset):
+    """The export as an iterator of newline-delimited JSON objects, one chunk of rows at a time."""
+    return ndjson_chunks(DATASETS[dataset][1], iter_rows(dataset))
+
+
+def ndjson_chunks(columns, rows):
+    encoder = DjangoJSONEncoder()
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(dict(zip(columns, row))))
+        if len(lines) == CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+STREAMS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
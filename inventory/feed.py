@@ -0,0 +1,109 @@
+# inventory/feed.py
+"""
+In-process change feed for the list pages.
+
+Committed item changes are published here (by the receivers in
+inventory/signals.py) as numbered events holding the ids of the items that
+changed. An open list page polls the item_changes view with the cursor it
+was rendered at (a long poll with the async views, which wait on the event
+loop; the sync view answers at once rather than hold a worker thread), gets
+back only the changed rows and patches them in place. No external broker is involved: the feed lives in the memory of the
+server process, so it sees the writes made by that process. Run the site as
+a single (threaded or ASGI) process for live updates; a page whose cursor is
+unknown to the process answering it is told to reload.
+"""
+import asyncio
+import threading
+import time
+import uuid
+from collections import deque
+
+# Events kept for clients that fall behind; older cursors get a reload
+MAX_EVENTS = 1000
+
+
+class ChangeFeed:
+    def __init__(self, max_events=MAX_EVENTS):
+        # Distinguishes this process's cursors from another process's (or a previous run's)
+        self.instance = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.RLock()
+        # (event loop, future) of async waiters
+        self._waiters = set()
+
+    def cursor(self, lag=0):
+        """
+        Cursor for "now": a page rendered after this call has seen every earlier
+        event. With `lag`, for that many seconds ago instead: the page of a
+        reader that far behind (see inventory/replica.py) is sent the changes
+        of those seconds as well.
+        """
+        with self._lock:
+            seq = self.seq
+            since = time.monotonic() - lag
+            for event_seq, event_ids, published in reversed(self._events):
+                if not lag or published <= since:
+                    break
+                seq = event_seq - 1
+        return f'{self.instance}:{seq}'
+
+    def publish(self, item_ids):
+        if not item_ids:
+            return
+        with self._lock:
+            self.seq += 1
+            self._events.append((self.seq, frozenset(item_ids), time.monotonic()))
+            waiters = list(self._waiters)
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def changes_since(self, cursor):
+        """
+        Returns (new cursor, ids of the items changed after `cursor`), with None
+        instead of the ids if the changes since then are not all known here.
+        """
+        seq = self._parse(cursor)
+        with self._lock:
+            oldest = self._events[0][0] if self._events else self.seq + 1
+            if seq is None or seq > self.seq or seq < oldest - 1:
+                return self.cursor(), None
+            item_ids = set()
+            for event_seq, event_ids, published in reversed(self._events):
+                if event_seq <= seq:
+                    break
+                item_ids |= event_ids
+            return self.cursor(), item_ids
+
+    async def await_changes(self, cursor, timeout):
+        """changes_since(), waiting on the event loop up to `timeout` seconds for something to happen first."""
+        seq = self._parse(cursor)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            waiting = self.seq == seq
+            if waiting:
+                self._waiters.add((loop, future))
+        try:
+            if waiting:
+                await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._waiters.discard((loop, future))
+        return self.changes_since(cursor)
+
+    def _parse(self, cursor):
+        instance, _, seq = (cursor or '').partition(':')
+        if instance != self.instance or not seq.isdigit():
+            return None
+        return int(seq)
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,70 @@
+# inventory/fields.py
+"""
+Fixed-point quantity storage.
+
+FixedPointField is a DecimalField stored as a whole number of its smallest
+unit (hundredths, for the two places of every quantity here) in an integer
+column: Python code, forms and the admin still see Decimals, converted only
+on the way into and out of the database. Integer columns are smaller on disk
+than SQLite's NUMERIC values, compare and add without decimal conversions,
+and can be read straight into NumPy int arrays for bulk work (see
+hundredths() and inventory/forecast.py).
+
+Inside SQL expressions the column holds hundredths, so literals combined
+with it must go through the field too: write `quantity(value)` rather than a
+bare Value() or number, which would be taken as hundredths (or rejected as a
+mix of types).
+"""
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import ExpressionWrapper, F, Value
+
+
+class FixedPointField(models.DecimalField):
+    """A Decimal stored as an integer count of 10 ** -decimal_places."""
+
+    @property
+    def scale(self):
+        """Stored integer units per unit of the Decimal value."""
+        return 10 ** self.decimal_places
+
+    def get_internal_type(self):
+        # The column type, and no decimal converters from the backend
+        return 'BigIntegerField'
+
+    def from_stored(self, value):
+        """The Decimal for a stored integer."""
+        return Decimal(value).scaleb(-self.decimal_places)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return self.from_stored(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if hasattr(value, 'as_sql'):
+            return value
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        # Rounded half to even, like DecimalField's own quantizing
+        return round(value.scaleb(self.decimal_places))
+
+    def get_db_prep_save(self, value, connection):
+        return self.get_db_prep_value(value, connection)
+
+
+# Every quantity column's type, for literals and expressions
+QUANTITY = FixedPointField(max_digits=10, decimal_places=2)
+
+
+def quantity(value):
+    """A quantity literal for expressions on quantity columns."""
+    return Value(value, output_field=QUANTITY)
+
+
+def hundredths(name):
+    """The raw integer column behind a FixedPointField, for values()/values_list() without Decimal conversion."""
+    return ExpressionWrapper(F(name), output_field=models.BigIntegerField())
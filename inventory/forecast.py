@@ -0,0 +1,169 @@
+# inventory/forecast.py
+"""
+Consumption forecasts and suggested shopping list quantities.
+
+Every decrease of an item's sealed quantity in the stock ledger (scans,
+batches, edits; deleting the item aside) counts as consumption. The daily
+rate of each item is an exponentially weighted moving average of it, which
+has a closed form: an event `age` days old contributes
+(1 - decay) * decay ** age of its quantity, decay = 0.5 ** (1 / half_life).
+So every item is scored at once with NumPy from one pass over the ledger
+window: weight each event, then sum the weights per item with bincount.
+Items younger than the window have their average divided by the share of
+the weights their history covers (1 - decay ** days), or a new item would
+look barely used.
+
+From the rate, an item should be bought again when its stock is down to
+`lead_days` of use (reorder_on) and then restocked to last `lead_days +
+cover_days` (suggested_needed, in whole units). `manage.py forecast_needs`
+stores the forecasts as ItemForecast rows and, with --apply, raises the
+shopping list to the suggestions with a single UPDATE.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Func, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Item, ItemForecast, StockEvent
+from .signals import stock_changed
+from .stock import lock_stock
+
+HALF_LIFE_DAYS = 14
+LEAD_DAYS = 3
+COVER_DAYS = 14
+# Events older than this many half-lives weigh under 0.1% and are not read
+WINDOW_HALF_LIVES = 10
+# Slower items (under one unit a decade) are left without a forecast
+MIN_DAILY_RATE = 1 / 3650
+
+CHUNK_SIZE = 100000
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+
+class JulianDay(Func):
+    """A datetime as fractional days (Julian day number), so NumPy can read it as a plain float."""
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='julianday', **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template=f'(EXTRACT(EPOCH FROM %(expressions)s) / 86400.0 + {UNIX_EPOCH_JULIAN_DAY})',
+            **extra_context,
+        )
+
+
+def julian_day(moment):
+    return moment.timestamp() / 86400 + UNIX_EPOCH_JULIAN_DAY
+
+
+def read_columns(queryset, *columns):
+    """
+    The numeric columns of a values_list() queryset as float arrays, bypassing
+    the ORM's per-row conversions: quantities come as their stored integer
+    hundredths (see inventory/fields.py), exact in a float64. Name model
+    fields before annotations, the order the SQL selects them in.
+    """
+    sql, params = queryset.values_list(*columns).query.sql_with_params()
+    chunks = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(CHUNK_SIZE):
+            chunks.append(np.array(rows, dtype=np.float64).reshape(-1, len(columns)))
+    table = np.concatenate(chunks) if chunks else np.empty((0, len(columns)))
+    return table.T
+
+
+def score(half_life=HALF_LIFE_DAYS, lead_days=LEAD_DAYS, cover_days=COVER_DAYS, now=None):
+    """
+    Forecasts every item as arrays: (item ids, daily rates, days of stock
+    left, suggested quantities needed), for the items with a rate.
+    """
+    now = now or timezone.now()
+    today = julian_day(now)
+    decay = 0.5 ** (1 / half_life)
+    window = half_life * WINDOW_HALF_LIVES
+    scale = Item._meta.get_field('quantity').scale
+
+    ids, stock, added = read_columns(
+        Item.objects.order_by('id').annotate(added=JulianDay('added_date')), 'id', 'quantity', 'added',
+    )
+    ids, stock = ids.astype(np.int64), stock.astype(np.int64)
+    # Events are appended in time order: reading the window as an id range
+    # scans it in place, where the created index would seek row by row
+    first = (StockEvent.objects.filter(created__gt=now - timedelta(days=window))
+             .order_by('created').values_list('pk', flat=True).first())
+    event_items, change, created = read_columns(
+        StockEvent.objects.filter(pk__gte=first, quantity__lt=0)
+        .exclude(action='delete').annotate(day=JulianDay('created')),
+        'item_id', 'quantity', 'day',
+    ) if first is not None else np.empty((3, 0))
+    used = -change / scale
+
+    # Events of items since deleted fall out here
+    index = np.searchsorted(ids, event_items)
+    index[index == len(ids)] = 0
+    known = ids[index] == event_items if len(ids) else np.zeros(len(event_items), dtype=bool)
+    age = np.clip(today - created[known], 0, None)
+    rate = np.bincount(index[known], weights=(1 - decay) * decay ** age * used[known], minlength=len(ids))
+    history = np.clip(today - added, 1, window)
+    rate /= 1 - decay ** history
+
+    keep = rate >= MIN_DAILY_RATE
+    ids, stock, rate = ids[keep], stock[keep], rate[keep]
+    days_left = stock / scale / rate
+    # The shortfall in whole hundredths, as quantities are stored, then
+    # rounded up to whole units in integers, so float error never adds a unit
+    short = np.round(rate * (lead_days + cover_days) * scale).astype(np.int64) - stock
+    needed = np.clip(-(-short // scale), 0, None)
+    return ids, rate, days_left, needed
+
+
+def run(half_life=HALF_LIFE_DAYS, lead_days=LEAD_DAYS, cover_days=COVER_DAYS, now=None):
+    """Replaces the ItemForecast rows with a fresh forecast of every item; returns how many items have one."""
+    now = now or timezone.now()
+    ids, rate, days_left, needed = score(half_life, lead_days, cover_days, now)
+    # Stored as hundredths, like every quantity
+    suggested = needed * ItemForecast._meta.get_field('suggested_needed').scale
+    start = np.datetime64(timezone.localdate(now), 'D')
+    reorder_on = start + np.floor(np.clip(days_left - lead_days, 0, 36500)).astype('timedelta64[D]')
+
+    table = ItemForecast._meta.db_table
+    computed = connection.ops.adapt_datetimefield_value(now)
+    rows = zip(ids.tolist(), rate.tolist(), reorder_on.astype(str).tolist(), suggested.tolist())
+    with transaction.atomic():
+        ItemForecast.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} (item_id, daily_rate, reorder_on, suggested_needed, computed) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                ((item_id, daily_rate, day, suggested, computed) for item_id, daily_rate, day, suggested in rows),
+            )
+    return len(ids)
+
+
+def apply():
+    """
+    Raises the shopping list of every item to its suggested quantity, where
+    that is more; never lowers what was put there. One UPDATE, reported as
+    a 'forecast' stock change. Returns the number of items raised.
+    """
+    with transaction.atomic():
+        lock_stock()
+        raised = Item.objects.filter(forecast__suggested_needed__gt=F('quantity_needed'))
+        rows = raised.order_by().values(*Item.STATE_FIELDS, 'forecast__suggested_needed')
+        changes = []
+        for row in rows:
+            suggested = row.pop('forecast__suggested_needed')
+            changes.append((row, {**row, 'quantity_needed': suggested}))
+        if not changes:
+            return 0
+        raised.update(quantity_needed=Subquery(
+            ItemForecast.objects.filter(item=OuterRef('pk')).values('suggested_needed')[:1]
+        ))
+        stock_changed.send(sender=Item, action='forecast', changes=changes)
+    return len(changes)
@@ -1,6 +1,8 @@
 # inventory/forms.py
 from django import forms
+from django.core.exceptions import ValidationError
 from .models import Item, Barcode
+from .stock import MAX_BULK_ITEMS
 from django.core.validators import MinValueValidator
 
 class ItemForm(forms.ModelForm):
@@ -26,6 +28,14 @@ class ItemForm(forms.ModelForm):
              'quantity_needed': forms.NumberInput(attrs={'step': '0.01', 'min': '0'})
         }
 
+    def clean_name(self):
+        # Names are unique per site, and the form skips constraints on fields it
+        # does not edit (the site), so the check is made here
+        name = self.cleaned_data['name']
+        if Item.objects.filter(site_id=self.instance.site_id, name=name).exclude(pk=self.instance.pk).exists():
+            raise ValidationError('Item with this Name already exists.')
+        return name
+
 class AddToShoppingListForm(forms.Form):
     """Form to specify how many units are needed."""
     quantity_needed = forms.DecimalField(
@@ -69,6 +79,20 @@ class BarcodeForm(forms.ModelForm):
             'quantity': forms.NumberInput(attrs={'step': '0.01', 'min': '0.01'})
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The item dropdown only needs names (Item.__str__), clean() the item's site
+        self.fields['item'].queryset = Item.objects.only('name', 'site')
+
+    def clean(self):
+        # Codes are unique per site, the site being the item's (see clean_name above)
+        cleaned_data = super().clean()
+        code, item = cleaned_data.get('code'), cleaned_data.get('item')
+        if code and item and (Barcode.objects.filter(site_id=item.site_id, code=code)
+                              .exclude(pk=self.instance.pk).exists()):
+            self.add_error('code', 'Barcode with this Code already exists.')
+        return cleaned_data
+
 class BarcodeScanForm(forms.Form):
     """Form for scanning a barcode."""
     barcode = forms.CharField(
@@ -85,3 +109,38 @@ class BarcodeScanForm(forms.Form):
         initial='add',
         widget=forms.RadioSelect
     )
+
+class ItemIdsField(forms.Field):
+    """The ids of the items ticked on a list page (one `items` value per checkbox)."""
+    widget = forms.MultipleHiddenInput
+    default_error_messages = {
+        'invalid': 'Select items from the list.',
+        'too_many': 'Select at most %(limit)s items at a time.',
+    }
+
+    def __init__(self, *, max_items, **kwargs):
+        self.max_items = max_items
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        try:
+            return list(dict.fromkeys(int(item_id) for item_id in value or []))
+        except (TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid'], code='invalid')
+
+    def validate(self, value):
+        super().validate(value)
+        if len(value) > self.max_items:
+            raise forms.ValidationError(self.error_messages['too_many'], code='too_many',
+                                        params={'limit': self.max_items})
+
+class BulkActionForm(forms.Form):
+    """Form for applying one action to the items selected on a list page."""
+    action = forms.ChoiceField(choices=[
+        ('purchase', 'Mark purchased (needed quantity)'),
+        ('clear', 'Remove from shopping list'),
+        ('move', 'Move to location'),
+        ('delete', 'Delete'),
+    ])
+    items = ItemIdsField(max_items=MAX_BULK_ITEMS, error_messages={'required': 'Select at least one item.'})
+    location = forms.CharField(max_length=100, required=False)
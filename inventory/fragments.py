@@ -0,0 +1,62 @@
+# inventory/fragments.py
+"""
+Cache of the rendered rows of the inventory and shopping lists.
+
+Each row (inventory/item_row.html) is cached under the item id plus a version
+computed from the fields the row shows, so a save, a scan or any other update
+of those fields changes the key and the row is rendered afresh; rows of
+untouched items are joined together from the cache without going through the
+template engine. Rows are cached with a placeholder instead of the CSRF token
+of their forms, filled in per request. ROW_CACHE_ALIAS names the CACHES entry
+used; leave it empty to render every row each time.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.middleware.csrf import get_token
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+ROW_TEMPLATE = 'inventory/item_row.html'
+# What item_row.html shows of an item, besides its id
+ROW_FIELDS = ('name', 'quantity', 'unit', 'quantity_needed', 'is_open', 'location')
+CSRF_PLACEHOLDER = '__inventory_row_csrf_token__'
+
+
+class RowCache:
+    def __init__(self, alias=None):
+        self.alias = alias or None
+
+    @property
+    def backend(self):
+        return caches[self.alias] if self.alias else None
+
+    def key(self, item, list_type):
+        version = hashlib.md5(repr([getattr(item, name) for name in ROW_FIELDS]).encode()).hexdigest()
+        return f'inventory:row:{list_type}:{item.pk}:{version}'
+
+    def render(self, request, items, list_type):
+        """The rows of `items` as one HTML string, rendering only those not cached yet."""
+        items = list(items)
+        keys = [self.key(item, list_type) for item in items]
+        cached = self.backend.get_many(keys) if self.backend is not None and keys else {}
+        missing = {}
+        if len(cached) < len(keys):
+            template = get_template(ROW_TEMPLATE)
+            for key, item in zip(keys, items):
+                if key not in cached:
+                    missing[key] = template.render({'item': item, 'list_type': list_type, 'csrf_token': CSRF_PLACEHOLDER})
+            if self.backend is not None:
+                self.backend.set_many(missing)
+        html = ''.join(cached.get(key) or missing[key] for key in keys)
+        if CSRF_PLACEHOLDER in html:
+            html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+        return mark_safe(html)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+row_cache = RowCache(alias=getattr(settings, 'ROW_CACHE_ALIAS', None))
@@ -0,0 +1,151 @@
+# inventory/ledger.py
+"""
+Append-only stock ledger.
+
+Every stock change reported through stock_changed (the updates in
+inventory/stock.py and Item saves/deletes) is recorded as StockEvent rows, one
+per item, with a single bulk INSERT in the transaction making the change. The
+Item table stays the current state; StockSnapshot rows copy it from time to
+time (`manage.py stock_ledger snapshot`), so the stock as of any moment is the
+last snapshot before it plus the events after that snapshot, and events
+older than a snapshot can be archived and deleted (`stock_ledger compact`).
+"""
+import json
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import counters
+from .fields import hundredths
+from .models import Item, StockCounter, StockEvent, StockSnapshot, StockSnapshotRow
+
+ZERO = Decimal('0')
+EMPTY = {'quantity': ZERO, 'quantity_needed': ZERO, 'is_open': False}
+
+# Columns of an archived event, in NDJSON output
+EVENT_COLUMNS = ('id', 'item_id', 'created', 'action', 'quantity', 'quantity_needed', 'is_open')
+
+CHUNK_SIZE = 5000
+
+
+def event(before, after, action, created):
+    """The StockEvent for one (before, after) change, or None if its stock did not change."""
+    old, new = before or EMPTY, after or EMPTY
+    quantity = Decimal(new['quantity']) - Decimal(old['quantity'])
+    quantity_needed = Decimal(new['quantity_needed']) - Decimal(old['quantity_needed'])
+    is_open = new['is_open'] if before is None or new['is_open'] != old['is_open'] else None
+    if before is not None and after is not None and not quantity and not quantity_needed and is_open is None:
+        return None  # only the location changed
+    return StockEvent(
+        item_id=(before or after)['id'], created=created, action=action,
+        quantity=quantity, quantity_needed=quantity_needed, is_open=is_open,
+    )
+
+
+def record(changes, action):
+    """Appends the events for a list of (before, after) stock states."""
+    now = timezone.now()
+    events = [event(before, after, action, now) for before, after in changes]
+    StockEvent.objects.bulk_create([e for e in events if e is not None])
+
+
+def take_snapshot():
+    """Copies the current stock of every item into a new StockSnapshot."""
+    with transaction.atomic():
+        # On SQLite this first write takes the database lock; elsewhere the
+        # counter row lock holds off stock transactions (see stock.lock_stock)
+        snapshot = StockSnapshot.objects.create()
+        list(StockCounter.objects.select_for_update().filter(key=counters.CHANGES))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {StockSnapshotRow._meta.db_table} "
+                "(snapshot_id, item_id, quantity, quantity_needed, is_open) "
+                f"SELECT %s, id, quantity, quantity_needed, is_open FROM {Item._meta.db_table}",
+                [snapshot.pk],
+            )
+        snapshot.last_event_id = StockEvent.objects.aggregate(last=Max('id'))['last'] or 0
+        snapshot.save(update_fields=['last_event_id'])
+    return snapshot
+
+
+def state_at(when=None, item_ids=None):
+    """
+    The stock as of `when` (default: now) as {item id: {'quantity', 'quantity_needed',
+    'is_open'}}, for every item or just `item_ids`: the last snapshot taken by
+    then, plus the events recorded after it up to `when`.
+    """
+    snapshots = StockSnapshot.objects.order_by('-taken', '-pk')
+    if when is not None:
+        snapshots = snapshots.filter(taken__lte=when)
+    snapshot = snapshots.first()
+    if snapshot is None:
+        raise ValueError(f"No stock snapshot as old as {when}; that history was compacted away")
+
+    rows = snapshot.rows.all()
+    events = StockEvent.objects.filter(pk__gt=snapshot.last_event_id).order_by('pk')
+    if when is not None:
+        events = events.filter(created__lte=when)
+    if item_ids is not None:
+        rows = rows.filter(item_id__in=item_ids)
+        events = events.filter(item_id__in=item_ids)
+
+    # Summed as the stored integer hundredths, made Decimals once at the end
+    quantities = (hundredths('quantity'), hundredths('quantity_needed'))
+    state = {
+        item_id: {'quantity': quantity, 'quantity_needed': quantity_needed, 'is_open': is_open}
+        for item_id, quantity, quantity_needed, is_open
+        in rows.values_list('item_id', *quantities, 'is_open').iterator(chunk_size=CHUNK_SIZE)
+    }
+    columns = ('item_id', 'action', *quantities, 'is_open')
+    for item_id, action, quantity, quantity_needed, is_open in events.values_list(*columns).iterator(chunk_size=CHUNK_SIZE):
+        if action == 'delete':
+            state.pop(item_id, None)
+            continue
+        item = state.setdefault(item_id, {'quantity': 0, 'quantity_needed': 0, 'is_open': False})
+        item['quantity'] += quantity
+        item['quantity_needed'] += quantity_needed
+        if is_open is not None:
+            item['is_open'] = is_open
+    to_decimal = StockEvent._meta.get_field('quantity').from_stored
+    for item in state.values():
+        item['quantity'] = to_decimal(item['quantity'])
+        item['quantity_needed'] = to_decimal(item['quantity_needed'])
+    return state
+
+
+def verify():
+    """Returns {item id: (current, replayed)} for every item whose stock does not match its ledger."""
+    replayed = state_at()
+    current = {
+        item_id: {'quantity': quantity, 'quantity_needed': quantity_needed, 'is_open': is_open}
+        for item_id, quantity, quantity_needed, is_open
+        in Item.objects.values_list('id', 'quantity', 'quantity_needed', 'is_open').iterator(chunk_size=CHUNK_SIZE)
+    }
+    return {
+        item_id: (current.get(item_id), replayed.get(item_id))
+        for item_id in current.keys() | replayed.keys()
+        if current.get(item_id) != replayed.get(item_id)
+    }
+
+
+def compact(before, archive=None):
+    """
+    Deletes the events and snapshots made obsolete by the last snapshot taken
+    at or before `before`, first writing the events to the `archive` stream as
+    NDJSON if given. Returns (events deleted, snapshots deleted).
+    """
+    keep = StockSnapshot.objects.filter(taken__lte=before).order_by('-taken', '-pk').first()
+    if keep is None:
+        return 0, 0
+    events = StockEvent.objects.filter(pk__lte=keep.last_event_id)
+    if archive is not None:
+        for row in events.order_by('pk').values_list(*EVENT_COLUMNS).iterator(chunk_size=CHUNK_SIZE):
+            archive.write(json.dumps(dict(zip(EVENT_COLUMNS, row)), cls=DjangoJSONEncoder) + '\n')
+    with transaction.atomic():
+        deleted_events = events.delete()[0]
+        # The rows go with a single DELETE each, never loaded
+        deleted = StockSnapshot.objects.filter(taken__lt=keep.taken).delete()[1]
+    return deleted_events, deleted.get(StockSnapshot._meta.label, 0)
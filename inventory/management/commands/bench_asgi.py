@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from .benchmark import comma_list
+
+# (label, ASYNC_VIEWS, benchmark runner)
+MODES = [
+    ('sync/wsgi', '0', 'wsgi'),
+    ('sync/asgi', '0', 'asgi'),
+    ('async/asgi', '1', 'asgi'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the sync views under WSGI with the async views under ASGI (and the "
+        "sync views under ASGI) at several concurrency levels, using `benchmark` runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=lambda value: [int(level) for level in comma_list(value)], default=[50, 200],
+            help="Comma-separated numbers of concurrent clients (default 50,200).",
+        )
+        parser.add_argument('--size', type=int, default=10000, help="Catalog size in items (default 10000).")
+        parser.add_argument('--requests', type=int, default=400, help="Requests per scenario (default 400).")
+        parser.add_argument(
+            '--scenarios', type=comma_list, default=['scan_add', 'scan_form', 'inventory_list', 'shopping_list'],
+        )
+        parser.add_argument('--output', default='bench-asgi-results.json')
+
+    def handle(self, *args, concurrency, size, requests, scenarios, output, **options):
+        runs = []
+        for level in concurrency:
+            for label, async_views, runner in MODES:
+                # A fresh process per mode: ASYNC_VIEWS is read when the URLconf loads
+                with tempfile.NamedTemporaryFile(suffix='.json') as results:
+                    subprocess.run(
+                        [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark',
+                         '--sizes', str(size), '--requests', str(requests), '--concurrency', str(level),
+                         '--runners', runner, '--scenarios', ','.join(scenarios), '--output', results.name],
+                        env={**os.environ, 'ASYNC_VIEWS': async_views}, check=True, stdout=subprocess.DEVNULL,
+                    )
+                    summaries = json.load(results)['runs'][0]['scenarios']
+                runs.append({'mode': label, 'concurrency': level, 'scenarios': summaries})
+            self.print_table(level, runs[-len(MODES):], scenarios)
+
+        with open(output, 'w') as f:
+            json.dump({'size': size, 'requests_per_scenario': requests, 'runs': runs}, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def print_table(self, level, runs, scenarios):
+        self.stdout.write(f"\n{level} concurrent clients: requests/s (p95 ms)")
+        self.stdout.write(f"{'scenario':<16}" + ''.join(f"{run['mode']:>22}" for run in runs))
+        for name in scenarios:
+            cells = [run['scenarios'][name] for run in runs]
+            self.stdout.write(f"{name:<16}" + ''.join(
+                f"{cell['requests_per_s']:>12,.1f} ({cell['p95_ms']:>6.0f})"
+                + (f" {cell['errors']}err" if cell['errors'] else '')
+                for cell in cells
+            ))
@@ -0,0 +1,130 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.sqlite import pragma_statements
+
+SCHEMA = [
+    "CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT NOT NULL, quantity DECIMAL NOT NULL, "
+    "quantity_needed DECIMAL NOT NULL, is_open BOOL NOT NULL, location TEXT)",
+    "CREATE INDEX item_in_stock_name_idx ON item (name) WHERE quantity > 0 OR is_open",
+    "CREATE TABLE counter (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    "INSERT INTO counter VALUES ('changes', 0)",
+]
+
+# What one scan does (stock.lock_stock() then a guarded update), and one list page
+WRITE = [
+    "UPDATE counter SET value = value + 1 WHERE key = 'changes'",
+    "UPDATE item SET quantity = quantity + 1, quantity_needed = MAX(quantity_needed - 1, 0) WHERE id = ?",
+]
+READ = "SELECT id, name, quantity, location FROM item WHERE quantity > 0 OR is_open ORDER BY name LIMIT 100"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares SQLite read/write throughput with the default settings and with "
+        "a tuning profile from SQLITE_PROFILES, using concurrent writer and reader "
+        "threads on a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', default='production', help="Profile to compare against the defaults.")
+        parser.add_argument('--writers', type=int, default=4, help="Concurrent writer threads (default 4).")
+        parser.add_argument('--readers', type=int, default=4, help="Concurrent reader threads (default 4).")
+        parser.add_argument('--seconds', type=float, default=5, help="Duration of each run (default 5).")
+        parser.add_argument('--items', type=int, default=10000, help="Items in the scratch database (default 10000).")
+
+    def handle(self, *args, profile, writers, readers, seconds, items, **options):
+        if profile not in settings.SQLITE_PROFILES:
+            raise CommandError(f"Unknown profile {profile!r}; choose from {', '.join(settings.SQLITE_PROFILES)}")
+
+        self.stdout.write(f"{writers} writer(s), {readers} reader(s), {items} items, {seconds:g}s per run")
+        self.stdout.write(f"{'profile':<12} {'writes/s':>10} {'reads/s':>10} {'p95 write':>10} {'errors':>7}")
+        # Without a profile every request opens its own connection (CONN_MAX_AGE=0)
+        runs = [('default', {}, False), (profile, settings.SQLITE_PROFILES[profile], True)]
+        for name, pragmas, persistent in runs:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.seed(path, items)
+                result = self.run(path, pragmas, persistent, writers, readers, seconds, items)
+            self.stdout.write(
+                f"{name:<12} {result['writes'] / seconds:>10,.0f} {result['reads'] / seconds:>10,.0f} "
+                f"{result['p95_write'] * 1000:>8.1f}ms {result['errors']:>7}"
+            )
+
+    def seed(self, path, items):
+        db = sqlite3.connect(path)
+        for statement in SCHEMA:
+            db.execute(statement)
+        db.executemany(
+            "INSERT INTO item VALUES (?, ?, ?, 0, 0, ?)",
+            ((pk, f"Item {pk:06d}", pk % 5, f"Shelf {pk % 20}") for pk in range(1, items + 1)),
+        )
+        db.commit()
+        db.close()
+
+    def run(self, path, pragmas, persistent, writers, readers, seconds, items):
+        statements = pragma_statements(pragmas)
+        # journal_mode is stored in the database file; the rest are per connection
+        db = sqlite3.connect(path)
+        for statement in statements:
+            db.execute(statement)
+        db.close()
+
+        result = {'writes': 0, 'reads': 0, 'errors': 0, 'write_times': []}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def connect():
+            # Same connection arguments as Django's SQLite backend
+            db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            for statement in statements:
+                db.execute(statement)
+            return db
+
+        def worker(write):
+            db = connect() if persistent else None
+            done, errors, times = 0, 0, []
+            while time.perf_counter() < deadline:
+                conn = db or connect()
+                started = time.perf_counter()
+                try:
+                    if write:
+                        conn.execute("BEGIN")
+                        conn.execute(WRITE[0])
+                        conn.execute(WRITE[1], (random.randint(1, items),))
+                        conn.execute("COMMIT")
+                        times.append(time.perf_counter() - started)
+                    else:
+                        conn.execute(READ).fetchall()
+                    done += 1
+                except sqlite3.OperationalError:
+                    errors += 1
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                finally:
+                    if db is None:
+                        conn.close()
+            if db is not None:
+                db.close()
+            with lock:
+                result['writes' if write else 'reads'] += done
+                result['errors'] += errors
+                result['write_times'] += times
+
+        threads = [threading.Thread(target=worker, args=(True,)) for _ in range(writers)]
+        threads += [threading.Thread(target=worker, args=(False,)) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        times = sorted(result['write_times'])
+        result['p95_write'] = times[int(len(times) * 0.95)] if times else 0
+        return result
@@ -0,0 +1,123 @@
+import json
+import os
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from inventory import benchmark
+
+RUNNERS = ['client', 'wsgi', 'asgi']
+
+
+def comma_list(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds synthetic catalogs into a scratch database and drives every inventory "
+        "URL through the test client and concurrent WSGI/ASGI runners, writing "
+        "latency percentiles, requests/s and queries per request to a JSON file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=lambda value: [int(size) for size in comma_list(value)], default=[1000, 10000],
+            help="Comma-separated catalog sizes in items (default 1000,10000; e.g. 1000,10000,100000,1000000).",
+        )
+        parser.add_argument('--barcodes-per-item', type=int, default=1)
+        parser.add_argument('--requests', type=int, default=50, help="Requests per scenario and runner (default 50).")
+        parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight for wsgi/asgi (default 8).")
+        parser.add_argument('--runners', type=comma_list, default=RUNNERS, help="Default: client,wsgi,asgi.")
+        parser.add_argument('--scenarios', type=comma_list, help="Only these scenarios (default: all).")
+        parser.add_argument('--output', default='benchmark-results.json', help="Results file (default benchmark-results.json).")
+
+    def handle(self, *args, sizes, barcodes_per_item, requests, concurrency, runners, scenarios, output, **options):
+        scenarios = scenarios or list(benchmark.SCENARIOS)
+        unknown = [name for name in scenarios if name not in benchmark.SCENARIOS]
+        unknown += [name for name in runners if name not in RUNNERS]
+        if unknown:
+            raise CommandError(f"Unknown scenario or runner: {', '.join(unknown)}")
+
+        results = {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': self.git_commit(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'sqlite_profile': getattr(settings, 'SQLITE_PROFILE', None),
+            'requests_per_scenario': requests,
+            'concurrency': concurrency,
+            'runs': [],
+        }
+        # Production-like request handling: no query log, no debug pages
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver', '127.0.0.1', 'localhost'],
+                               SCAN_API_TOKENS=[benchmark.SCAN_API_TOKEN]):
+            for size in sizes:
+                with self.scratch_database():
+                    results['runs'] += self.run_size(size, barcodes_per_item, requests, concurrency, runners, scenarios)
+
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def run_size(self, size, barcodes_per_item, requests, concurrency, runners, scenarios):
+        started = time.perf_counter()
+        catalog = benchmark.seed_catalog(size, barcodes_per_item)
+        staff = get_user_model().objects.create_user('benchmark', is_staff=True)
+        self.stdout.write(f"\nSeeded {size:,} items in {time.perf_counter() - started:.1f}s")
+
+        runs = []
+        for runner in runners:
+            prepared = benchmark.prepare_requests(catalog, scenarios, requests)
+            if runner == 'client':
+                summaries = benchmark.run_client(prepared, staff)
+            elif runner == 'wsgi':
+                summaries = benchmark.run_wsgi(prepared, concurrency, staff)
+            else:
+                summaries = benchmark.run_asgi(prepared, concurrency, staff)
+            runs.append({'size': size, 'runner': runner, 'scenarios': summaries})
+            self.print_table(size, runner, summaries)
+        return runs
+
+    def print_table(self, size, runner, summaries):
+        self.stdout.write(f"\n{runner} @ {size:,} items")
+        self.stdout.write(f"{'scenario':<26} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>7} {'errors':>6}")
+        for name, summary in summaries.items():
+            queries = summary['queries_per_request']
+            self.stdout.write(
+                f"{name:<26} {summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} "
+                f"{summary['requests_per_s']:>8.1f} {'-' if queries is None else f'{queries:g}':>7} {summary['errors']:>6}"
+            )
+
+    @contextmanager
+    def scratch_database(self):
+        """A freshly migrated throwaway database, so the real data is never touched."""
+        old_name = connection.settings_dict['NAME']
+        old_test = connection.settings_dict.get('TEST', {})
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite':
+                # A file rather than the in-memory default, so server threads share it
+                connection.settings_dict['TEST'] = {**old_test, 'NAME': os.path.join(directory, 'benchmark.sqlite3')}
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                yield
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                connection.settings_dict['TEST'] = old_test
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
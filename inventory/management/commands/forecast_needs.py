@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import forecast
+
+
+def positive(value):
+    number = float(value)
+    if number <= 0:
+        raise ValueError(f"Not a positive number: {value}")
+    return number
+
+
+class Command(BaseCommand):
+    help = (
+        "Forecasts every item's consumption from the stock ledger, storing its "
+        "daily rate, reorder date and suggested shopping list quantity; with "
+        "--apply, raises the shopping list to the suggestions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--half-life', type=positive, default=forecast.HALF_LIFE_DAYS,
+            help=f"Days after which past consumption counts half (default {forecast.HALF_LIFE_DAYS}).",
+        )
+        parser.add_argument(
+            '--lead-days', type=float, default=forecast.LEAD_DAYS,
+            help=f"Days of stock to have left when reordering (default {forecast.LEAD_DAYS}).",
+        )
+        parser.add_argument(
+            '--cover-days', type=float, default=forecast.COVER_DAYS,
+            help=f"Days of use a purchase should cover beyond that (default {forecast.COVER_DAYS}).",
+        )
+        parser.add_argument(
+            '--apply', action='store_true',
+            help="Raise quantity_needed to the suggestion where it is lower.",
+        )
+
+    def handle(self, *args, half_life, lead_days, cover_days, apply=False, **options):
+        if lead_days < 0 or cover_days < 0:
+            raise CommandError("--lead-days and --cover-days cannot be negative")
+        started = time.perf_counter()
+        count = forecast.run(half_life, lead_days, cover_days)
+        self.stdout.write(self.style.SUCCESS(
+            f"Forecast {count} items in {time.perf_counter() - started:.2f}s"
+        ))
+        if apply:
+            started = time.perf_counter()
+            raised = forecast.apply()
+            self.stdout.write(self.style.SUCCESS(
+                f"Raised the shopping list of {raised} items in {time.perf_counter() - started:.2f}s"
+            ))
@@ -0,0 +1,252 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory import counters, ledger, search, sites
+from inventory.barcode_cache import barcode_cache
+from inventory.forms import ItemForm, BarcodeForm
+from inventory.models import Item, Barcode, Site
+
+# Distinct values remembered per column when memoizing validation
+MEMO_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-loads items or barcodes from a CSV or NDJSON file (a header row / "
+        "object keys name the fields), creating new rows and updating existing "
+        "ones matched by item name or barcode code, in one site."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['items', 'barcodes'])
+        parser.add_argument('path', help="Input file, or - to read standard input.")
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'],
+            help="Input format; guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Rows validated and written per bulk statement (default 5000).",
+        )
+        parser.add_argument(
+            '--site', metavar='DOMAIN',
+            help="Domain of the site to import into (default: the default site).",
+        )
+
+    def handle(self, *args, kind, path, format=None, batch_size=5000, site=None, **options):
+        site_id = sites.DEFAULT_SITE_ID
+        if site is not None:
+            site_id = Site.objects.filter(domain=site.lower()).values_list('pk', flat=True).first()
+            if site_id is None:
+                raise CommandError(f"No site with the domain {site}")
+        # New rows go to the active site, and names and codes are matched within it
+        with sites.activate(site_id):
+            self.load(kind, path, format, batch_size)
+
+    def load(self, kind, path, format, batch_size):
+        if format is None:
+            format = 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+        self.kind = kind
+        self.errors = 0
+        self.written = 0
+
+        if kind == 'items':
+            self.key = 'name'
+            # Validate with ItemForm's field rules (plus the model validators the
+            # form would run in full_clean), without building a form per row
+            self.cleaners = self.get_cleaners(ItemForm, Item, ItemForm._meta.fields)
+        else:
+            self.key = 'code'
+            # The item is given by name and resolved per batch, not by the form's select
+            self.cleaners = self.get_cleaners(BarcodeForm, Barcode, ['code', 'quantity', 'description'])
+
+        started = time.perf_counter()
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+        try:
+            rows = self.read_csv(stream) if format == 'csv' else self.read_ndjson(stream)
+            batch = []
+            for line, raw in rows:
+                batch.append((line, raw))
+                if len(batch) >= batch_size:
+                    self.write_batch(batch)
+                    batch = []
+            if batch:
+                self.write_batch(batch)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        # bulk_create bypasses the signals that keep the counters and versions up to
+        # date (write_items/write_barcodes keep the ledger and search index per batch)
+        if kind == 'items':
+            counters.rebuild()
+            counters.touch(counters.ITEMS_VERSION)
+        else:
+            counters.touch(counters.BARCODES_VERSION)
+
+        elapsed = time.perf_counter() - started
+        rate = self.written / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.written} {kind} ({self.errors} rejected) in {elapsed:.2f}s ({rate:,.0f} rows/s)"
+        ))
+
+    # --- Reading ---
+
+    def read_csv(self, stream):
+        reader = csv.DictReader(stream)
+        for line, row in enumerate(reader, 2):
+            yield line, row
+
+    def read_ndjson(self, stream):
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                self.reject(line, f"invalid JSON: {e}")
+                continue
+            if not isinstance(row, dict):
+                self.reject(line, "expected a JSON object")
+                continue
+            yield line, row
+
+    # --- Validation ---
+
+    def get_cleaners(self, form_class, model, fields):
+        form = form_class()
+        # Supplier files repeat the same units, locations and quantities on most
+        # rows, so cleaning results are memoized per field (except the unique key)
+        self.memo = {name: {} for name in fields if name != self.key}
+        return {name: (form.fields[name], model._meta.get_field(name)) for name in fields}
+
+    def clean_value(self, name, raw_value):
+        """Returns (value, None) or (None, error message) for one field of one row."""
+        form_field, model_field = self.cleaners[name]
+        try:
+            value = form_field.clean(raw_value)
+            model_field.run_validators(value)
+        except ValidationError as e:
+            return None, f"{name}: {' '.join(e.messages)}"
+        return value, None
+
+    def clean_row(self, line, raw):
+        """Returns the cleaned values present in `raw`, or None (after reporting) if any is invalid."""
+        if not raw.get(self.key):
+            self.reject(line, f"{self.key}: This field is required.")
+            return None
+        values = {}
+        errors = []
+        for name in self.cleaners:
+            if name not in raw:
+                continue  # left to the model default (new rows) or unchanged (existing rows)
+            raw_value = raw[name]
+            memo = self.memo.get(name)
+            if memo is not None and isinstance(raw_value, (str, int, float, bool)) and len(memo) < MEMO_SIZE:
+                # Keyed with the type too: True, 1 and 1.0 are equal dict keys
+                memo_key = (type(raw_value), raw_value)
+                result = memo.get(memo_key)
+                if result is None:
+                    result = memo[memo_key] = self.clean_value(name, raw_value)
+            else:
+                result = self.clean_value(name, raw_value)
+            value, error = result
+            if error:
+                errors.append(error)
+            else:
+                values[name] = value
+        if errors:
+            self.reject(line, '; '.join(errors))
+            return None
+        return values
+
+    def reject(self, line, message):
+        self.errors += 1
+        self.stderr.write(f"line {line}: {message}")
+
+    # --- Writing ---
+
+    def write_batch(self, batch):
+        # Later rows for the same name/code win, as they would row by row
+        cleaned = {}
+        for line, raw in batch:
+            values = self.clean_row(line, raw)
+            if values is not None:
+                cleaned[values[self.key]] = (line, raw, values)
+        if not cleaned:
+            return
+        # One transaction per batch rather than one commit per INSERT statement
+        with transaction.atomic():
+            if self.kind == 'items':
+                self.write_items([values for line, raw, values in cleaned.values()])
+            else:
+                self.write_barcodes(cleaned.values())
+
+    def by_columns(self, objects, values):
+        """
+        Groups `objects` by the set of fields their row carries. A row leaves
+        out the fields it does not set, which an upsert would otherwise
+        overwrite with the model defaults, so each group is written with its
+        own update_fields.
+        """
+        groups = {}
+        for obj, row in zip(objects, values):
+            groups.setdefault(frozenset(row), []).append(obj)
+        return groups.items()
+
+    def write_items(self, rows):
+        fields = set().union(*rows) - {'name'}
+        items = Item.objects.filter(name__in=[values['name'] for values in rows])
+        before = items.stock_states()
+        new_items = [Item(**values) for values in rows]
+        for columns, group in self.by_columns(new_items, rows):
+            if columns - {'name'}:
+                Item.objects.bulk_create(
+                    group, update_conflicts=True, unique_fields=['site', 'name'],
+                    update_fields=sorted(columns - {'name'}),
+                )
+            else:
+                Item.objects.bulk_create(group, ignore_conflicts=True)
+        self.written += len(new_items)
+        after = items.stock_states()
+        ledger.record([(before.get(pk), state) for pk, state in after.items() if before.get(pk) != state], 'import')
+        item_ids = list(after)
+        search.index_items(item_ids)
+        if fields & {'unit', 'location'}:
+            barcode_cache.invalidate_items(item_ids)
+
+    def write_barcodes(self, rows):
+        # Resolve every item name in the batch with one query
+        names = {str(raw.get('item') or raw.get('item__name') or '') for line, raw, values in rows}
+        item_ids = dict(Item.objects.filter(name__in=names).values_list('name', 'pk'))
+
+        barcodes = []
+        columns = []
+        for line, raw, values in rows:
+            name = str(raw.get('item') or raw.get('item__name') or '')
+            if name not in item_ids:
+                self.reject(line, f"item: No item named '{name}'." if name else "item: This field is required.")
+                continue
+            barcodes.append(Barcode(item_id=item_ids[name], **values))
+            columns.append({'item', *values})
+        if not barcodes:
+            return
+        # Items losing a barcode to another item need re-indexing too
+        item_ids = set(Barcode.objects.filter(code__in=[barcode.code for barcode in barcodes])
+                       .values_list('item_id', flat=True))
+        for fields, group in self.by_columns(barcodes, columns):
+            Barcode.objects.bulk_create(
+                group, update_conflicts=True, unique_fields=['site', 'code'], update_fields=sorted(fields - {'code'}),
+            )
+        self.written += len(barcodes)
+        barcode_cache.invalidate(sites.current(), *(barcode.code for barcode in barcodes))
+        search.index_items(item_ids | {barcode.item_id for barcode in barcodes})
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import counters
+
+
+class Command(BaseCommand):
+    help = "Recomputes the inventory page counters from the item table, or only checks them with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report counters that do not match the item table; exit non-zero if any.",
+        )
+
+    def handle(self, *args, check=False, **options):
+        mismatches = counters.verify()
+        for key, (stored, actual) in sorted(mismatches.items()):
+            self.stdout.write(f"{key}: stored {stored}, actual {actual}")
+
+        if check:
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} counter(s) out of date")
+            self.stdout.write(self.style.SUCCESS("Counters are up to date"))
+            return
+
+        counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Counters rebuilt ({len(mismatches)} corrected)"))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import search
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the item search index (names, locations and barcodes) from scratch."
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError("The search index needs SQLite (FTS5); other databases are searched directly")
+        started = time.perf_counter()
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} items in {time.perf_counter() - started:.2f}s"
+        ))
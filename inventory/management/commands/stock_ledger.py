@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from inventory import ledger
+from inventory.models import Item
+
+
+def moment(value):
+    """A date or date and time, in the current time zone unless it says otherwise."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f"Not a date: {value}")
+        parsed = datetime(date.year, date.month, date.day)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintains the stock ledger: takes a snapshot of the current stock, "
+        "compacts (optionally archiving) events older than a snapshot, shows the "
+        "stock as of a past moment, or checks that the items match their events."
+    )
+
+    def add_arguments(self, parser):
+        commands = parser.add_subparsers(dest='command', required=True)
+        commands.add_parser('snapshot', help="Copy the current stock of every item into a new snapshot.")
+
+        compact = commands.add_parser('compact', help="Delete the events and snapshots older than a snapshot.")
+        compact.add_argument('--before', type=moment, required=True,
+                             help="Keep the last snapshot taken by this date (YYYY-MM-DD[ HH:MM]) and everything after it.")
+        compact.add_argument('--archive', help="Append the deleted events to this NDJSON file first (- for standard output).")
+
+        state = commands.add_parser('state', help="Print the stock of some items as of a past moment.")
+        state.add_argument('--at', type=moment, help="Date (YYYY-MM-DD[ HH:MM]); default now.")
+        state.add_argument('items', nargs='+', help="Item names.")
+
+        commands.add_parser('check', help="Replay the ledger and report items whose stock does not match it.")
+
+    def handle(self, *args, command, **options):
+        getattr(self, command)(**options)
+
+    def snapshot(self, **options):
+        snapshot = ledger.take_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Took {snapshot} of {snapshot.rows.count()} items"))
+
+    def compact(self, before, archive=None, **options):
+        if archive is None:
+            events, snapshots = ledger.compact(before)
+        elif archive == '-':
+            events, snapshots = ledger.compact(before, self.stdout)
+        else:
+            with open(archive, 'a', encoding='utf-8') as stream:
+                events, snapshots = ledger.compact(before, stream)
+        # Status on stderr, so it never mixes with an archive written to stdout
+        self.stderr.write(self.style.SUCCESS(f"Deleted {events} events and {snapshots} snapshots"))
+
+    def state(self, items, at=None, **options):
+        item_ids = dict(Item.objects.filter(name__in=items).values_list('name', 'pk'))
+        missing = [name for name in items if name not in item_ids]
+        if missing:
+            raise CommandError(f"No item named {', '.join(missing)}")
+        try:
+            states = ledger.state_at(at, item_ids.values())
+        except ValueError as e:
+            raise CommandError(str(e))
+        for name in items:
+            state = states.get(item_ids[name])
+            if state is None:
+                self.stdout.write(f"{name}: did not exist")
+            else:
+                self.stdout.write(
+                    f"{name}: quantity {state['quantity']}, needed {state['quantity_needed']}"
+                    f"{', open' if state['is_open'] else ''}"
+                )
+
+    def check(self, **options):
+        mismatches = ledger.verify()
+        for item_id, (current, replayed) in sorted(mismatches.items()):
+            self.stdout.write(f"item {item_id}: stored {current}, ledger {replayed}")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} item(s) do not match the ledger")
+        self.stdout.write(self.style.SUCCESS("Every item matches the ledger"))
@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the primary database into the read replica (REPLICA_DB) with "
+        "SQLite's backup API, every REPLICA_SYNC_SECONDS until stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=settings.REPLICA_SYNC_SECONDS,
+            help=f"Seconds from the start of one copy to the next (default {settings.REPLICA_SYNC_SECONDS:g}).",
+        )
+        parser.add_argument('--once', action='store_true', help="Copy once and exit.")
+
+    def handle(self, *args, interval, once=False, **options):
+        if not replica.configured():
+            raise CommandError("No replica database: set REPLICA_DB to the replica's SQLite file")
+        while True:
+            took = replica.sync()
+            if once:
+                self.stdout.write(self.style.SUCCESS(f"Copied the database to the replica in {took:.2f}s"))
+                return
+            if took + interval > settings.REPLICA_LAG_SECONDS:
+                self.stderr.write(
+                    f"A copy took {took:.2f}s: the replica can fall more than "
+                    f"REPLICA_LAG_SECONDS ({settings.REPLICA_LAG_SECONDS:g}s) behind"
+                )
+            elif options['verbosity'] > 1:
+                self.stdout.write(f"Copied in {took:.2f}s")
+            time.sleep(max(0, interval - took))
@@ -0,0 +1,212 @@
+# inventory/metrics.py
+"""
+Per-view request metrics, kept in process memory and served in the
+Prometheus text format by the admin-only /metrics view.
+
+MetricsMiddleware times every request, sync or async. Queries are timed by an
+execute_wrapper() installed on every database connection, and template
+rendering by the TimedDjangoTemplates backend (set as the BACKEND in
+TEMPLATES). With SLOW_REQUEST_MS set, requests slower than that are logged to the
+'inventory.metrics' logger together with the SQL they ran.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Seconds (the Prometheus client defaults) and query counts
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Timer of the request being handled, if the middleware is measuring one. A
+# context variable (rather than per-connection state) follows async requests
+# into the threads their ORM calls run in.
+current_timer = ContextVar('current_timer', default=None)
+
+
+class Histogram:
+    """Bucketed observations per view, rendered as a Prometheus histogram."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # view -> [count per bucket..., count above the last bucket], sum
+        self.series = {}
+
+    def observe(self, view, value):
+        series = self.series.get(view)
+        if series is None:
+            series = self.series[view] = [[0] * (len(self.buckets) + 1), 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for view, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{view}"}} {total:g}')
+            lines.append(f'{self.name}_count{{view="{view}"}} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {
+                'duration': Histogram('kitchen_request_duration_seconds', 'Time spent handling the request.', TIME_BUCKETS),
+                'render': Histogram('kitchen_template_render_seconds', 'Time spent rendering templates.', TIME_BUCKETS),
+                'queries': Histogram('kitchen_db_queries', 'Database queries per request.', QUERY_BUCKETS),
+                'db': Histogram('kitchen_db_duration_seconds', 'Time spent in database queries.', TIME_BUCKETS),
+            }
+            # (view, status) -> responses
+            self.responses = {}
+
+    def record(self, view, status, duration, render, queries, db_time):
+        with self._lock:
+            self.histograms['duration'].observe(view, duration)
+            self.histograms['render'].observe(view, render)
+            self.histograms['queries'].observe(view, queries)
+            self.histograms['db'].observe(view, db_time)
+            self.responses[view, status] = self.responses.get((view, status), 0) + 1
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for histogram in self.histograms.values():
+                lines += histogram.render()
+            lines += ['# HELP kitchen_responses_total Responses by view and status code.',
+                      '# TYPE kitchen_responses_total counter']
+            lines += [
+                f'kitchen_responses_total{{view="{view}",status="{status}"}} {count}'
+                for (view, status), count in sorted(self.responses.items())
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestTimer:
+    """Query count, query time (and SQL, if kept) and template render time of one request."""
+
+    def __init__(self, keep_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        # Set while a template renders, so the templates it renders in turn
+        # (list rows, see inventory/fragments.py) are not counted twice
+        self.rendering = False
+        self.statements = [] if keep_sql else None
+
+
+def time_query(execute, sql, params, many, context):
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        timer.queries += 1
+        timer.db_time += elapsed
+        if timer.statements is not None:
+            timer.statements.append((elapsed, sql))
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # The same connection object reconnects between requests; install once
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'SLOW_REQUEST_MS', 0) / 1000
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = RequestTimer(keep_sql=bool(self.slow_seconds))
+        token = current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = RequestTimer(keep_sql=bool(self.slow_seconds))
+        token = current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    def record(self, request, response, duration, timer):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        registry.record(view, response.status_code, duration, timer.render_time, timer.queries, timer.db_time)
+
+        if self.slow_seconds and duration >= self.slow_seconds:
+            logger.warning(
+                "Slow request: %s %s (%s) took %.0fms, %d queries in %.0fms\n%s",
+                request.method, request.path, view, duration * 1000, timer.queries, timer.db_time * 1000,
+                '\n'.join(f'[{elapsed * 1000:.1f}ms] {sql}' for elapsed, sql in timer.statements),
+            )
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timer = current_timer.get()
+        if timer is None or timer.rendering:
+            return super().render(context, request)
+        timer.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timer.rendering = False
+            timer.render_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, adding each render's time to the request's metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
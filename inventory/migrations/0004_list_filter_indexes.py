@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0003_item_location"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", 0), ("is_open", True), _connector="OR"),
+                fields=["name"],
+                name="item_in_stock_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                condition=models.Q(("quantity_needed__gt", 0)),
+                fields=["name"],
+                name="item_needed_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                fields=["location", "name"], name="item_location_name_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.14 on 2026-10-18 17:16
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_counters(apps, schema_editor):
+    """Counts the existing items once; from here on the counters are kept incrementally."""
+    Item = apps.get_model("inventory", "Item")
+    StockCounter = apps.get_model("inventory", "StockCounter")
+    in_stock = Q(quantity__gt=0) | Q(is_open=True)
+    counts = Item.objects.aggregate(
+        in_stock=Count("pk", filter=in_stock),
+        needed=Count("pk", filter=Q(quantity_needed__gt=0)),
+        open=Count("pk", filter=Q(is_open=True)),
+    )
+    values = dict(counts, changes=0)
+    for location, count in Item.objects.filter(in_stock).values_list("location").annotate(Count("pk")):
+        key = "location:" + (location or "")
+        values[key] = values.get(key, 0) + count
+    StockCounter.objects.bulk_create(
+        [StockCounter(key=key, value=value) for key, value in values.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0004_list_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockCounter",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=120, primary_key=True, serialize=False),
+                ),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+import time
+
+from django.db import migrations
+
+
+def create_versions(apps, schema_editor):
+    """Starts the item and barcode table versions at the current time."""
+    StockCounter = apps.get_model("inventory", "StockCounter")
+    now = int(time.time() * 1_000_000)
+    for key in ("version:items", "version:barcodes"):
+        StockCounter.objects.get_or_create(key=key, defaults={"value": now})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0005_stockcounter"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
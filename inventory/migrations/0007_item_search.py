@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Creates the FTS5 item search table (SQLite only) and indexes the existing items."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS inventory_search USING fts5("
+        "name, location, barcodes, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')"
+    )
+    schema_editor.execute(
+        "INSERT INTO inventory_search (rowid, name, location, barcodes) "
+        "SELECT item.id, item.name, COALESCE(item.location, ''), "
+        "COALESCE((SELECT group_concat(barcode.code || ' ' || barcode.description, ' ') "
+        "FROM inventory_barcode barcode WHERE barcode.item_id = item.id), '') "
+        "FROM inventory_item item"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS inventory_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0006_version_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.14 on 2026-10-18 18:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def take_first_snapshot(apps, schema_editor):
+    """Starts the ledger from the current stock, as a snapshot before any event."""
+    StockSnapshot = apps.get_model("inventory", "StockSnapshot")
+    snapshot = StockSnapshot.objects.create(last_event_id=0)
+    schema_editor.execute(
+        "INSERT INTO inventory_stocksnapshotrow (snapshot_id, item_id, quantity, quantity_needed, is_open) "
+        "SELECT %s, id, quantity, quantity_needed, is_open FROM inventory_item",
+        [snapshot.pk],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_item_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockSnapshotRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity_needed', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_open', models.BooleanField()),
+                ('item', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory.item')),
+                ('snapshot', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='inventory.stocksnapshot')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('action', models.CharField(max_length=20)),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('quantity_needed', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('is_open', models.BooleanField(null=True)),
+                ('item', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock_events', to='inventory.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created'], name='stockevent_created_idx'), models.Index(fields=['item', 'id'], name='stockevent_item_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshotrow',
+            constraint=models.UniqueConstraint(fields=('snapshot', 'item'), name='stocksnapshotrow_item_unique'),
+        ),
+        migrations.RunPython(take_first_snapshot, migrations.RunPython.noop),
+    ]
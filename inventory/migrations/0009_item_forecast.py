@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-18 18:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemForecast',
+            fields=[
+                ('item', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='forecast', serialize=False, to='inventory.item')),
+                ('daily_rate', models.FloatField()),
+                ('reorder_on', models.DateField()),
+                ('suggested_needed', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('computed', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.0.14 on 2026-10-18 18:31
+
+import django.db.models.deletion
+import inventory.sites
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+
+
+def create_default_site(apps, schema_editor):
+    """The site owning every existing item and barcode (inventory.sites.DEFAULT_SITE_ID)."""
+    Site = apps.get_model("inventory", "Site")
+    Site.objects.create(id=1, name="Default", domain="localhost")
+
+
+def move_counters_to_default_site(apps, schema_editor):
+    """Counters are kept per site now ("site:<id>:<key>"); only the 'changes' count stays global."""
+    StockCounter = apps.get_model("inventory", "StockCounter")
+    StockCounter.objects.exclude(key="changes").update(key=Concat(Value("site:1:"), "key"))
+
+
+def move_counters_back(apps, schema_editor):
+    StockCounter = apps.get_model("inventory", "StockCounter")
+    StockCounter.objects.exclude(key__startswith="site:1:").exclude(key="changes").delete()
+    StockCounter.objects.filter(key__startswith="site:1:").update(key=Substr("key", len("site:1:") + 1))
+
+
+def add_site_to_search_index(apps, schema_editor):
+    """Recreates the FTS5 item search table (SQLite only) with the site of each item."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS inventory_search")
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE inventory_search USING fts5("
+        "name, location, barcodes, site UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')"
+    )
+    schema_editor.execute(
+        "INSERT INTO inventory_search (rowid, name, location, barcodes, site) "
+        "SELECT item.id, item.name, COALESCE(item.location, ''), "
+        "COALESCE((SELECT group_concat(barcode.code || ' ' || barcode.description, ' ') "
+        "FROM inventory_barcode barcode WHERE barcode.item_id = item.id), ''), item.site_id "
+        "FROM inventory_item item"
+    )
+
+
+def remove_site_from_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS inventory_search")
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE inventory_search USING fts5("
+        "name, location, barcodes, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')"
+    )
+    schema_editor.execute(
+        "INSERT INTO inventory_search (rowid, name, location, barcodes) "
+        "SELECT item.id, item.name, COALESCE(item.location, ''), "
+        "COALESCE((SELECT group_concat(barcode.code || ' ' || barcode.description, ' ') "
+        "FROM inventory_barcode barcode WHERE barcode.item_id = item.id), '') "
+        "FROM inventory_item item"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_item_forecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Site',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('domain', models.CharField(help_text='Host name the site is served on; other hosts get the default site', max_length=100, unique=True)),
+            ],
+        ),
+        migrations.RunPython(create_default_site, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_in_stock_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_needed_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_location_name_idx',
+        ),
+        migrations.AlterField(
+            model_name='barcode',
+            name='code',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddField(
+            model_name='barcode',
+            name='site',
+            field=models.ForeignKey(db_index=False, default=inventory.sites.current, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.site'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='site',
+            field=models.ForeignKey(db_index=False, default=inventory.sites.current, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='inventory.site'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('quantity__gt', 0), ('is_open', True), _connector='OR'), fields=['site', 'name'], name='item_in_stock_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('quantity_needed__gt', 0)), fields=['site', 'name'], name='item_needed_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['site', 'location', 'name'], name='item_location_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='barcode',
+            constraint=models.UniqueConstraint(fields=('site', 'code'), name='barcode_site_code_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='item',
+            constraint=models.UniqueConstraint(fields=('site', 'name'), name='item_site_name_unique'),
+        ),
+        migrations.RunPython(move_counters_to_default_site, move_counters_back),
+        migrations.RunPython(add_site_to_search_index, remove_site_from_search_index),
+    ]
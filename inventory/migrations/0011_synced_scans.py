@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-18 18:37
+
+import django.db.models.deletion
+import django.utils.timezone
+import inventory.sites
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_sites'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncedScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('code', models.CharField(max_length=100)),
+                ('action', models.CharField(max_length=20)),
+                ('scanned', models.DateTimeField()),
+                ('received', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('status', models.CharField(max_length=20)),
+                ('message', models.CharField(blank=True, max_length=255)),
+                ('item_id', models.IntegerField(null=True)),
+                ('site', models.ForeignKey(db_index=False, default=inventory.sites.current, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.site')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='syncedscan',
+            constraint=models.UniqueConstraint(fields=('site', 'key'), name='syncedscan_site_key_unique'),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.0.14 on 2026-10-18 18:49
+
+import django.core.validators
+import inventory.fields
+from django.db import migrations, models
+
+# Every quantity column, now stored as integer hundredths (inventory/fields.py)
+QUANTITY_COLUMNS = {
+    "Item": ("quantity", "quantity_needed"),
+    "Barcode": ("quantity",),
+    "StockEvent": ("quantity", "quantity_needed"),
+    "StockSnapshotRow": ("quantity", "quantity_needed"),
+    "ItemForecast": ("suggested_needed",),
+}
+
+
+def scale_quantities(apps, schema_editor, expression):
+    for model_name, columns in QUANTITY_COLUMNS.items():
+        table = apps.get_model("inventory", model_name)._meta.db_table
+        assignments = ", ".join(f"{column} = {expression.format(column)}" for column in columns)
+        schema_editor.execute(f"UPDATE {table} SET {assignments}")
+
+
+def to_hundredths(apps, schema_editor):
+    """Runs while the columns are still decimal, so the type change that follows keeps whole numbers."""
+    scale_quantities(apps, schema_editor, "ROUND({} * 100)")
+
+
+def from_hundredths(apps, schema_editor):
+    scale_quantities(apps, schema_editor, "{} / 100.0")
+
+
+def widened(operation):
+    """
+    An AlterField of `operation`'s column to a decimal with room for the
+    largest decimal(10, 2) value in hundredths, to scale it in before the type
+    change.
+    """
+    name, path, args, kwargs = operation.field.deconstruct()
+    return migrations.AlterField(
+        model_name=operation.model_name,
+        name=operation.name,
+        field=models.DecimalField(*args, **{**kwargs, 'max_digits': 12}),
+    )
+
+
+TO_FIXED_POINT = [
+    migrations.AlterField(
+        model_name='barcode',
+        name='quantity',
+        field=inventory.fields.FixedPointField(decimal_places=2, default=1.0, help_text='Quantity this barcode represents (e.g., 1.0 for a 1lb box)', max_digits=10, validators=[django.core.validators.MinValueValidator(0.01)]),
+    ),
+    migrations.AlterField(
+        model_name='item',
+        name='quantity',
+        field=inventory.fields.FixedPointField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+    ),
+    migrations.AlterField(
+        model_name='item',
+        name='quantity_needed',
+        field=inventory.fields.FixedPointField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+    ),
+    migrations.AlterField(
+        model_name='itemforecast',
+        name='suggested_needed',
+        field=inventory.fields.FixedPointField(decimal_places=2, max_digits=10),
+    ),
+    migrations.AlterField(
+        model_name='stockevent',
+        name='quantity',
+        field=inventory.fields.FixedPointField(decimal_places=2, default=0, max_digits=10),
+    ),
+    migrations.AlterField(
+        model_name='stockevent',
+        name='quantity_needed',
+        field=inventory.fields.FixedPointField(decimal_places=2, default=0, max_digits=10),
+    ),
+    migrations.AlterField(
+        model_name='stocksnapshotrow',
+        name='quantity',
+        field=inventory.fields.FixedPointField(decimal_places=2, max_digits=10),
+    ),
+    migrations.AlterField(
+        model_name='stocksnapshotrow',
+        name='quantity_needed',
+        field=inventory.fields.FixedPointField(decimal_places=2, max_digits=10),
+    ),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_synced_scans'),
+    ]
+
+    # Widened first: scaled in place, the values of 1e6 and more would not fit
+    # the old decimal(10, 2) columns on databases that enforce it. Straight to
+    # bigint and then scaled would not do either, as casting the decimals
+    # rounds them to whole numbers.
+    operations = [
+        *map(widened, TO_FIXED_POINT),
+        migrations.RunPython(to_hundredths, from_hundredths),
+        *TO_FIXED_POINT,
+    ]
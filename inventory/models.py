@@ -1,11 +1,93 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.query import ValuesListIterable
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 
+from . import sites
+from .fields import FixedPointField
+
+
+class Site(models.Model):
+    """One kitchen sharing the deployment (see inventory/sites.py)."""
+    name = models.CharField(max_length=100)
+    domain = models.CharField(max_length=100, unique=True,
+                              help_text="Host name the site is served on; other hosts get the default site")
+
+    def __str__(self):
+        return self.name
+
+
+class SiteManager(models.Manager):
+    """Sees only the rows of the active site, if one is (every site's otherwise)."""
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        site_id = sites.active()
+        return queryset if site_id is None else queryset.filter(site_id=site_id)
+
+
+class ItemRow:
+    """
+    What a list row (inventory/item_row.html) shows of an item, without the
+    model instance: ItemQuerySet.rows() reads just these columns with
+    values_list() into these slotted objects.
+    """
+    __slots__ = ('id', 'name', 'quantity', 'unit', 'quantity_needed', 'is_open', 'location')
+
+    def __init__(self, id, name, quantity, unit, quantity_needed, is_open, location):
+        self.id = id
+        self.name = name
+        self.quantity = quantity
+        self.unit = unit
+        self.quantity_needed = quantity_needed
+        self.is_open = is_open
+        self.location = location
+
+    @property
+    def pk(self):
+        return self.id
+
+    # Same as Item's
+    @property
+    def is_on_shopping_list(self):
+        return self.quantity_needed > 0
+
+
+class ItemRowIterable(ValuesListIterable):
+    def __iter__(self):
+        for row in super().__iter__():
+            yield ItemRow(*row)
+
+
+class ItemQuerySet(models.QuerySet):
+    # These filters must stay in step with the partial indexes in Item.Meta
+    def in_stock(self):
+        """Items physically present (sealed quantity > 0 OR an open unit exists)."""
+        return self.filter(Q(quantity__gt=0) | Q(is_open=True))
+
+    def needed(self):
+        """Items on the shopping list (quantity_needed > 0)."""
+        return self.filter(quantity_needed__gt=0)
+
+    def rows(self):
+        """The items as ItemRow objects, for rendering list rows."""
+        clone = self.values_list(*ItemRow.__slots__)
+        clone._iterable_class = ItemRowIterable
+        return clone
+
+    def stock_states(self):
+        """Maps item id to its stock state (see Item.stock_state) in one query."""
+        return {row['id']: row for row in self.order_by().values(*Item.STATE_FIELDS)}
+
+
 class Item(models.Model):
-    name = models.CharField(max_length=100, unique=True)
-    # Represents the quantity of UNOPENED/SEALED units
-    quantity = models.DecimalField(
+    # Not indexed alone: the unique constraint's index leads with it
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, default=sites.current, db_index=False,
+                             related_name='items')
+    name = models.CharField(max_length=100)
+    # Represents the quantity of UNOPENED/SEALED units. Like every quantity
+    # here, stored as integer hundredths (see inventory/fields.py).
+    quantity = FixedPointField(
         max_digits=10,
         decimal_places=2,
         default=0,
@@ -13,7 +95,7 @@ class Item(models.Model):
     )
     unit = models.CharField(max_length=20, null=True, blank=True)
     # How many units are needed for the shopping list. 0 means not on list.
-    quantity_needed = models.DecimalField(
+    quantity_needed = FixedPointField(
         max_digits=10,
         decimal_places=2,
         default=0,
@@ -26,9 +108,35 @@ class Item(models.Model):
                                help_text="Where this item should be stored (e.g., 'Pantry', 'Fridge', 'Freezer')")
     added_date = models.DateTimeField(default=timezone.now)
 
+    objects = SiteManager.from_queryset(ItemQuerySet)()
+
+    # Fields that make up an item's stock state, as reported by the stock_changed signal
+    STATE_FIELDS = ('id', 'site_id', 'quantity', 'quantity_needed', 'is_open', 'location')
+
     def __str__(self):
         return self.name
 
+    def stock_state(self):
+        """This item's stock state as a dict of STATE_FIELDS."""
+        return {field: getattr(self, field) for field in self.STATE_FIELDS}
+
+    # The receivers reporting a save or delete as a stock change (counters,
+    # ledger) then commit together with the row itself. The transaction starts
+    # with the stock lock, before the pre_save/delete reads: under WAL a
+    # transaction that reads before its first write fails at once if another
+    # writer committed in between.
+    def save(self, *args, **kwargs):
+        from .stock import lock_stock
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            lock_stock()
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        from .stock import lock_stock
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            lock_stock()
+            return super().delete(*args, **kwargs)
+
     @property
     def is_on_shopping_list(self):
         """Helper property to check if item should be listed"""
@@ -36,11 +144,28 @@ class Item(models.Model):
 
     class Meta:
         ordering = ['name']
+        # Every index leads with the site, so a site's queries read only its own rows
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'name'], name='item_site_name_unique'),
+        ]
+        indexes = [
+            # Partial indexes matching ItemQuerySet.in_stock()/needed() exactly,
+            # ordered by name like the lists that use them
+            models.Index(fields=['site', 'name'], condition=Q(quantity__gt=0) | Q(is_open=True),
+                         name='item_in_stock_name_idx'),
+            models.Index(fields=['site', 'name'], condition=Q(quantity_needed__gt=0),
+                         name='item_needed_name_idx'),
+            # Per-location views
+            models.Index(fields=['site', 'location', 'name'], name='item_location_name_idx'),
+        ]
 
 class Barcode(models.Model):
-    code = models.CharField(max_length=100, unique=True)
+    # The item's site, copied so barcode lookups by code stay within a site
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, default=sites.current, db_index=False,
+                             related_name='+')
+    code = models.CharField(max_length=100)
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='barcodes')
-    quantity = models.DecimalField(
+    quantity = FixedPointField(
         max_digits=10,
         decimal_places=2,
         default=1.0,
@@ -49,6 +174,136 @@ class Barcode(models.Model):
     )
     description = models.CharField(max_length=255, blank=True, 
         help_text="Optional description (e.g., '1lb box', '12oz can')")
-    
+
+    objects = SiteManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'code'], name='barcode_site_code_unique'),
+        ]
+
     def __str__(self):
         return f"{self.code} - {self.item.name} ({self.quantity} {self.item.unit})"
+
+    def save(self, *args, **kwargs):
+        self.site_id = self.item.site_id
+        super().save(*args, **kwargs)
+
+
+class StockCounter(models.Model):
+    """
+    A running total over Item (items in stock, on the shopping list, per
+    location...). Maintained incrementally by inventory/counters.py so the
+    inventory page can show its headline numbers without scanning Item.
+    """
+    key = models.CharField(max_length=120, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+class StockEvent(models.Model):
+    """
+    One entry of the append-only stock ledger: how one action changed one
+    item's stock. Written by inventory/ledger.py in the same transaction as the
+    change itself; the Item rows are the current state these events add up to.
+    """
+    # Not a database constraint: events outlive the items they describe
+    item = models.ForeignKey(Item, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                             related_name='stock_events')
+    created = models.DateTimeField(default=timezone.now)
+    # What caused the change ('add', 'purchase', 'save', 'delete', ...)
+    action = models.CharField(max_length=20)
+    # Changes in sealed and needed quantity
+    quantity = FixedPointField(max_digits=10, decimal_places=2, default=0)
+    quantity_needed = FixedPointField(max_digits=10, decimal_places=2, default=0)
+    # The new open status, if it changed
+    is_open = models.BooleanField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created'], name='stockevent_created_idx'),
+            models.Index(fields=['item', 'id'], name='stockevent_item_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.created:%Y-%m-%d %H:%M} {self.action} item {self.item_id}"
+
+
+class StockSnapshot(models.Model):
+    """The stock of every item as of one point in the ledger (see inventory/ledger.py)."""
+    taken = models.DateTimeField(default=timezone.now, db_index=True)
+    # Id of the last StockEvent included
+    last_event_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Snapshot {self.taken:%Y-%m-%d %H:%M} (event {self.last_event_id})"
+
+
+class StockSnapshotRow(models.Model):
+    # Both looked up through the unique constraint's index
+    snapshot = models.ForeignKey(StockSnapshot, on_delete=models.CASCADE, db_index=False, related_name='rows')
+    item = models.ForeignKey(Item, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    quantity = FixedPointField(max_digits=10, decimal_places=2)
+    quantity_needed = FixedPointField(max_digits=10, decimal_places=2)
+    is_open = models.BooleanField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['snapshot', 'item'], name='stocksnapshotrow_item_unique'),
+        ]
+
+
+class ItemForecast(models.Model):
+    """
+    The consumption forecast for one item, as of the last `manage.py
+    forecast_needs` run (see inventory/forecast.py). Only items with some
+    consumption have one.
+    """
+    # Not a database constraint: rows are replaced wholesale by each run,
+    # so deleting an item need not look for its forecast
+    item = models.OneToOneField(Item, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True,
+                                related_name='forecast')
+    # Units used per day, a moving average over the ledger
+    daily_rate = models.FloatField()
+    # When the sealed stock is expected to run low enough to buy more
+    reorder_on = models.DateField()
+    # What the shopping list should say to last the review period
+    suggested_needed = FixedPointField(max_digits=10, decimal_places=2)
+    computed = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.item_id}: {self.daily_rate:.2f}/day, reorder on {self.reorder_on}"
+
+
+class SyncedScan(models.Model):
+    """
+    A scan received through the sync API, by the key its client gave it, with
+    the outcome it had. A batch resent after a lost response finds its scans
+    here and gets their outcomes again instead of applying them twice.
+    """
+    # Not indexed alone: the unique constraint's index leads with it
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, default=sites.current, db_index=False,
+                             related_name='+')
+    # Idempotency key, unique per client scan (a UUID in the scan page)
+    key = models.CharField(max_length=64)
+    code = models.CharField(max_length=100)
+    action = models.CharField(max_length=20)
+    # When the client scanned it, and when it arrived
+    scanned = models.DateTimeField()
+    received = models.DateTimeField(default=timezone.now, db_index=True)
+    # The result reported for it ('ok', 'not_found', 'insufficient', 'invalid')
+    status = models.CharField(max_length=20)
+    message = models.CharField(max_length=255, blank=True)
+    item_id = models.IntegerField(null=True)
+
+    objects = SiteManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'key'], name='syncedscan_site_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.key}: {self.action} {self.code} ({self.status})"
@@ -0,0 +1,85 @@
+# inventory/pagination.py
+"""
+Keyset ("seek") pagination for the list views.
+
+Pages are addressed by the last key seen (?after=<name>) rather than by an
+offset, so fetching page 500 costs the same as page 1: the database seeks
+straight into the unique index on the key column. A cursor stays valid while
+rows are added or removed in front of it.
+"""
+from django.conf import settings
+
+
+class KeysetPage:
+    def __init__(self, rows, next_url, page_size, is_first):
+        self.rows = rows
+        self.next_url = next_url
+        self.page_size = page_size
+        self.is_first = is_first
+
+    @property
+    def has_next(self):
+        return self.next_url is not None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+
+def get_page_size(request):
+    """Page size from ?page_size=, clamped to 1..LIST_MAX_PAGE_SIZE."""
+    default = getattr(settings, 'LIST_PAGE_SIZE', 100)
+    maximum = getattr(settings, 'LIST_MAX_PAGE_SIZE', 500)
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except ValueError:
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+def keyset_paginate(request, queryset, key):
+    """
+    Returns the page of `queryset` (ordered by the unique column `key`) that
+    follows the ?after= cursor in the request.
+    """
+    query, page_size = page_query(request, queryset, key)
+    return make_page(request, list(query), key, page_size)
+
+
+async def akeyset_paginate(request, queryset, key):
+    """Async keyset_paginate(), fetching the rows with the async ORM."""
+    query, page_size = page_query(request, queryset, key)
+    return make_page(request, [row async for row in query], key, page_size)
+
+
+def page_query(request, queryset, key):
+    page_size = get_page_size(request)
+    after = request.GET.get('after')
+
+    queryset = queryset.order_by(key)
+    if after:
+        queryset = queryset.filter(**{f'{key}__gt': after})
+    # Fetch one extra row to know whether there is a next page
+    return queryset[:page_size + 1], page_size
+
+
+def make_page(request, rows, key, page_size):
+    next_url = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        params = request.GET.copy()
+        params['after'] = getattr(rows[-1], key)
+        params.pop('partial', None)
+        next_url = f'{request.path}?{params.urlencode()}'
+
+    return KeysetPage(rows, next_url, page_size, is_first=not request.GET.get('after'))
+
+
+def wants_partial(request):
+    """True for the "load more" requests that only want the next rows, not the whole page."""
+    return request.GET.get('partial') == '1'
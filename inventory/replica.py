@@ -0,0 +1,132 @@
+# inventory/replica.py
+"""
+Read replica for the list pages and exports.
+
+With REPLICA_DB set, the settings add a "replica" database: a second SQLite
+file that `manage.py sync_replica` refreshes from the primary every
+REPLICA_SYNC_SECONDS through SQLite's online backup API. Views decorated
+with @replica_reads (the inventory, shopping and barcode lists, exports)
+then read the inventory tables from it, so they never queue behind the
+scans for the primary's write lock. Every write, every other view and the
+session and auth tables stay on the primary.
+
+The replica may be up to REPLICA_LAG_SECONDS behind. A browser that has just
+written (any POST) reads from the primary for that long, so it sees its own
+changes; and list pages served from the replica take a change feed cursor
+that far back, so they are sent everyone else's changes of those seconds
+as soon as they open.
+"""
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+ALIAS = 'replica'
+# Holds the time until which a browser reads from the primary
+STICKY_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_reading = ContextVar('inventory_replica_reads', default=False)
+
+
+def configured():
+    return ALIAS in connections.settings
+
+
+def active():
+    """Whether the inventory tables are being read from the replica right now."""
+    return _reading.get()
+
+
+def lag():
+    """How far behind the data being read may be, in seconds."""
+    return settings.REPLICA_LAG_SECONDS if _reading.get() else 0
+
+
+def sticky(request):
+    """Whether the request comes from a browser that wrote recently."""
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@contextmanager
+def reads_for(request):
+    token = _reading.set(configured() and not sticky(request))
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+def replica_reads(view):
+    """Marks a view (sync or async) that only reads, and so may read from the replica."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with reads_for(request):
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with reads_for(request):
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Reads of the inventory app inside @replica_reads views go to the replica; everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _reading.get() and model._meta.app_label == 'inventory':
+            return ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Also for objects read from the replica, which would otherwise be saved back there
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica is a copy: it gets the schema with the data
+        return False if db == ALIAS else None
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """Sends a browser's reads to the primary for REPLICA_LAG_SECONDS after each of its writes."""
+
+    def process_response(self, request, response):
+        if configured() and request.method not in SAFE_METHODS:
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + settings.REPLICA_LAG_SECONDS),
+                max_age=settings.REPLICA_LAG_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+
+def sync():
+    """
+    Copies the primary database into the replica file with SQLite's online
+    backup API, in one step; returns the seconds it took. The primary is
+    read-locked meanwhile, which under WAL (SQLITE_PROFILE=production)
+    keeps no writer waiting; readers of the replica see the old copy until
+    it is complete.
+    """
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    started = time.perf_counter()
+    target = sqlite3.connect(connections.settings[ALIAS]['NAME'])
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
+    return time.perf_counter() - started
@@ -0,0 +1,155 @@
+# inventory/search.py
+"""
+Item search over names, locations and barcodes (codes and descriptions).
+
+On SQLite the index is an FTS5 table (inventory_search, created by migration
+0007) holding one row per item, with the item id as its rowid. The receivers
+in inventory/signals.py re-index an item when its name or location changes or
+one of its barcodes is saved or deleted; bulk writes (import_inventory) index
+what they wrote themselves, and `manage.py rebuild_search_index` rebuilds the
+whole table.
+
+Every word of a query matches as a prefix ("mil pan" finds "Milk" stored in
+the "Pantry"), in any column; when the words never all match together, items
+matching any of them are returned instead. Matches are read in stages of at
+most CANDIDATES rows (name matches first) and ranked by a cheap score rather
+than by bm25(): bm25 reads every match of a query first, so a common prefix
+on a large catalog would take hundreds of milliseconds. Other databases fall
+back to icontains lookups.
+
+Each row also stores the item's site (an UNINDEXED column, added by
+migration 0010): while a site is active, matches of other sites are skipped
+as they are read, before the CANDIDATES limit.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from . import sites
+from .models import Barcode, Item
+
+TABLE = 'inventory_search'
+# Matches read (and ranked) per query
+CANDIDATES = 200
+# Shortest query typeahead answers (see match_expression)
+MIN_TYPEAHEAD_LENGTH = 2
+
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "name, location, barcodes, site UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')"
+)
+
+# One index row per item, from the item and its barcodes
+INDEX_ROWS = (
+    f"INSERT INTO {TABLE} (rowid, name, location, barcodes, site) "
+    "SELECT item.id, item.name, COALESCE(item.location, ''), "
+    f"COALESCE((SELECT group_concat(barcode.code || ' ' || barcode.description, ' ') "
+    f"FROM {Barcode._meta.db_table} barcode WHERE barcode.item_id = item.id), ''), item.site_id "
+    f"FROM {Item._meta.db_table} item"
+)
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def index_items(item_ids):
+    """(Re-)indexes the items `item_ids`, dropping those that no longer exist."""
+    item_ids = list(item_ids)
+    if not item_ids or not available():
+        return
+    placeholders = ', '.join(['%s'] * len(item_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})", item_ids)
+        cursor.execute(f"{INDEX_ROWS} WHERE item.id IN ({placeholders})", item_ids)
+
+
+def remove_items(item_ids):
+    item_ids = list(item_ids)
+    if not item_ids or not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(item_ids))})", item_ids)
+
+
+def rebuild():
+    """Re-indexes every item from scratch; returns the number of items indexed."""
+    if not available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(INDEX_ROWS)
+        count = cursor.rowcount
+        # Merge the index into as few b-trees as possible for faster queries
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return count
+
+
+def terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def match_expression(words, any_word=False):
+    # Words are \w+ only, so quoting them is enough to keep FTS5 syntax out.
+    # Prefixes of up to 6 characters are indexed; longer ones are rare enough
+    # to be cheap. A single character would expand to a large share of all
+    # the terms, so it only matches itself.
+    return (' OR ' if any_word else ' ').join(f'"{word}"' if len(word) == 1 else f'"{word}"*' for word in words)
+
+
+def score(words, name):
+    """Sort key: names starting with the first word, then names matching more of the words, then shorter ones."""
+    name_words = terms(name)
+    in_name = sum(any(part.startswith(word) for part in name_words) for word in words)
+    return (not name.lower().startswith(words[0]), -in_name, len(name), name)
+
+
+def search(query, limit=20):
+    """The best `limit` matches for `query`, as (item id, name, location) tuples."""
+    words = terms(query)
+    if not words:
+        return []
+    if not available():
+        return fallback_search(words, limit)
+    # Items with every word in their name, then (if that is not `limit` yet)
+    # with every word anywhere; failing both, items with any of the words
+    expression = match_expression(words)
+    stages = [f'name : ({expression})', expression]
+    found = {}
+    with connection.cursor() as cursor:
+        for stage, match in enumerate(stages):
+            found.update(matches(cursor, match, words, stage, found))
+            if len(found) >= limit:
+                break
+        if not found and len(words) > 1:
+            found = matches(cursor, match_expression(words, any_word=True), words, len(stages), found)
+    return [row for key, row in sorted(found.values())[:limit]]
+
+
+def matches(cursor, match, words, stage, found):
+    """{item id: (sort key, row)} of up to CANDIDATES items matching `match`, except those already `found`."""
+    site_id = sites.active()
+    if site_id is None:
+        cursor.execute(f"SELECT rowid, name, location FROM {TABLE} WHERE {TABLE} MATCH %s LIMIT %s",
+                       [match, CANDIDATES])
+    else:
+        cursor.execute(f"SELECT rowid, name, location FROM {TABLE} WHERE {TABLE} MATCH %s AND site = %s LIMIT %s",
+                       [match, site_id, CANDIDATES])
+    return {
+        item_id: ((stage, *score(words, name)), (item_id, name, location or None))
+        for item_id, name, location in cursor.fetchall()
+        if item_id not in found
+    }
+
+
+def fallback_search(words, limit):
+    condition = Q()
+    for word in words:
+        condition &= (Q(name__icontains=word) | Q(location__icontains=word)
+                      | Q(barcodes__code__icontains=word) | Q(barcodes__description__icontains=word))
+    rows = list(Item.objects.filter(condition).distinct().values_list('id', 'name', 'location')[:CANDIDATES])
+    rows.sort(key=lambda row: score(words, row[1]))
+    return rows[:limit]
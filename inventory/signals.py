@@ -0,0 +1,135 @@
+# inventory/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import counters, ledger, search, sites
+from .barcode_cache import barcode_cache
+from .feed import change_feed
+from .models import Item, Barcode, Site
+
+# Sent whenever item stock changes, by the update paths in inventory/stock.py
+# and by Item saves/deletes. `changes` is a list of (before, after) stock_state
+# dicts (before is None for a new item, after is None for a deleted one) and
+# `action` names what caused it ('add', 'purchase', 'save', ...).
+stock_changed = Signal()
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def forget_site_domains(sender, **kwargs):
+    # Only this process's copy; others reload theirs when restarted
+    sites.domains.forget()
+
+
+@receiver(pre_save, sender=Barcode)
+def forget_renamed_barcode(sender, instance, **kwargs):
+    """Drops the cache entry for a barcode's old code when the code is edited."""
+    instance._item_before = None
+    if instance.pk:
+        old = Barcode.objects.filter(pk=instance.pk).values_list('code', 'item_id', 'site_id').first()
+        if old:
+            old_code, instance._item_before, old_site_id = old
+            if old_code != instance.code:
+                barcode_cache.invalidate(old_site_id, old_code)
+
+
+@receiver(post_save, sender=Barcode)
+@receiver(post_delete, sender=Barcode)
+def forget_barcode(sender, instance, origin=None, **kwargs):
+    barcode_cache.invalidate(instance.site_id, instance.code)
+    # Deleting an item cascades here; its own version bump already covers the barcode list
+    if not isinstance(origin, Item):
+        counters.touch(counters.BARCODES_VERSION, site_id=instance.site_id)
+
+
+@receiver(post_save, sender=Item)
+def forget_item_barcodes(sender, instance, created, **kwargs):
+    # A brand new item has no barcodes yet. Deleting an item needs no receiver:
+    # the cascade sends post_delete for each of its barcodes.
+    if not created:
+        barcode_cache.invalidate_item(instance.pk)
+
+
+# --- Reporting model saves as stock changes ---
+
+@receiver(pre_save, sender=Item)
+def remember_stock_state(sender, instance, raw=False, **kwargs):
+    """Records the stored state (and name) of an item about to be saved (forms and admin save whole rows)."""
+    instance._stock_before = instance._name_before = None
+    if not raw and not instance._state.adding:
+        state = Item.objects.filter(pk=instance.pk).values(*Item.STATE_FIELDS, 'name').first()
+        if state is not None:
+            instance._name_before = state.pop('name')
+            instance._stock_before = state
+
+
+@receiver(post_save, sender=Item)
+def report_saved_item(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before, after = instance._stock_before, instance.stock_state()
+    if before != after:
+        stock_changed.send(sender=Item, action='save', changes=[(before, after)])
+
+
+@receiver(post_delete, sender=Item)
+def report_deleted_item(sender, instance, **kwargs):
+    stock_changed.send(sender=Item, action='delete', changes=[(instance.stock_state(), None)])
+
+
+# --- Consumers of stock_changed ---
+
+@receiver(stock_changed)
+def update_counters(sender, changes, action, **kwargs):
+    # In the same UPDATE, the item version of every site with a changed item
+    counters.apply_changes(changes, touch=[counters.ITEMS_VERSION])
+
+
+@receiver(stock_changed)
+def record_stock_events(sender, changes, action, **kwargs):
+    ledger.record(changes, action)
+
+
+@receiver(post_save, sender=Item)
+def touch_edited_item(sender, instance, raw=False, **kwargs):
+    """Advances the item version for saves that change no stock (and so send no stock_changed)."""
+    if raw or instance._stock_before == instance.stock_state():
+        counters.touch(counters.ITEMS_VERSION, site_id=instance.site_id)
+
+
+@receiver(stock_changed)
+def publish_stock_changes(sender, changes, **kwargs):
+    item_ids = {(before or after)['id'] for before, after in changes}
+    # Open pages fetch the rows as soon as they hear of them: wait for the commit
+    transaction.on_commit(lambda: change_feed.publish(item_ids))
+
+
+@receiver(post_save, sender=Item)
+def publish_item_edit(sender, instance, raw=False, **kwargs):
+    """Publishes edits that leave the stock alone (name, unit...); the rest arrive through stock_changed."""
+    if not raw and instance._stock_before == instance.stock_state():
+        transaction.on_commit(lambda: change_feed.publish([instance.pk]))
+
+
+# --- Search index (inventory/search.py) ---
+
+@receiver(post_save, sender=Item)
+def index_saved_item(sender, instance, created, raw=False, **kwargs):
+    before = instance._stock_before
+    if (created or before is None or instance._name_before != instance.name
+            or before['location'] != instance.location):
+        search.index_items([instance.pk])
+
+
+@receiver(post_delete, sender=Item)
+def unindex_deleted_item(sender, instance, **kwargs):
+    search.remove_items([instance.pk])
+
+
+@receiver(post_save, sender=Barcode)
+@receiver(post_delete, sender=Barcode)
+def index_barcode_items(sender, instance, origin=None, **kwargs):
+    # Not when deleting an item: unindex_deleted_item drops its row
+    if not isinstance(origin, Item):
+        search.index_items({instance.item_id, getattr(instance, '_item_before', None)} - {None})
@@ -0,0 +1,98 @@
+# inventory/sites.py
+"""
+Sites: the kitchens sharing one deployment, each with its own items and
+barcodes.
+
+The current site is a context variable, set per request by SiteMiddleware
+from the host name (Site.domain; unknown hosts get the default site). While
+one is active, Item.objects and Barcode.objects only see that site's rows,
+and every list, scan and search query leads with its site id, so it reads
+only that site's part of the (site, ...) indexes. New rows go to the active
+site. Outside a request (management commands, the shell) no site is active:
+the managers see every site and new rows go to the default one, unless the
+code runs inside `activate(site_id)`.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+# Created by migration 0010 and owner of the rows from before sites existed
+DEFAULT_SITE_ID = 1
+
+_active = ContextVar('inventory_site', default=None)
+
+
+def active():
+    """The id of the site activated for this request or block, or None."""
+    return _active.get()
+
+
+def current():
+    """The site new rows belong to: the active one, else the default site."""
+    site_id = _active.get()
+    return DEFAULT_SITE_ID if site_id is None else site_id
+
+
+@contextmanager
+def activate(site_id):
+    token = _active.set(site_id)
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+class Domains:
+    """{host name: site id} of every site, loaded once per process and reloaded after a Site changes."""
+
+    def __init__(self):
+        self._domains = None
+        self._lock = threading.Lock()
+
+    def site_for(self, host):
+        domains = self._domains
+        if domains is None:
+            from .models import Site
+            domains = dict(Site.objects.values_list('domain', 'pk'))
+            with self._lock:
+                self._domains = domains
+        return domains.get(host.rsplit(':', 1)[0].lower(), DEFAULT_SITE_ID)
+
+    def loaded(self):
+        return self._domains is not None
+
+    def forget(self):
+        with self._lock:
+            self._domains = None
+
+
+domains = Domains()
+
+
+class SiteMiddleware:
+    """Activates the site of the request's host for the rest of the request (also as request.site_id)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.site_id = domains.site_for(request.get_host())
+        with activate(request.site_id):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if domains.loaded():
+            request.site_id = domains.site_for(request.get_host())
+        else:
+            request.site_id = await sync_to_async(domains.site_for)(request.get_host())
+        with activate(request.site_id):
+            return await self.get_response(request)
@@ -0,0 +1,26 @@
+# inventory/sqlite.py
+"""
+Per-connection SQLite tuning.
+
+PRAGMAs such as synchronous, busy_timeout and cache_size only last for the
+connection that set them, so they are applied to every new database
+connection from the connection_created signal. Which ones are used is
+chosen by SQLITE_PROFILE in the settings (see SQLITE_PROFILES there).
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def pragma_statements(pragmas):
+    """The PRAGMA statements for a {name: value} profile, in order."""
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    for statement in pragma_statements(getattr(settings, 'SQLITE_PRAGMAS', {})):
+        # Straight on the DB-API connection: these are not queries to log or count
+        connection.connection.execute(statement)
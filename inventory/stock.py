@@ -0,0 +1,346 @@
+# inventory/stock.py
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from . import counters, fields, search, sites
+from .barcode_cache import barcode_cache
+from .models import Item, Barcode, SyncedScan
+from .signals import stock_changed
+
+SCAN_ACTIONS = ('add', 'remove', 'open')
+
+# Upper bound on events accepted in one batch (keeps the IN (...) lists sane)
+MAX_SCAN_BATCH = 1000
+# Same for the items selected for one bulk list action
+MAX_BULK_ITEMS = 1000
+# How long synced scan keys are remembered: a client resending a batch
+# later than this would have it applied again
+SYNC_KEY_DAYS = 30
+
+
+def scan_message(action, quantity, name, unit):
+    """Plain-text description of a successful scan, matching the scan page wording."""
+    unit = unit or ''
+    if action == 'add':
+        return f"Added {quantity} {unit} of {name} to inventory"
+    elif action == 'remove':
+        return f"Removed {quantity} {unit} of {name} from inventory and updated shopping list"
+    return f"Marked {name} as open and added to shopping list"
+
+
+# --- Change tracking ---
+
+def lock_stock():
+    """
+    Starts a stock transaction with a write (bumping the 'changes' counter).
+    On SQLite this takes the database write lock before any item row is read,
+    so the states recorded around an update cannot interleave with another
+    writer; elsewhere the counter row lock serializes stock transactions.
+    The item version the list ETags use moves with the counters of the sites
+    whose items changed (see the update_counters receiver).
+    """
+    counters.increment({counters.CHANGES: 1})
+
+
+@contextmanager
+def tracking(item_ids, action):
+    """
+    Runs the enclosed updates in one transaction and sends stock_changed with
+    the before/after state of every item in `item_ids` that changed.
+    """
+    with transaction.atomic():
+        lock_stock()
+        before = Item.objects.filter(pk__in=item_ids).stock_states()
+        yield
+        after = Item.objects.filter(pk__in=item_ids).stock_states()
+        changes = [
+            (before.get(pk), after.get(pk))
+            for pk in before.keys() | after.keys()
+            if before.get(pk) != after.get(pk)
+        ]
+        if changes:
+            stock_changed.send(sender=Item, action=action, changes=changes)
+
+
+# --- Single-row stock updates ---
+# Each of these is one conditional UPDATE evaluated by the database against the
+# current row, so concurrent scanners can never act on a stale quantity.
+# They return the number of rows changed (0 means the guard did not match).
+# Quantities enter the SQL through fields.quantity(), as the columns hold
+# hundredths (see inventory/fields.py).
+
+ZERO = fields.quantity(Decimal('0'))
+
+
+def add_stock(item_id, quantity):
+    """Adds sealed stock and takes the same amount off the shopping list (never below zero)."""
+    with tracking([item_id], 'add'):
+        return Item.objects.filter(pk=item_id).update(
+            quantity=F('quantity') + fields.quantity(quantity),
+            quantity_needed=Greatest(F('quantity_needed') - fields.quantity(quantity), ZERO),
+        )
+
+
+def remove_stock(item_id, quantity):
+    """Removes sealed stock if enough is left, putting the item on the shopping list."""
+    with tracking([item_id], 'remove'):
+        return Item.objects.filter(pk=item_id, quantity__gte=quantity).update(
+            quantity=F('quantity') - fields.quantity(quantity),
+            # If not on shopping list, add it with quantity 1
+            quantity_needed=Case(
+                When(quantity_needed=0, then=fields.quantity(Decimal('1'))),
+                default=F('quantity_needed'),
+            ),
+        )
+
+
+def open_package(item_id):
+    """Marks a unit as open and needs one more on the shopping list."""
+    with tracking([item_id], 'open'):
+        return Item.objects.filter(pk=item_id).update(
+            is_open=True,
+            quantity_needed=F('quantity_needed') + fields.quantity(Decimal('1')),
+        )
+
+
+def purchase(item_id, quantity):
+    """Adds purchased units to the sealed stock and clears the item from the shopping list."""
+    with tracking([item_id], 'purchase'):
+        return Item.objects.filter(pk=item_id).update(
+            quantity=F('quantity') + fields.quantity(quantity),
+            quantity_needed=ZERO,
+        )
+
+
+def apply_scan(barcode, action):
+    """Applies a single scan action for `barcode`; returns False if it could not be applied."""
+    if action == 'add':
+        return add_stock(barcode.item_id, barcode.quantity) > 0
+    elif action == 'remove':
+        return remove_stock(barcode.item_id, barcode.quantity) > 0
+    elif action == 'open':
+        return open_package(barcode.item_id) > 0
+    raise ValueError(f"Unknown scan action '{action}'")
+
+
+# --- Batches ---
+
+def apply_scan_batch(events):
+    """
+    Applies a list of (code, action) scan events in one transaction.
+
+    All codes are resolved with a single query, the per-item changes are
+    accumulated in memory (in event order, so a 'remove' sees the stock added
+    by an earlier 'add' in the same batch) and written back with one UPDATE.
+    Returns one result dict per event, in the same order as `events`.
+    """
+    with transaction.atomic():
+        lock_stock()
+        return apply_scans(events)
+
+
+def apply_scans(events, action='scan_batch'):
+    """apply_scan_batch() within a stock transaction the caller has started, reporting the change as `action`."""
+    results = [None] * len(events)
+    codes = {code for code, action in events}
+
+    # Lock the item rows for the rest of the transaction (a no-op on SQLite,
+    # where lock_stock() already serialized the batch)
+    barcodes = {
+        barcode.code: barcode
+        for barcode in Barcode.objects.select_related('item')
+                                      .select_for_update(of=('item',))
+                                      .filter(code__in=codes)
+    }
+    # Running state per item id: the row as read plus the accumulated changes
+    items = {}
+    before = {}
+    deltas = {}
+
+    for index, (code, scan_action) in enumerate(events):
+        result = {'code': code, 'action': scan_action}
+        results[index] = result
+
+        if scan_action not in SCAN_ACTIONS:
+            result.update(status='invalid', message=f"Unknown action '{scan_action}'")
+            continue
+        barcode = barcodes.get(code)
+        if barcode is None:
+            result.update(status='not_found', message=f"Barcode {code} not found. Please add it first.")
+            continue
+
+        item = items.get(barcode.item_id)
+        if item is None:
+            item = items[barcode.item_id] = barcode.item
+            before[item.pk] = item.stock_state()
+        result['item_id'] = item.pk
+
+        if scan_action == 'add':
+            # Add to inventory and decrease shopping list (never below zero)
+            item.quantity += barcode.quantity
+            item.quantity_needed = max(0, item.quantity_needed - barcode.quantity)
+            deltas[item.pk] = deltas.get(item.pk, 0) + barcode.quantity
+        elif scan_action == 'remove':
+            if item.quantity < barcode.quantity:
+                result.update(status='insufficient', message=f"Not enough {item.name} in inventory to remove")
+                continue
+            item.quantity -= barcode.quantity
+            # If not on shopping list, add it with quantity 1
+            if item.quantity_needed == 0:
+                item.quantity_needed = 1
+            deltas[item.pk] = deltas.get(item.pk, 0) - barcode.quantity
+        else:
+            # Mark a package as open and increase shopping list quantity
+            item.is_open = True
+            item.quantity_needed += 1
+            deltas.setdefault(item.pk, 0)
+
+        result.update(status='ok', message=scan_message(scan_action, barcode.quantity, item.name, item.unit),
+                      location=item.location)
+
+    if deltas:
+        # One UPDATE for every touched item. Sealed quantity is applied as a
+        # relative delta; needed/open are the values computed above.
+        touched = [items[pk] for pk in deltas]
+        Item.objects.filter(pk__in=deltas).update(
+            quantity=Case(
+                *[When(pk=pk, then=F('quantity') + fields.quantity(delta)) for pk, delta in deltas.items()],
+                default=F('quantity'),
+                output_field=Item._meta.get_field('quantity'),
+            ),
+            quantity_needed=Case(
+                *[When(pk=item.pk, then=fields.quantity(item.quantity_needed)) for item in touched],
+                default=F('quantity_needed'),
+                output_field=Item._meta.get_field('quantity_needed'),
+            ),
+            is_open=Case(
+                *[When(pk=item.pk, then=Value(item.is_open)) for item in touched],
+                default=F('is_open'),
+            ),
+        )
+        # The rows were read under the lock, so the simulated state is what was written
+        changes = [(before[item.pk], item.stock_state()) for item in touched]
+        stock_changed.send(sender=Item, action=action, changes=changes)
+
+    return results
+
+
+def sync_scans(scans):
+    """
+    Applies scans queued by an offline client: dicts of 'key' (the client's
+    idempotency key), 'code', 'action', 'scanned' (when it was scanned) and
+    'error' (why the scan is malformed, or None).
+
+    The scans whose keys were never seen are applied in scan time order, with
+    apply_scans(), and recorded as SyncedScan rows with their outcome, all in
+    one stock transaction; the lock it starts with also keeps two retries of
+    the same batch from both finding its keys new. Malformed scans are
+    recorded as invalid without being applied, except those without a key,
+    which can only be reported. Scans already synced (or repeated within the
+    batch) are not applied again. Returns one result dict per scan, in the
+    same order as `scans`, with 'replayed' telling whether it was applied by
+    an earlier request.
+    """
+    site_id = sites.current()
+    now = timezone.now()
+    keyed = [scan for scan in scans if scan['key'] is not None]
+    with transaction.atomic():
+        lock_stock()
+        SyncedScan.objects.filter(site_id=site_id, received__lt=now - timedelta(days=SYNC_KEY_DAYS)).delete()
+        known = {
+            synced.key: synced
+            for synced in SyncedScan.objects.filter(site_id=site_id, key__in={scan['key'] for scan in keyed})
+        }
+        fresh = {}
+        for scan in sorted(keyed, key=lambda scan: scan['scanned'] or now):
+            if scan['key'] not in known:
+                fresh.setdefault(scan['key'], scan)
+        applied = iter(apply_scans([(scan['code'], scan['action']) for scan in fresh.values() if not scan['error']],
+                                   action='scan_sync'))
+        outcomes = [
+            {'code': scan['code'], 'action': scan['action'], 'status': 'invalid', 'message': scan['error']}
+            if scan['error'] else next(applied)
+            for scan in fresh.values()
+        ]
+        # Cut to the column sizes: a malformed scan may carry any code or action
+        SyncedScan.objects.bulk_create([
+            SyncedScan(site_id=site_id, key=key, code=scan['code'][:100], action=scan['action'][:20],
+                       scanned=scan['scanned'] or now, received=now, status=outcome['status'],
+                       message=outcome['message'][:255], item_id=outcome.get('item_id'))
+            for (key, scan), outcome in zip(fresh.items(), outcomes)
+        ])
+    stored = {
+        key: {'code': synced.code, 'action': synced.action, 'status': synced.status,
+              'message': synced.message, 'item_id': synced.item_id}
+        for key, synced in known.items()
+    }
+    # Replayed scans get the current location of their items, which is not stored
+    locations = dict(Item.objects.filter(pk__in=[synced.item_id for synced in known.values()
+                                                 if synced.status == 'ok']).values_list('pk', 'location'))
+    for result in stored.values():
+        if result['status'] == 'ok':
+            result['location'] = locations.get(result['item_id'])
+    stored.update((key, {'item_id': None, **outcome}) for key, outcome in zip(fresh, outcomes))
+    return [
+        {'key': scan['key'], **stored[scan['key']], 'replayed': fresh.get(scan['key']) is not scan}
+        if scan['key'] is not None else
+        {'key': None, 'code': scan['code'], 'action': scan['action'], 'status': 'invalid',
+         'message': scan['error'], 'item_id': None, 'replayed': False}
+        for scan in scans
+    ]
+
+
+# --- Bulk list actions ---
+# Set-based versions of the per-item actions of the list pages: each is one
+# statement over all the selected items, in one stock transaction. They
+# return the number of items changed.
+
+def purchase_needed(item_ids):
+    """Buys what the shopping list says: the needed quantity of each item moves to its sealed stock."""
+    with tracking(item_ids, 'purchase'):
+        return Item.objects.filter(pk__in=item_ids, quantity_needed__gt=0).update(
+            quantity=F('quantity') + F('quantity_needed'),
+            quantity_needed=ZERO,
+        )
+
+
+def clear_needed(item_ids):
+    """Takes the items off the shopping list."""
+    with tracking(item_ids, 'clear'):
+        return Item.objects.filter(pk__in=item_ids, quantity_needed__gt=0).update(quantity_needed=ZERO)
+
+
+def move_items(item_ids, location):
+    """Sets the storage location of the items (None for none)."""
+    with tracking(item_ids, 'move'):
+        moved = Item.objects.filter(pk__in=item_ids).update(location=location)
+        # Scans show the location, and search finds items by it
+        barcode_cache.invalidate_items(item_ids)
+        search.index_items(item_ids)
+    return moved
+
+
+def delete_items(item_ids):
+    """Deletes the items and their barcodes."""
+    # The raw DELETEs below bypass the site-scoped managers, so keep only the
+    # ids of the current site's items
+    item_ids = list(Item.objects.filter(pk__in=item_ids).values_list('pk', flat=True))
+    if not item_ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(item_ids))
+    with tracking(item_ids, 'delete'):
+        codes = list(Barcode.objects.filter(item_id__in=item_ids).values_list('site_id', 'code'))
+        # One DELETE per table: QuerySet.delete() would load every item and
+        # barcode to send its delete signals, whose work is done here at once
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Barcode._meta.db_table} WHERE item_id IN ({placeholders})", item_ids)
+            cursor.execute(f"DELETE FROM {Item._meta.db_table} WHERE id IN ({placeholders})", item_ids)
+            deleted = cursor.rowcount
+        for site_id, code in codes:
+            barcode_cache.invalidate(site_id, code)
+        search.remove_items(item_ids)
+    return deleted
@@ -0,0 +1,12 @@
+# inventory/templatetags/inventory_rows.py
+from django import template
+
+from ..fragments import row_cache
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def item_rows(context, items, list_type):
+    """The rows of `items` (inventory/item_row.html), mostly from the row cache."""
+    return row_cache.render(context['request'], items, list_type)
@@ -1,3 +1,1509 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.contrib.messages import get_messages
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve, reverse
+from django.utils import timezone
+
+from . import async_views, benchmark, counters, export, forecast, ledger, metrics, replica, search, sites, stock
+from . import urls as inventory_urls
+from .barcode_cache import BarcodeCache, barcode_cache
+from .feed import ChangeFeed, change_feed
+from .fragments import CSRF_PLACEHOLDER, ROW_TEMPLATE, RowCache, row_cache
+from .models import Item, Barcode, ItemForecast, ItemRow, Site, StockEvent, StockSnapshot, SyncedScan
+
+
+@override_settings(SCAN_API_TOKENS=['station-token'])
+class ScanBatchTests(TestCase):
+    def setUp(self):
+        self.milk = Item.objects.create(name='Milk', quantity=1, quantity_needed=2, unit='gal')
+        self.rice = Item.objects.create(name='Rice', quantity=0)
+        Barcode.objects.create(code='111', item=self.milk, quantity=1)
+        Barcode.objects.create(code='222', item=self.rice, quantity=Decimal('2.5'))
+
+    def post_events(self, events, client=None, token='station-token'):
+        return (client or self.client).post(
+            reverse('inventory:scan_batch'),
+            data=json.dumps({'events': events}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+
+    def test_applies_events_in_order_and_reports_each(self):
+        response = self.post_events([
+            {'code': '111', 'action': 'add'},
+            ['222', 'add'],
+            ['222', 'remove'],
+            ['222', 'remove'],
+            ['999', 'add'],
+            ['111', 'open'],
+            ['111', 'explode'],
+        ])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [result['status'] for result in data['results']],
+            ['ok', 'ok', 'ok', 'insufficient', 'not_found', 'ok', 'invalid'],
+        )
+        self.assertEqual((data['applied'], data['failed']), (4, 3))
+
+        self.milk.refresh_from_db()
+        self.rice.refresh_from_db()
+        self.assertEqual(self.milk.quantity, 2)
+        # 2 needed, minus 1 added, plus 1 for the opened package
+        self.assertEqual(self.milk.quantity_needed, 2)
+        self.assertTrue(self.milk.is_open)
+        self.assertEqual(self.rice.quantity, 0)
+        self.assertEqual(self.rice.quantity_needed, 1)
+
+    def test_resolves_and_writes_with_constant_queries(self):
+        events = [['111', 'add']] * 50 + [['222', 'add']] * 50
+        # SAVEPOINT/RELEASE around the batch, the 'changes' counter bump that takes
+        # the write lock, one SELECT for the codes, one UPDATE, one counter UPDATE
+        with self.assertNumQueries(7):
+            self.post_events(events)
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.quantity, 51)
+        self.assertEqual(self.milk.quantity_needed, 0)
+
+    def test_rejects_malformed_payloads(self):
+        url = reverse('inventory:scan_batch')
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url, data='nope', content_type='application/json',
+                                          headers={'Authorization': 'Bearer station-token'}).status_code, 400)
+        self.assertEqual(self.post_events([['111']]).status_code, 400)
+
+    def test_stations_authenticate_with_a_token_instead_of_csrf(self):
+        station = Client(enforce_csrf_checks=True)
+        self.assertEqual(self.post_events([['111', 'add']], station).status_code, 200)
+        response = self.post_events([['111', 'add']], station, token='wrong')
+        self.assertEqual((response.status_code, response['WWW-Authenticate']), (401, 'Bearer'))
+        self.assertEqual(station.post(reverse('inventory:scan_batch'), data='{"events": []}',
+                                      content_type='application/json').status_code, 401)
+        with self.settings(SCAN_API_TOKENS=[]):
+            self.assertEqual(self.post_events([['111', 'add']], station).status_code, 401)
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.quantity, 2)
+
+
+class ScanSyncTests(TestCase):
+    def setUp(self):
+        self.milk = Item.objects.create(name='Milk', quantity=1, quantity_needed=2)
+        Barcode.objects.create(code='111', item=self.milk, quantity=1)
+        self.now = timezone.now()
+
+    def scan(self, key, action, minutes=0, code='111'):
+        return {'key': key, 'code': code, 'action': action, 'scanned': (self.now + timedelta(minutes=minutes)).isoformat()}
+
+    def sync(self, scans):
+        return self.client.post(reverse('inventory:scan_sync'), data=json.dumps({'scans': scans}),
+                                content_type='application/json')
+
+    def test_applies_scans_in_scan_order(self):
+        # The remove only succeeds after the add scanned before it
+        response = self.sync([self.scan('b', 'remove', 2), self.scan('c', 'remove', 3), self.scan('a', 'add', 1),
+                              self.scan('d', 'add', 4, code='999')])
+        self.assertEqual([result['status'] for result in response.json()['results']],
+                         ['ok', 'ok', 'ok', 'not_found'])
+        self.assertEqual(response.json()['applied'], 3)
+        self.milk.refresh_from_db()
+        self.assertEqual((self.milk.quantity, self.milk.quantity_needed), (0, 1))
+        self.assertEqual(StockEvent.objects.filter(action='scan_sync').count(), 1)
+
+    def test_resent_scans_are_not_applied_again(self):
+        scans = [self.scan('a', 'add'), self.scan('b', 'open', 1)]
+        first = self.sync(scans).json()
+        # The same batch again (its response was lost), with a new scan and a key repeated
+        second = self.sync(scans + [self.scan('c', 'add', 2), self.scan('c', 'add', 2)]).json()
+        self.assertEqual([result['replayed'] for result in second['results']], [True, True, False, True])
+        self.assertEqual(second['applied'], 1)
+        self.assertEqual(second['results'][:2], [{**result, 'replayed': True} for result in first['results']])
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.quantity, 3)
+        self.assertEqual(SyncedScan.objects.count(), 3)
+
+    def test_results_carry_the_storage_location(self):
+        Item.objects.filter(pk=self.milk.pk).update(location='Fridge')
+        results = self.sync([self.scan('a', 'add'), self.scan('b', 'add', code='999')]).json()['results']
+        self.assertEqual([result.get('location') for result in results], ['Fridge', None])
+        replayed = self.sync([self.scan('a', 'add')]).json()['results']
+        self.assertEqual((replayed[0]['replayed'], replayed[0]['location']), (True, 'Fridge'))
+
+    def test_old_keys_are_forgotten(self):
+        self.sync([self.scan('a', 'add')])
+        SyncedScan.objects.update(received=self.now - timedelta(days=stock.SYNC_KEY_DAYS + 1))
+        self.sync([self.scan('b', 'add')])
+        self.assertEqual(list(SyncedScan.objects.values_list('key', flat=True)), ['b'])
+
+    def test_rejects_malformed_payloads(self):
+        url = reverse('inventory:scan_sync')
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url, data='{"scans": {}}', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(url, data='[]', content_type='application/json').status_code, 400)
+        self.assertFalse(SyncedScan.objects.exists())
+
+    def test_malformed_scans_do_not_block_the_batch(self):
+        response = self.sync([
+            {'key': 'a', 'code': '111', 'action': 'add'},
+            {**self.scan('b', 'add'), 'scanned': 'yesterday'},
+            self.scan('', 'add'),
+            self.scan('c', 'add', code='https://example.com/' + 'x' * 200),
+            self.scan('d', 'x' * 50),
+            self.scan('e', 'add', 1),
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['invalid'] * 5 + ['ok'])
+        self.assertEqual(results[2]['key'], None)
+        self.assertEqual(response.json()['applied'], 1)
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.quantity, 2)
+        # Recorded like any other outcome, so a resend gets the same answer
+        self.assertEqual(set(SyncedScan.objects.values_list('key', 'status')),
+                         {('a', 'invalid'), ('b', 'invalid'), ('c', 'invalid'), ('d', 'invalid'), ('e', 'ok')})
+        self.assertEqual([result['replayed'] for result in self.sync([self.scan('c', 'add')]).json()['results']], [True])
+
+
+class ScanActionTests(TestCase):
+    def setUp(self):
+        barcode_cache.clear()
+        self.item = Item.objects.create(name='Flour', quantity=2, quantity_needed=3, unit='kg')
+        self.barcode = Barcode.objects.create(code='333', item=self.item, quantity=Decimal('1.5'))
+
+    def scan(self, action):
+        return self.client.post(reverse('inventory:scan_barcode'), {'barcode': '333', 'action': action})
+
+    def test_add_decrements_needed_without_going_negative(self):
+        self.scan('add')
+        self.scan('add')
+        self.scan('add')
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal('6.5'))
+        self.assertEqual(self.item.quantity_needed, 0)
+
+    def test_remove_is_refused_when_stock_is_short(self):
+        self.item.quantity_needed = 0
+        self.item.save()
+        self.scan('remove')
+        response = self.scan('remove')
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal('0.5'))
+        self.assertEqual(self.item.quantity_needed, 1)
+        self.assertContains(response, 'Not enough Flour')
+
+    def test_open_marks_open_and_needs_one_more(self):
+        self.scan('open')
+        self.item.refresh_from_db()
+        self.assertTrue(self.item.is_open)
+        self.assertEqual(self.item.quantity_needed, 4)
+
+    def test_scans_recover_from_stale_cache_entries(self):
+        self.assertEqual(barcode_cache.resolve('333').item_id, self.item.pk)
+        # Another process moves the code to a new item and deletes the old one:
+        # this process's cache never hears of it
+        sugar = Item.objects.create(name='Sugar', quantity=0)
+        Barcode.objects.filter(pk=self.barcode.pk).update(item=sugar)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Item._meta.db_table} WHERE id = %s", [self.item.pk])
+        self.assertContains(self.scan('add'), 'of Sugar to inventory')
+        sugar.refresh_from_db()
+        self.assertEqual(sugar.quantity, Decimal('1.5'))
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Barcode._meta.db_table} WHERE id = %s", [self.barcode.pk])
+            cursor.execute(f"DELETE FROM {Item._meta.db_table} WHERE id = %s", [sugar.pk])
+        response = self.scan('open')
+        self.assertContains(response, 'Barcode 333 not found')
+        self.assertNotContains(response, 'Not enough')
+
+    def test_purchase_does_not_overwrite_concurrent_changes(self):
+        stale = Item.objects.get(pk=self.item.pk)
+        stock.open_package(self.item.pk)
+        self.client.post(reverse('inventory:mark_purchased', args=[stale.pk]), {'quantity_purchased': '2'})
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 4)
+        self.assertEqual(self.item.quantity_needed, 0)
+        self.assertTrue(self.item.is_open)
+
+
+class ConcurrentScanTests(TransactionTestCase):
+    """Hammers one item from many threads and checks that no update is lost."""
+    threads = 8
+    scans_per_thread = 25
+    # Keeps the default site the data migration creates
+    serialized_rollback = True
+
+    def setUp(self):
+        self.item = Item.objects.create(name='Sugar', quantity=0, quantity_needed=0)
+
+    def run_concurrently(self, action):
+        """Runs `action` from several threads at once and returns how many calls succeeded."""
+        applied = []
+        start = threading.Event()
+
+        def worker():
+            start.wait()
+            try:
+                for _ in range(self.scans_per_thread):
+                    while True:
+                        try:
+                            applied.append(action())
+                            break
+                        except OperationalError:
+                            # The shared in-memory test database reports lock
+                            # contention instead of waiting; the statement did not run
+                            time.sleep(0.001)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        start.set()
+        for thread in workers:
+            thread.join()
+        return sum(applied)
+
+    def test_concurrent_adds_and_opens_are_exact(self):
+        total = self.threads * self.scans_per_thread
+        self.assertEqual(self.run_concurrently(lambda: stock.add_stock(self.item.pk, 1)), total)
+        self.assertEqual(self.run_concurrently(lambda: stock.open_package(self.item.pk)), total)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, total)
+        self.assertEqual(self.item.quantity_needed, total)
+        self.assertEqual(counters.verify(), {})
+
+    def test_concurrent_removes_never_oversell(self):
+        Item.objects.filter(pk=self.item.pk).update(quantity=50)
+        removed = self.run_concurrently(lambda: stock.remove_stock(self.item.pk, 1))
+        self.item.refresh_from_db()
+        self.assertEqual(removed, 50)
+        self.assertEqual(self.item.quantity, 0)
+        self.assertEqual(self.item.quantity_needed, 1)
+
+
+class BarcodeCacheTests(TestCase):
+    def setUp(self):
+        barcode_cache.clear()
+        self.item = Item.objects.create(name='Beans', unit='can', location='Pantry')
+        self.barcode = Barcode.objects.create(code='444', item=self.item, quantity=2)
+
+    def test_resolve_hits_after_first_lookup(self):
+        with self.assertNumQueries(1):  # warming
+            info = barcode_cache.resolve('444')
+        self.assertEqual((info.item_id, info.quantity, info.location), (self.item.pk, 2, 'Pantry'))
+        with self.assertNumQueries(0):
+            barcode_cache.resolve('444')
+        self.assertEqual(barcode_cache.stats()['hits'], 2)
+        self.assertIsNone(barcode_cache.resolve('nope'))
+
+    def test_edits_invalidate_entries(self):
+        barcode_cache.resolve('444')
+        self.item.location = 'Cellar'
+        self.item.save()
+        self.assertEqual(barcode_cache.resolve('444').location, 'Cellar')
+
+        self.barcode.code = '555'
+        self.barcode.save()
+        self.assertIsNone(barcode_cache.resolve('444'))
+        self.assertEqual(barcode_cache.resolve('555').barcode_id, self.barcode.pk)
+
+        self.barcode.delete()
+        self.assertIsNone(barcode_cache.resolve('555'))
+
+    def test_entries_cached_before_the_commit_are_dropped_after_it(self):
+        stale = barcode_cache.resolve('444')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.barcode.quantity = 5
+            self.barcode.save()
+            # A scan in another request, before the edit commits, reads and caches the old row
+            barcode_cache._set_many([stale])
+        self.assertEqual(barcode_cache.resolve('444').quantity, 5)
+
+    def test_local_cache_is_bounded(self):
+        cache = BarcodeCache(max_size=2, warm=False)
+        for code in ('a', 'b', 'c'):
+            Barcode.objects.create(code=code, item=self.item)
+            cache.resolve(code)
+        self.assertEqual(cache.stats()['size'], 2)
+        with self.assertNumQueries(1):
+            cache.resolve('a')
+
+    def test_shared_backend(self):
+        cache = BarcodeCache(alias='default', warm=False)
+        self.addCleanup(cache.clear)
+        cache.resolve('444')
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.resolve('444').name, 'Beans')
+        cache.invalidate(sites.DEFAULT_SITE_ID, '444')
+        with self.assertNumQueries(1):
+            cache.resolve('444')
+
+
+class QueryCountTests(TestCase):
+    """
+    Pins the query count of every view in inventory/urls.py, and of /metrics. Each request is made
+    against a small and then a larger catalog, so a count that grows with the
+    number of rows (an N+1) fails.
+    """
+    def setUp(self):
+        barcode_cache.clear()
+        # Loaded once per process, like the barcode cache's warm-up
+        sites.domains.site_for('testserver')
+        self.seeded = 0
+
+    def seed(self, count):
+        for _ in range(count):
+            self.seeded += 1
+            item = Item.objects.create(name=f'Item {self.seeded}', quantity=1, quantity_needed=1,
+                                       unit='box', location='Pantry')
+            Barcode.objects.create(code=f'code-{self.seeded}', item=item)
+        return item
+
+    def assertConstantQueries(self, expected, request):
+        """Calls request(item, barcode) on a fresh row after seeding 5, then 50 more rows."""
+        for size in (5, 50):
+            item = self.seed(size)
+            barcode = item.barcodes.get()
+            barcode_cache.warm()
+            with self.assertNumQueries(expected):
+                response = request(item, barcode)
+            self.assertLess(response.status_code, 400)
+
+    def get(self, name, *args):
+        return self.client.get(reverse(f'inventory:{name}', args=args))
+
+    def post(self, name, *args, data=None):
+        return self.client.post(reverse(f'inventory:{name}', args=args), data)
+
+    def test_list_views(self):
+        self.assertConstantQueries(2, lambda item, barcode: self.get('inventory_list'))
+        self.assertConstantQueries(2, lambda item, barcode: self.get('shopping_list'))
+        self.assertConstantQueries(2, lambda item, barcode: self.get('barcode_list'))
+
+    def test_item_views(self):
+        self.assertConstantQueries(0, lambda item, barcode: self.get('add_item'))
+        self.assertConstantQueries(7, lambda item, barcode: self.post(
+            'add_item', data={'name': f'New {item.pk}', 'quantity': 1, 'quantity_needed': 0,
+                              'location': 'Pantry'}))
+        self.assertConstantQueries(1, lambda item, barcode: self.get('edit_item', item.pk))
+        self.assertConstantQueries(8, lambda item, barcode: self.post(
+            'edit_item', item.pk, data={'name': item.name, 'quantity': 2, 'quantity_needed': 0,
+                                        'location': 'Pantry'}))
+        self.assertConstantQueries(8, lambda item, barcode: self.post('delete_item', item.pk))
+
+    def test_stock_action_views(self):
+        self.assertConstantQueries(1, lambda item, barcode: self.get('add_to_shopping_list', item.pk))
+        self.assertConstantQueries(7, lambda item, barcode: self.post(
+            'add_to_shopping_list', item.pk, data={'quantity_needed': 2}))
+        self.assertConstantQueries(7, lambda item, barcode: self.post('remove_from_shopping_list', item.pk))
+        self.assertConstantQueries(1, lambda item, barcode: self.get('update_stock', item.pk))
+        self.assertConstantQueries(7, lambda item, barcode: self.post(
+            'update_stock', item.pk, data={'quantity': 3, 'location': 'Pantry'}))
+        self.assertConstantQueries(1, lambda item, barcode: self.get('mark_purchased', item.pk))
+        self.assertConstantQueries(9, lambda item, barcode: self.post(
+            'mark_purchased', item.pk, data={'quantity_purchased': 1}))
+        self.assertConstantQueries(7, lambda item, barcode: self.post('toggle_open', item.pk))
+        self.assertConstantQueries(8, lambda item, barcode: self.post(
+            'bulk_action', data={'action': 'purchase', 'items': [item.pk], 'list_type': 'shopping'}))
+        # A new location each time, so every move creates its location's counter
+        self.assertConstantQueries(12, lambda item, barcode: self.post(
+            'bulk_action', data={'action': 'move', 'items': [item.pk], 'location': f'Shelf {item.pk}'}))
+        self.assertConstantQueries(12, lambda item, barcode: self.post(
+            'bulk_action', data={'action': 'delete', 'items': [item.pk]}))
+
+    def test_search_and_feed_views(self):
+        search.rebuild()
+        self.assertConstantQueries(3, lambda item, barcode: self.client.get(
+            reverse('inventory:search'), {'q': item.name}))
+        self.assertConstantQueries(2, lambda item, barcode: self.client.get(
+            reverse('inventory:search'), {'q': item.name, 'typeahead': 1}))
+        self.assertConstantQueries(2, lambda item, barcode: self.item_changes(item))
+
+    def item_changes(self, item):
+        cursor = change_feed.cursor()
+        change_feed.publish([item.pk])
+        return self.client.get(reverse('inventory:item_changes'), {'list': 'inventory', 'cursor': cursor})
+
+    def test_exports(self):
+        self.assertConstantQueries(1, lambda item, barcode: self.export('items', 'csv'))
+        self.assertConstantQueries(1, lambda item, barcode: self.export('shopping', 'csv'))
+        self.assertConstantQueries(1, lambda item, barcode: self.export('barcodes', 'csv'))
+        self.assertConstantQueries(1, lambda item, barcode: self.export('items', 'ndjson'))
+
+    def export(self, dataset, fmt):
+        response = self.get('export', dataset, fmt)
+        b''.join(response.streaming_content)
+        return response
+
+    def test_barcode_views(self):
+        self.assertConstantQueries(1, lambda item, barcode: self.get('add_barcode'))
+        self.assertConstantQueries(7, lambda item, barcode: self.post(
+            'add_barcode', data={'code': f'new-{item.pk}', 'item': item.pk, 'quantity': 1}))
+        self.assertConstantQueries(2, lambda item, barcode: self.get('edit_barcode', barcode.pk))
+        self.assertConstantQueries(9, lambda item, barcode: self.post(
+            'edit_barcode', barcode.pk, data={'code': barcode.code, 'item': item.pk, 'quantity': 2}))
+        self.assertConstantQueries(5, lambda item, barcode: self.post('delete_barcode', barcode.pk))
+
+    @override_settings(SCAN_API_TOKENS=['station-token'])
+    def test_scan_views(self):
+        self.assertConstantQueries(1, lambda item, barcode: self.get('scan_barcode'))
+        for action in ('add', 'remove', 'open'):
+            self.assertConstantQueries(9, lambda item, barcode: self.post(
+                'scan_barcode', data={'barcode': barcode.code, 'action': action}))
+        # Two ledger INSERTs: the batch has more events than SQLite takes in one
+        self.assertConstantQueries(8, lambda item, barcode: self.client.post(
+            reverse('inventory:scan_batch'),
+            data=json.dumps({'events': [[f'code-{n}', 'add'] for n in range(1, self.seeded + 1)]}),
+            content_type='application/json', headers={'Authorization': 'Bearer station-token'}))
+        # 50 scans, the most the scan page sends at once (one INSERT each into the ledger and the key table)
+        self.assertConstantQueries(10, lambda item, barcode: self.client.post(
+            reverse('inventory:scan_sync'),
+            data=json.dumps({'scans': [{'key': f'{self.seeded}-{n}', 'code': f'code-{n}', 'action': 'add',
+                                        'scanned': '2026-01-01T12:00:00Z'}
+                                       for n in range(self.seeded - 49, self.seeded + 1)]}),
+            content_type='application/json'))
+
+    def test_cache_stats_view(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertConstantQueries(2, lambda item, barcode: self.get('barcode_cache_stats'))
+        self.assertConstantQueries(2, lambda item, barcode: self.client.get('/metrics'))
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        for n in range(7):
+            item = Item.objects.create(name=f'Item {n}', quantity=1, quantity_needed=1)
+            Barcode.objects.create(code=f'code-{n}', item=item)
+
+    def test_walks_list_with_cursors(self):
+        url = reverse('inventory:inventory_list')
+        seen = []
+        while url:
+            response = self.client.get(url, {'page_size': 3} if '?' not in url else None)
+            seen += [item.name for item in response.context['items']]
+            url = response.context['page'].next_url
+        self.assertEqual(seen, [f'Item {n}' for n in range(7)])
+
+    def test_cursor_is_stable_when_rows_are_added_before_it(self):
+        response = self.client.get(reverse('inventory:shopping_list'), {'page_size': 3})
+        Item.objects.create(name='Item 0a', quantity_needed=1)
+        response = self.client.get(response.context['page'].next_url)
+        self.assertEqual([item.name for item in response.context['items']], ['Item 3', 'Item 4', 'Item 5'])
+
+    def test_partial_mode_returns_rows_only(self):
+        response = self.client.get(reverse('inventory:barcode_list'), {'page_size': 5, 'partial': 1})
+        self.assertTemplateUsed(response, 'inventory/barcode_rows.html')
+        self.assertTemplateNotUsed(response, 'inventory/base.html')
+        self.assertContains(response, '<tr>', count=5)
+        self.assertIn('after=code-4', response['X-Next-Page'])
+
+        response = self.client.get(response['X-Next-Page'] + '&partial=1')
+        self.assertContains(response, '<tr>', count=2)
+        self.assertFalse(response.has_header('X-Next-Page'))
+
+    def test_lists_read_only_the_row_columns(self):
+        Item.objects.filter(name='Item 2').update(quantity_needed=0)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('inventory:inventory_list'))
+        (sql,) = [query['sql'] for query in queries if 'FROM "inventory_item"' in query['sql']]
+        self.assertNotIn('added_date', sql)
+        rows = list(response.context['items'])
+        self.assertIsInstance(rows[0], ItemRow)
+        self.assertEqual([row.is_on_shopping_list for row in rows[1:4]], [True, False, True])
+        self.assertContains(response, 'Edit Needed', count=6)
+
+    def test_page_size_is_clamped(self):
+        response = self.client.get(reverse('inventory:inventory_list'), {'page_size': 'x'})
+        self.assertEqual(response.context['page'].page_size, 100)
+        with self.settings(LIST_MAX_PAGE_SIZE=2):
+            response = self.client.get(reverse('inventory:inventory_list'), {'page_size': 50})
+        self.assertEqual(len(response.context['items']), 2)
+
+
+class ListIndexTests(TestCase):
+    """
+    The list views' queries must be answered from their partial indexes. The
+    SQL each view actually runs is captured and checked with EXPLAIN, so a
+    change to a view's filter that no longer matches its index fails here.
+    """
+
+    def view_plan(self, name, **params):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse(f'inventory:{name}'), params)
+        (sql,) = [query['sql'] for query in queries if 'FROM "inventory_item"' in query['sql']]
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, plan, index_name):
+        self.assertIn(f'USING INDEX {index_name}', plan)
+        # Walking the index already yields name order
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_inventory_list_uses_in_stock_index(self):
+        self.assertUsesIndex(self.view_plan('inventory_list'), 'item_in_stock_name_idx')
+        self.assertUsesIndex(self.view_plan('inventory_list', after='M'), 'item_in_stock_name_idx')
+
+    def test_shopping_list_uses_needed_index(self):
+        self.assertUsesIndex(self.view_plan('shopping_list'), 'item_needed_name_idx')
+        self.assertUsesIndex(self.view_plan('shopping_list', after='M'), 'item_needed_name_idx')
+
+    def test_location_lookup_uses_location_index(self):
+        with sites.activate(sites.DEFAULT_SITE_ID):
+            plan = Item.objects.filter(location='Pantry').order_by('name').explain()
+        self.assertUsesIndex(plan, 'item_location_name_idx')
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.item = Item.objects.create(name='Oil', quantity=1, location='Pantry')
+        self.barcode = Barcode.objects.create(code='666', item=self.item)
+
+    def test_counters_follow_every_write_path(self):
+        self.assertEqual(counters.totals(), {'in_stock': 1, 'needed': 0, 'open': 0, 'locations': [('Pantry', 1)]})
+
+        stock.remove_stock(self.item.pk, 1)
+        self.assertEqual(counters.totals()['in_stock'], 0)
+        self.assertEqual(counters.totals()['needed'], 1)
+
+        stock.open_package(self.item.pk)
+        stock.apply_scan_batch([('666', 'add'), ('666', 'add')])
+        self.client.post(reverse('inventory:update_stock', args=[self.item.pk]),
+                         {'quantity': 3, 'is_open': 'on', 'location': 'Fridge'})
+        self.assertEqual(counters.totals(), {'in_stock': 1, 'needed': 0, 'open': 1, 'locations': [('Fridge', 1)]})
+
+        Item.objects.create(name='Salt', quantity_needed=2)
+        self.client.post(reverse('inventory:delete_item', args=[self.item.pk]))
+        self.assertEqual(counters.totals(), {'in_stock': 0, 'needed': 1, 'open': 0, 'locations': []})
+        self.assertEqual(counters.verify(), {})
+
+    def test_totals_are_a_single_query(self):
+        with self.assertNumQueries(1):
+            counters.totals()
+
+    def test_rebuild_command(self):
+        call_command('rebuild_counters', '--check', stdout=StringIO())
+        Item.objects.filter(pk=self.item.pk).update(quantity=0)  # bypasses tracking
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', '--check', stdout=StringIO())
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(counters.totals()['in_stock'], 0)
+        self.assertEqual(counters.verify(), {})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.jam = Item.objects.create(name='Jam', quantity=Decimal('1.5'), location='Pantry')
+        Item.objects.create(name='Eggs', quantity=0, quantity_needed=12)
+        Barcode.objects.create(code='777', item=self.jam, description='Jar')
+
+    def export(self, dataset, fmt):
+        response = self.client.get(reverse('inventory:export', args=[dataset, fmt]))
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_applies_list_filters(self):
+        rows = list(csv.DictReader(self.export('inventory', 'csv').splitlines()))
+        self.assertEqual([(row['name'], row['quantity']) for row in rows], [('Jam', '1.50')])
+        rows = list(csv.DictReader(self.export('shopping', 'csv').splitlines()))
+        self.assertEqual([row['name'] for row in rows], ['Eggs'])
+        self.assertEqual(len(list(csv.DictReader(self.export('items', 'csv').splitlines()))), 2)
+
+    def test_ndjson_barcodes(self):
+        lines = self.export('barcodes', 'ndjson').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'code': '777', 'item_id': self.jam.pk, 'item__name': 'Jam', 'quantity': '1.00', 'description': 'Jar'},
+        ])
+
+    def test_output_is_produced_in_chunks(self):
+        for n in range(5):
+            Item.objects.create(name=f'Item {n}')
+        # 7 rows in chunks of 2
+        with mock.patch.object(export, 'CHUNK_SIZE', 2):
+            self.assertEqual(len(list(export.stream_csv('items'))), 4)
+            self.assertEqual(len(list(export.stream_ndjson('items'))), 4)
+
+    def test_unknown_export(self):
+        response = self.client.get(reverse('inventory:export', args=['secrets', 'csv']))
+        self.assertEqual(response.status_code, 404)
+
+
+class ImportInventoryTests(TestCase):
+    def run_import(self, kind, content, suffix='.csv', *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_inventory', kind, f.name, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_items_are_created_updated_and_validated(self):
+        Item.objects.create(name='Rice', quantity=1, location='Pantry')
+        out, err = self.run_import('items', (
+            'name,quantity,unit,is_open,location\n'
+            'Rice,4,kg,False,Cupboard\n'
+            'Oats,2.5,,True,Pantry\n'
+            'Bad,-1,,False,\n'
+            ',1,,False,\n'
+            'Oats,3,,True,Pantry\n'
+        ), '.csv', '--batch-size', '2')
+        self.assertIn('Imported 3 items (2 rejected)', out)
+        self.assertIn('line 4: quantity: Ensure this value is greater than or equal to 0.', err)
+        self.assertIn('line 5: name: This field is required.', err)
+
+        rice = Item.objects.get(name='Rice')
+        self.assertEqual((rice.quantity, rice.unit, rice.location), (4, 'kg', 'Cupboard'))
+        oats = Item.objects.get(name='Oats')
+        self.assertEqual((oats.quantity, oats.unit, oats.is_open), (3, None, True))
+        # bulk writes bypass the signals, so the command rebuilds the counters
+        self.assertEqual(counters.verify(), {})
+        self.assertEqual(ledger.verify(), {})
+        self.assertEqual([name for item_id, name, location in search.search('cupboard')], ['Rice'])
+
+    def test_rows_only_update_the_fields_they_carry(self):
+        Item.objects.create(name='Milk', quantity=1, location='Fridge')
+        Item.objects.create(name='Tea', quantity=3, location='Cupboard')
+        Item.objects.create(name='Salt', quantity=1, is_open=False)
+        out, err = self.run_import('items', (
+            '{"name": "Milk", "quantity": 5}\n'
+            '{"name": "Tea", "location": "Shelf"}\n'
+            '{"name": "Salt", "is_open": true, "quantity": 1}\n'
+        ), '.ndjson')
+        self.assertIn('Imported 3 items (0 rejected)', out)
+        self.assertEqual(
+            list(Item.objects.order_by('name').values_list('name', 'quantity', 'location', 'is_open')),
+            [('Milk', Decimal('5'), 'Fridge', False), ('Salt', Decimal('1'), None, True),
+             ('Tea', Decimal('3'), 'Shelf', False)],
+        )
+        self.assertEqual(ledger.verify(), {})
+
+    def test_barcodes_resolve_item_names(self):
+        rice = Item.objects.create(name='Rice')
+        Barcode.objects.create(code='1', item=rice, quantity=1)
+        out, err = self.run_import('barcodes', (
+            '{"code": "1", "item": "Rice", "quantity": 2.5}\n'
+            '{"code": "2", "item__name": "Rice", "description": "Sack"}\n'
+            '{"code": "3", "item": "Nope"}\n'
+            'not json\n'
+        ), '.ndjson')
+        self.assertIn('Imported 2 barcodes (2 rejected)', out)
+        self.assertIn("line 3: item: No item named 'Nope'.", err)
+        self.assertIn('line 4: invalid JSON', err)
+        self.assertEqual(
+            list(Barcode.objects.order_by('code').values_list('code', 'item_id', 'quantity', 'description')),
+            [('1', rice.pk, Decimal('2.5'), ''), ('2', rice.pk, Decimal('1'), 'Sack')],
+        )
+        self.assertEqual([item_id for item_id, name, location in search.search('sack')], [rice.pk])
+
+
+class SQLiteProfileTests(TestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = type(connections['default'])({**connection.settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3')})
+            with self.settings(SQLITE_PRAGMAS=settings.SQLITE_PROFILES['production']):
+                wrapper.ensure_connection()
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], 5000)
+                    cursor.execute('PRAGMA synchronous')
+                    self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            finally:
+                wrapper.close()
+
+
+@override_settings(SCAN_API_TOKENS=[benchmark.SCAN_API_TOKEN])
+class BenchmarkTests(TestCase):
+    def test_every_scenario_runs_cleanly(self):
+        catalog = benchmark.seed_catalog(30, barcodes_per_item=2)
+        self.assertEqual((Item.objects.count(), Barcode.objects.count()), (30, 60))
+        self.assertEqual(counters.verify(), {})
+
+        staff = User.objects.create_user('staff', is_staff=True)
+        requests = benchmark.prepare_requests(catalog, benchmark.SCENARIOS, 3)
+        results = benchmark.run_client(requests, staff)
+
+        self.assertEqual(set(results), set(benchmark.SCENARIOS))
+        for name, summary in results.items():
+            self.assertEqual((name, summary['requests'], summary['errors']), (name, 3, 0))
+            self.assertLessEqual(summary['p50_ms'], summary['p95_ms'])
+        self.assertEqual(results['inventory_list']['queries_per_request'], 2)
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.5), 51)
+        self.assertEqual(benchmark.percentile(values, 0.99), 100)
+        self.assertIsNone(benchmark.percentile([], 0.5))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        rice = Item.objects.create(name='Rice', quantity=5)
+        Barcode.objects.create(code='123', item=rice, quantity=1)
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse('inventory:scan_barcode'))
+        self.client.post(reverse('inventory:scan_barcode'), {'barcode': '123', 'action': 'add'})
+        self.client.get('/inventory/nowhere/')
+
+        # Staff only
+        self.assertEqual(self.client.get('/metrics').status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+
+        self.assertIn('kitchen_request_duration_seconds_count{view="inventory:scan_barcode"} 2', text)
+        self.assertIn('kitchen_request_duration_seconds_bucket{view="inventory:scan_barcode",le="+Inf"} 2', text)
+        self.assertIn('kitchen_responses_total{view="inventory:scan_barcode",status="200"} 2', text)
+        self.assertIn('kitchen_responses_total{view="unmatched",status="404"} 1', text)
+        histograms = metrics.registry.histograms
+        self.assertGreater(histograms['render'].series['inventory:scan_barcode'][1], 0)
+        self.assertGreater(histograms['queries'].series['inventory:scan_barcode'][1], 0)
+
+    def test_nested_renders_are_timed_once(self):
+        Item.objects.bulk_create([Item(name=f'Item {number}', quantity=1) for number in range(200)])
+        row_cache.clear()
+        self.client.get(reverse('inventory:inventory_list'), {'page_size': 200})
+        histograms = metrics.registry.histograms
+        # Every row is rendered inside the page, so within its render time
+        self.assertLessEqual(histograms['render'].series['inventory:inventory_list'][1],
+                             histograms['duration'].series['inventory:inventory_list'][1])
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('h', 'Test.', (1, 5))
+        for value in (0, 1, 3, 7):
+            histogram.observe('v', value)
+        self.assertEqual(histogram.render()[2:], [
+            'h_bucket{view="v",le="1"} 2',
+            'h_bucket{view="v",le="5"} 3',
+            'h_bucket{view="v",le="+Inf"} 4',
+            'h_sum{view="v"} 11',
+            'h_count{view="v"} 4',
+        ])
+
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.settings(SLOW_REQUEST_MS=0.001), self.assertLogs('inventory.metrics', 'WARNING') as logs:
+            self.client.post(reverse('inventory:scan_barcode'), {'barcode': '123', 'action': 'add'})
+        self.assertIn('Slow request: POST /inventory/scan/ (inventory:scan_barcode)', logs.output[0])
+        self.assertIn('UPDATE "inventory_item"', logs.output[0])
+
+
+class AsyncURLConf:
+    """The inventory URLs as served with ASYNC_VIEWS on."""
+    urlpatterns = [path('inventory/', include(([
+        path(str(pattern.pattern), getattr(async_views, pattern.name), name=pattern.name)
+        if hasattr(async_views, pattern.name) else pattern
+        for pattern in inventory_urls.urlpatterns
+    ], 'inventory')))]
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        barcode_cache.clear()
+        self.rice = Item.objects.create(name='Rice', quantity=2, unit='kg', location='Pantry')
+        Item.objects.create(name='Milk', quantity_needed=1)
+        Barcode.objects.create(code='123', item=self.rice, quantity=1)
+        counters.rebuild()
+
+    async def test_lists(self):
+        self.assertIs(resolve('/inventory/').func, async_views.inventory_list)
+        response = await self.async_client.get('/inventory/')
+        self.assertContains(response, 'Rice')
+        self.assertNotContains(response, 'Milk')
+        self.assertEqual(response.context['totals']['in_stock'], 1)
+
+        response = await self.async_client.get('/inventory/shopping/', {'page_size': 1, 'partial': 1})
+        self.assertContains(response, 'Milk')
+        self.assertNotIn('X-Next-Page', response)
+
+    async def test_scan(self):
+        url = reverse('inventory:scan_barcode')
+        response = await self.async_client.post(url, {'barcode': '123', 'action': 'remove'}, follow=True)
+        self.assertContains(response, 'Removed 1.00 kg of Rice')
+        self.assertContains(response, 'Store in: Pantry')
+        item = await Item.objects.aget(pk=self.rice.pk)
+        self.assertEqual((item.quantity, item.quantity_needed), (1, 1))
+        self.assertEqual(await counters.atotals(), counters.totals_from({'in_stock': 1, 'needed': 2, 'location:Pantry': 1}))
+
+        response = await self.async_client.post(url, {'barcode': '999', 'action': 'add'})
+        self.assertContains(response, 'Barcode 999 not found')
+        self.assertEqual([barcode.code for barcode in response.context['recent_scans']], ['123'])
+
+
+class ChangeFeedTests(TestCase):
+    def test_cursors(self):
+        feed = ChangeFeed(max_events=2)
+        start = feed.cursor()
+        self.assertEqual(feed.changes_since(start), (start, set()))
+        feed.publish([1, 2])
+        feed.publish([2, 3])
+        self.assertEqual(feed.changes_since(start), (feed.cursor(), {1, 2, 3}))
+        # Unknown cursors, and ones older than the events kept, ask for a reload
+        self.assertEqual(feed.changes_since('elsewhere:1'), (feed.cursor(), None))
+        feed.publish([4])
+        self.assertEqual(feed.changes_since(start), (feed.cursor(), None))
+
+    def test_cursor_for_a_lagging_reader(self):
+        feed = ChangeFeed()
+        feed.publish([1])
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 60):
+            feed.publish([2])
+            feed.publish([3])
+            # The events of the last 30 seconds are sent again
+            self.assertEqual(feed.changes_since(feed.cursor(lag=30)), (feed.cursor(), {2, 3}))
+
+    def test_waiting(self):
+        feed = ChangeFeed()
+        cursor = feed.cursor()
+        self.assertEqual(async_to_sync(feed.await_changes)(cursor, 0.01), (cursor, set()))
+
+        threading.Timer(0.05, feed.publish, [[7]]).start()
+        started = time.monotonic()
+        self.assertEqual(async_to_sync(feed.await_changes)(cursor, 5), (feed.cursor(), {7}))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_item_changes_returns_changed_rows(self):
+        rice = Item.objects.create(name='Rice', quantity=1)
+        milk = Item.objects.create(name='Milk')
+        url = reverse('inventory:item_changes')
+        cursor = self.client.get(reverse('inventory:inventory_list')).context['feed_cursor']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.add_stock(milk.pk, 1)
+            stock.remove_stock(rice.pk, 1)
+        data = self.client.get(url, {'list': 'inventory', 'cursor': cursor, 'timeout': 0}).json()
+        self.assertIn(f'id="item-{milk.pk}"', data['rows'][str(milk.pk)])
+        self.assertIsNone(data['rows'][str(rice.pk)])  # left the inventory list
+        self.assertIn('In stock: <strong>1</strong>', data['totals'])
+
+        # Edits that leave the stock alone are published too
+        cursor = data['cursor']
+        milk.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            milk.name = 'Oat milk'
+            milk.save()
+        data = self.client.get(url, {'list': 'inventory', 'cursor': cursor, 'timeout': 0}).json()
+        self.assertIn('Oat milk', data['rows'][str(milk.pk)])
+
+        data = self.client.get(url, {'list': 'inventory', 'cursor': data['cursor'], 'timeout': 0}).json()
+        self.assertEqual(data['rows'], {})
+        self.assertTrue(self.client.get(url, {'list': 'inventory', 'cursor': 'stale:0', 'timeout': 0}).json()['reset'])
+        self.assertEqual(self.client.get(url, {'list': 'nope'}).status_code, 404)
+
+    def test_sync_item_changes_does_not_hold_the_request(self):
+        # The URLs route to the sync views unless ASYNC_VIEWS is on
+        cursor = self.client.get(reverse('inventory:inventory_list')).context['feed_cursor']
+        started = time.monotonic()
+        with self.settings(FEED_TIMEOUT=5, FEED_POLL_SECONDS=3):
+            data = self.client.get(reverse('inventory:item_changes'), {'list': 'inventory', 'cursor': cursor}).json()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(data, {'cursor': cursor, 'rows': {}, 'wait': 3})
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        barcode_cache.clear()
+        self.rice = Item.objects.create(name='Rice', quantity=2, unit='kg', location='Pantry')
+        self.barcode = Barcode.objects.create(code='123', item=self.rice, quantity=1)
+        self.staff = User.objects.create_user('staff', is_staff=True)
+
+    def revalidate(self, name):
+        """The status of a repeat GET sent with the validators of a first one."""
+        url = reverse(f'inventory:{name}')
+        response = self.client.get(url)
+        return self.client.get(url, headers={'if-none-match': response['ETag']}).status_code
+
+    def test_unchanged_list_is_not_modified_without_reading_items(self):
+        url = reverse('inventory:inventory_list')
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch('inventory.metrics.TimedTemplate.render') as render:
+            repeat = self.client.get(url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat['ETag'], response['ETag'])
+        self.assertEqual(len(queries), 1)
+        self.assertIn('inventory_stockcounter', queries[0]['sql'])
+        render.assert_not_called()
+
+        since = self.client.get(url, headers={'if-modified-since': response['Last-Modified']})
+        self.assertEqual(since.status_code, 304)
+        # Another page of the list is another resource
+        self.assertNotEqual(self.client.get(url, {'page_size': 1})['ETag'], response['ETag'])
+
+    def test_writes_change_the_etag(self):
+        writes = [
+            lambda: stock.add_stock(self.rice.pk, 1),
+            lambda: stock.remove_stock(self.rice.pk, 1),
+            lambda: stock.purchase(self.rice.pk, 1),
+            lambda: stock.apply_scan(self.barcode, 'add'),
+            lambda: self.rice.save(),
+        ]
+        for name in ('inventory_list', 'shopping_list'):
+            for write in writes:
+                url = reverse(f'inventory:{name}')
+                etag = self.client.get(url)['ETag']
+                write()
+                self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+    def test_barcode_list_follows_barcodes_and_items(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.revalidate('barcode_list'), 304)
+        url = reverse('inventory:barcode_list')
+        for write in (lambda: self.barcode.save(), lambda: self.rice.save(), lambda: self.barcode.delete()):
+            etag = self.client.get(url)['ETag']
+            write()
+            self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+    def test_pending_messages_get_the_page(self):
+        url = reverse('inventory:inventory_list')
+        etag = self.client.get(url)['ETag']
+        self.client.cookies['messages'] = 'pending'
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+
+
+class RowCacheTests(TestCase):
+    def setUp(self):
+        row_cache.clear()
+        self.rice = Item.objects.create(name='Rice', quantity=2, unit='kg', quantity_needed=1)
+        self.milk = Item.objects.create(name='Milk', quantity=1)
+        self.url = reverse('inventory:inventory_list')
+
+    def get_list(self, client=None):
+        """The inventory page, and how many of its rows were rendered rather than cached."""
+        render = metrics.TimedTemplate.render
+        with mock.patch.object(metrics.TimedTemplate, 'render', autospec=True, side_effect=render) as spy:
+            response = (client or self.client).get(self.url)
+        rendered = [call for call in spy.call_args_list if call.args[0].origin.template_name == ROW_TEMPLATE]
+        return response, len(rendered)
+
+    def test_only_changed_rows_are_rendered(self):
+        first, rendered = self.get_list()
+        self.assertEqual(rendered, 2)
+        second, rendered = self.get_list()
+        self.assertEqual(rendered, 0)
+        self.assertContains(second, 'Sealed: 2 kg')
+
+        stock.remove_stock(self.rice.pk, 1)
+        response, rendered = self.get_list()
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Sealed: 1 kg')
+        self.assertContains(response, f'id="item-{self.milk.pk}"')
+
+    def test_cached_rows_get_the_visitors_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        self.get_list()
+        response, rendered = self.get_list(client)
+        self.assertEqual(rendered, 0)
+        self.assertNotContains(response, CSRF_PLACEHOLDER)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode())[1]
+        response = client.post(reverse('inventory:toggle_open', args=[self.milk.pk]), {'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+
+    def test_without_a_cache_every_row_is_rendered(self):
+        request = RequestFactory().get(self.url)
+        html = RowCache(alias=None).render(request, Item.objects.order_by('name'), 'inventory')
+        cached = row_cache.render(request, Item.objects.order_by('name'), 'inventory')
+        # The same rows, each with a differently masked token
+        without_tokens = [re.sub(r'value="[^"]+"', '', rows) for rows in (html, cached)]
+        self.assertEqual(without_tokens[0], without_tokens[1])
+        self.assertLess(html.index('Milk'), html.index('Rice'))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.milk = Item.objects.create(name='Oat milk', location='Fridge')
+        self.rice = Item.objects.create(name='Basmati rice', location='Pantry')
+        self.barcode = Barcode.objects.create(code='5012345678900', item=self.rice, description='Big sack')
+        Item.objects.create(name='Milk chocolate', location='Pantry')
+
+    def names(self, query):
+        return [name for item_id, name, location in search.search(query)]
+
+    def test_prefixes_match_names_locations_and_barcodes(self):
+        self.assertEqual(self.names('mil'), ['Milk chocolate', 'Oat milk'])
+        self.assertEqual(self.names('MIL pan'), ['Milk chocolate'])
+        self.assertEqual(self.names('fri'), ['Oat milk'])
+        self.assertEqual(self.names('501234'), ['Basmati rice'])
+        self.assertEqual(self.names('sack'), ['Basmati rice'])
+        # No item has both words: items with either are returned
+        self.assertEqual(self.names('oat rice'), ['Oat milk', 'Basmati rice'])
+        self.assertEqual(self.names('"*) OR ('), [])
+
+    def test_index_follows_writes(self):
+        self.rice.name = 'Jasmine rice'
+        self.rice.save()
+        self.assertEqual(self.names('jas'), ['Jasmine rice'])
+        self.assertEqual(self.names('basmati'), [])
+
+        self.barcode.item = self.milk
+        self.barcode.save()
+        self.assertEqual(self.names('sack'), ['Oat milk'])
+        self.barcode.delete()
+        self.assertEqual(self.names('sack'), [])
+
+        self.milk.delete()
+        self.assertEqual(self.names('oat'), [])
+
+    def test_typeahead_reads_only_the_index(self):
+        url = reverse('inventory:search')
+        sites.domains.site_for('testserver')
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get(url, {'q': 'ba', 'typeahead': 1}).json()['results']
+        self.assertTrue(all(search.TABLE in query['sql'] for query in queries))
+        self.assertEqual(results, [{'id': self.rice.pk, 'name': 'Basmati rice', 'location': 'Pantry',
+                                    'url': reverse('inventory:update_stock', args=[self.rice.pk])}])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, {'q': 'b', 'typeahead': 1}).json()['results'], [])
+
+        response = self.client.get(url, {'q': 'milk'})
+        self.assertEqual([item.name for item in response.context['items']], ['Milk chocolate', 'Oat milk'])
+        self.assertContains(response, f'id="item-{self.milk.pk}"')
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(self.names('rice'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 3 items', out.getvalue())
+        self.assertEqual(self.names('rice'), ['Basmati rice'])
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.rice = Item.objects.create(name='Rice', quantity=2, unit='kg')
+        self.barcode = Barcode.objects.create(code='123', item=self.rice, quantity=1)
+
+    def state(self, when=None):
+        return ledger.state_at(when, [self.rice.pk]).get(self.rice.pk)
+
+    def test_every_change_is_recorded(self):
+        stock.add_stock(self.rice.pk, 3)
+        stock.apply_scan_batch([('123', 'remove'), ('123', 'open')])
+        stock.purchase(self.rice.pk, 1)
+        self.rice.refresh_from_db()
+        self.rice.location = 'Pantry'  # no stock change, no event
+        self.rice.save()
+        self.rice.quantity = 10
+        self.rice.save()
+        self.assertEqual(
+            list(StockEvent.objects.filter(item=self.rice).order_by('pk')
+                 .values_list('action', 'quantity', 'quantity_needed', 'is_open')),
+            [('save', 2, 0, False), ('add', 3, 0, None), ('scan_batch', -1, 2, True),
+             ('purchase', 1, -2, None), ('save', 5, 0, None)],
+        )
+        self.assertEqual(self.state(), {'quantity': 10, 'quantity_needed': 0, 'is_open': True})
+        self.assertEqual(ledger.verify(), {})
+
+        item_id = self.rice.pk
+        self.rice.delete()
+        self.assertEqual(ledger.state_at(item_ids=[item_id]), {})
+        self.assertEqual(StockEvent.objects.filter(item_id=item_id).last().quantity, -10)
+
+    def test_item_saves_write_before_they_read(self):
+        # Under WAL a transaction that reads before its first write fails if
+        # a scan commits in between: the stock lock's UPDATE comes first
+        for write in (self.rice.save, self.rice.delete):
+            with CaptureQueriesContext(connection) as queries:
+                write()
+            statements = [query['sql'] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+            self.assertTrue(statements[0].startswith('UPDATE "inventory_stockcounter"'), statements[0])
+
+    def test_state_at_a_past_moment_starts_from_the_last_snapshot(self):
+        stock.add_stock(self.rice.pk, 3)
+        first = timezone.now()
+        snapshot = ledger.take_snapshot()
+        stock.remove_stock(self.rice.pk, 1)
+        second = timezone.now()
+        stock.purchase(self.rice.pk, 4)
+
+        self.assertEqual(self.state(first), {'quantity': 5, 'quantity_needed': 0, 'is_open': False})
+        self.assertEqual(self.state(second), {'quantity': 4, 'quantity_needed': 1, 'is_open': False})
+        self.assertEqual(self.state()['quantity'], 8)
+        # Only the events after the snapshot are read
+        with CaptureQueriesContext(connection) as queries:
+            self.state()
+        self.assertIn(f'"inventory_stockevent"."id" > {snapshot.last_event_id}', queries[-1]['sql'])
+
+        archive = StringIO()
+        self.assertEqual(ledger.compact(second, archive), (2, 1))
+        self.assertEqual([json.loads(line)['action'] for line in archive.getvalue().splitlines()], ['save', 'add'])
+        self.assertEqual(self.state(second), {'quantity': 4, 'quantity_needed': 1, 'is_open': False})
+        self.assertEqual(ledger.verify(), {})
+        with self.assertRaises(ValueError):
+            self.state(first)
+
+    def test_command(self):
+        call_command('stock_ledger', 'snapshot', stdout=StringIO())
+        self.assertEqual(StockSnapshot.objects.count(), 2)
+        stock.add_stock(self.rice.pk, 1)
+        out = StringIO()
+        call_command('stock_ledger', 'state', 'Rice', stdout=out)
+        self.assertEqual(out.getvalue(), 'Rice: quantity 3.00, needed 0.00\n')
+        out = StringIO()
+        call_command('stock_ledger', 'check', stdout=out)
+        self.assertIn('Every item matches the ledger', out.getvalue())
+
+        Item.objects.filter(pk=self.rice.pk).update(quantity=7)
+        with self.assertRaisesMessage(CommandError, '1 item(s) do not match the ledger'):
+            call_command('stock_ledger', 'check', stdout=StringIO())
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        long_ago = self.now - timedelta(days=200)
+        self.milk = Item.objects.create(name='Milk', quantity=2, added_date=long_ago)
+        self.salt = Item.objects.create(name='Salt', quantity=5, added_date=long_ago)
+        self.bread = Item.objects.create(name='Bread', quantity=0, added_date=self.now - timedelta(days=2))
+        # A unit of milk a day for months, four loaves in the two days since bread
+        # was added; appended oldest first, as the ledger is
+        StockEvent.objects.bulk_create(
+            [StockEvent(item=self.milk, created=self.now - timedelta(days=day), action='remove', quantity=-1)
+             for day in range(199, 1, -1)]
+            + [StockEvent(item=self.bread, created=self.now - timedelta(days=1), action='scan_batch', quantity=-4)]
+            + [StockEvent(item=self.milk, created=self.now - timedelta(days=day), action='remove', quantity=-1)
+               for day in (1, 0)]
+        )
+
+    def test_rates_come_from_consumption(self):
+        ids, rates, days_left, needed = forecast.score(now=self.now)
+        forecasts = dict(zip(ids.tolist(), zip(rates.tolist(), days_left.tolist(), needed.tolist())))
+        # Salt was never used, so it gets no forecast
+        self.assertEqual(set(forecasts), {self.milk.pk, self.bread.pk})
+        rate, left, suggested = forecasts[self.milk.pk]
+        self.assertAlmostEqual(rate, 1, places=3)
+        self.assertAlmostEqual(left, 2, places=3)
+        self.assertEqual(suggested, 1 * (forecast.LEAD_DAYS + forecast.COVER_DAYS) - 2)
+        # A new item's rate is not diluted by the days before it existed
+        self.assertAlmostEqual(forecasts[self.bread.pk][0], 2, delta=0.1)
+
+    def test_deletes_and_restocking_are_not_consumption(self):
+        stock.add_stock(self.salt.pk, 3)
+        self.milk.delete()
+        ids, rates, days_left, needed = forecast.score(now=self.now)
+        self.assertEqual(ids.tolist(), [self.bread.pk])
+
+    def test_run_and_apply(self):
+        self.milk.quantity_needed = 20
+        self.milk.save()
+        self.assertEqual(forecast.run(now=self.now), 2)
+        milk = ItemForecast.objects.get(item=self.milk)
+        self.assertEqual(milk.reorder_on, timezone.localdate(self.now))
+        self.assertEqual(milk.suggested_needed, 15)
+
+        # Only raises: milk keeps the 20 asked for by hand
+        self.assertEqual(forecast.apply(), 1)
+        self.bread.refresh_from_db()
+        self.assertEqual(self.bread.quantity_needed, 34)
+        self.assertEqual(Item.objects.get(pk=self.milk.pk).quantity_needed, 20)
+        self.assertEqual(counters.snapshot()[counters.NEEDED], 2)
+        self.assertEqual(StockEvent.objects.filter(action='forecast').get().quantity_needed, 34)
+        self.assertEqual(forecast.apply(), 0)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('forecast_needs', '--apply', '--cover-days', '7', stdout=out)
+        self.assertIn('Forecast 2 items', out.getvalue())
+        self.assertIn('Raised the shopping list of 2 items', out.getvalue())
+        self.assertEqual(Item.objects.get(pk=self.milk.pk).quantity_needed, 8)
+        with self.assertRaisesMessage(CommandError, 'cannot be negative'):
+            call_command('forecast_needs', '--lead-days', '-1', stdout=StringIO())
+
+
+class BulkActionTests(TestCase):
+    def setUp(self):
+        barcode_cache.clear()
+        self.items = [
+            Item.objects.create(name=f'Item {number}', quantity=1, quantity_needed=number % 3, location='Pantry')
+            for number in range(6)
+        ]
+        self.ids = [item.pk for item in self.items]
+        Barcode.objects.create(code='111', item=self.items[0])
+        search.rebuild()
+
+    def post(self, action, item_ids, **data):
+        return self.client.post(reverse('inventory:bulk_action'),
+                                {'action': action, 'items': item_ids, 'list_type': 'shopping', **data})
+
+    def messages(self, response):
+        return [str(message) for message in get_messages(response.wsgi_request)]
+
+    def test_purchase_and_clear(self):
+        response = self.post('purchase', self.ids[:3])
+        self.assertRedirects(response, reverse('inventory:shopping_list'), fetch_redirect_response=False)
+        self.assertEqual(list(Item.objects.filter(pk__in=self.ids).order_by('pk').values_list('quantity', 'quantity_needed')),
+                         [(1, 0), (2, 0), (3, 0), (1, 0), (1, 1), (1, 2)])
+        self.assertEqual(StockEvent.objects.filter(action='purchase').count(), 2)
+        self.assertIn('Purchased 2 items', self.messages(response))
+
+        self.post('clear', self.ids)
+        self.assertFalse(Item.objects.needed().exists())
+        self.assertEqual(counters.verify(), {})
+        self.assertEqual(ledger.verify(), {})
+
+    def test_queries_do_not_grow_with_the_selection(self):
+        counts = []
+        for item_ids in (self.ids[1:2], self.ids[2:]):
+            with CaptureQueriesContext(connection) as queries:
+                self.post('purchase', item_ids)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_move(self):
+        self.post('move', self.ids, location='Fridge')
+        self.assertEqual(set(Item.objects.values_list('location', flat=True)), {'Fridge'})
+        self.assertEqual({item_id for item_id, name, location in search.search('fridge', 10)}, set(self.ids))
+        self.assertEqual(counters.totals()['locations'], [('Fridge', 6)])
+
+    def test_delete(self):
+        barcode_cache.warm()
+        self.assertIsNotNone(barcode_cache.resolve('111'))
+        self.post('delete', self.ids[:2])
+        self.assertEqual(Item.objects.count(), 4)
+        self.assertFalse(Barcode.objects.exists())
+        self.assertIsNone(barcode_cache.resolve('111'))
+        self.assertEqual(search.search('item', 10), [(item.pk, item.name, 'Pantry') for item in self.items[2:]])
+        self.assertEqual(counters.verify(), {})
+        self.assertEqual(ledger.state_at(item_ids=self.ids[:2]), {})
+
+    def test_invalid_selection(self):
+        response = self.post('purchase', [])
+        self.assertIn('Select at least one item.', self.messages(response))
+        response = self.post('purchase', ['x'])
+        self.assertIn('Select items from the list.', self.messages(response))
+        self.assertEqual(self.client.get(reverse('inventory:bulk_action')).status_code, 405)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver', 'cabin.example'])
+class SiteTests(TestCase):
+    def setUp(self):
+        barcode_cache.clear()
+        self.addCleanup(barcode_cache.clear)
+        self.addCleanup(sites.domains.forget)
+        self.cabin = Site.objects.create(name='Cabin', domain='cabin.example')
+        self.milk = Item.objects.create(name='Milk', quantity=2, location='Fridge')
+        Barcode.objects.create(code='100', item=self.milk)
+        with sites.activate(self.cabin.pk):
+            self.cabin_milk = Item.objects.create(name='Milk', quantity=0, quantity_needed=1, location='Cellar')
+            Barcode.objects.create(code='100', item=self.cabin_milk, quantity=3)
+        search.rebuild()
+        self.cabin_client = Client(HTTP_HOST='cabin.example')
+
+    def test_rows_belong_to_the_site_they_are_created_in(self):
+        self.assertEqual(self.milk.site_id, sites.DEFAULT_SITE_ID)
+        self.assertEqual(self.cabin_milk.site_id, self.cabin.pk)
+        self.assertEqual(Barcode.objects.get(item=self.cabin_milk).site_id, self.cabin.pk)
+        # Outside a request every site is visible
+        self.assertEqual(Item.objects.filter(name='Milk').count(), 2)
+        with sites.activate(self.cabin.pk):
+            self.assertEqual(list(Item.objects.all()), [self.cabin_milk])
+
+    def test_lists_and_item_pages_are_per_host(self):
+        response = self.client.get(reverse('inventory:inventory_list'))
+        self.assertEqual([item.pk for item in response.context['items']], [self.milk.pk])
+        response = self.cabin_client.get(reverse('inventory:shopping_list'))
+        self.assertEqual([item.pk for item in response.context['items']], [self.cabin_milk.pk])
+        self.assertEqual(self.cabin_client.get(reverse('inventory:update_stock', args=[self.milk.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('inventory:search'), {'q': 'mil', 'typeahead': 1}).json()['results'][0]['id'],
+                         self.milk.pk)
+        self.assertEqual([row['id'] for row in self.cabin_client.get(reverse('inventory:search'),
+                                                                      {'q': 'mil', 'typeahead': 1}).json()['results']],
+                         [self.cabin_milk.pk])
+
+    def test_scans_resolve_codes_within_the_site(self):
+        self.cabin_client.post(reverse('inventory:scan_barcode'), {'barcode': '100', 'action': 'add'})
+        self.client.post(reverse('inventory:scan_barcode'), {'barcode': '100', 'action': 'remove'})
+        self.milk.refresh_from_db()
+        self.cabin_milk.refresh_from_db()
+        self.assertEqual((self.milk.quantity, self.cabin_milk.quantity), (1, 3))
+        self.assertEqual(self.cabin_milk.quantity_needed, 0)
+
+    def test_names_and_codes_are_unique_per_site(self):
+        url = reverse('inventory:add_item')
+        response = self.cabin_client.post(url, {'name': 'Milk', 'quantity': '1', 'quantity_needed': '0'})
+        self.assertContains(response, 'Item with this Name already exists.')
+        self.cabin_client.post(url, {'name': 'Eggs', 'quantity': '1', 'quantity_needed': '0'})
+        self.client.post(url, {'name': 'Eggs', 'quantity': '1', 'quantity_needed': '0'})
+        self.assertEqual(set(Item.objects.filter(name='Eggs').values_list('site_id', flat=True)),
+                         {sites.DEFAULT_SITE_ID, self.cabin.pk})
+        response = self.client.post(reverse('inventory:add_barcode'), {'code': '100', 'item': self.milk.pk, 'quantity': '1'})
+        self.assertContains(response, 'Barcode with this Code already exists.')
+
+    def test_counters_and_validators_are_per_site(self):
+        self.assertEqual(counters.totals()['locations'], [('Fridge', 1)])
+        self.assertEqual(counters.totals(self.cabin.pk)['needed'], 1)
+        self.assertEqual(counters.verify(), {})
+        url = reverse('inventory:inventory_list')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.cabin_client.get(url)['ETag'], etag)
+        # A change in another site leaves this site's pages current
+        stock.add_stock(self.cabin_milk.pk, 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_bulk_actions_leave_other_sites_alone(self):
+        url = reverse('inventory:bulk_action')
+        for action in ('purchase', 'move', 'delete'):
+            self.client.post(url, {'action': action, 'items': [self.cabin_milk.pk], 'location': 'Shelf'})
+        self.cabin_milk.refresh_from_db()
+        self.assertEqual((self.cabin_milk.quantity, self.cabin_milk.quantity_needed, self.cabin_milk.location),
+                         (0, 1, 'Cellar'))
+        self.assertTrue(Barcode.objects.filter(item=self.cabin_milk).exists())
+        self.assertEqual(counters.verify(), {})
+
+    def test_admin_lists_only_the_sites_own_rows(self):
+        stock.add_stock(self.cabin_milk.pk, 1)
+        manager = User.objects.create_user('manager', is_staff=True)
+        manager.user_permissions.set(Permission.objects.filter(content_type__app_label='inventory'))
+        self.client.force_login(manager)
+        response = self.client.get(reverse('admin:inventory_stockevent_changelist'))
+        self.assertEqual({event.item_id for event in response.context['cl'].result_list}, {self.milk.pk})
+        self.assertEqual(self.client.get(reverse('admin:inventory_site_changelist')).status_code, 403)
+        response = self.client.get(reverse('admin:inventory_item_change', args=[self.milk.pk]))
+        self.assertNotIn('site', response.context['adminform'].form.fields)
+
+    def test_import_into_a_site(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('name,quantity\nMilk,5\nTea,1\n')
+        self.addCleanup(os.remove, f.name)
+        call_command('import_inventory', 'items', f.name, site='cabin.example', stdout=StringIO())
+        self.cabin_milk.refresh_from_db()
+        self.milk.refresh_from_db()
+        self.assertEqual((self.milk.quantity, self.cabin_milk.quantity), (2, 5))
+        self.assertEqual(Item.objects.get(name='Tea').site_id, self.cabin.pk)
+        self.assertEqual(counters.verify(), {})
+        with self.assertRaises(CommandError):
+            call_command('import_inventory', 'items', f.name, site='nowhere.example')
+
+
+class ReplicaTests(TransactionTestCase):
+    """The list pages against a real replica file, copied from the test database by replica.sync()."""
+    # Keeps the default site the data migration creates
+    serialized_rollback = True
+    # Resolved when the class is set up, so it takes in the replica alias
+    # added below: queries to an alias left out are refused. Naming it here
+    # instead would have the runner look for it (and fail) before any test runs.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # Added before the test case resolves its databases. The runner has no
+        # test database for it: it points at a scratch file sync() fills
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.settings[replica.ALIAS] = {**connections.settings['default'], 'NAME': cls.replica_path}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[replica.ALIAS].close()
+        del connections[replica.ALIAS]
+        del connections.settings[replica.ALIAS]
+        os.remove(cls.replica_path)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.milk = Item.objects.create(name='Milk', quantity=1)
+        replica.sync()
+        self.tea = Item.objects.create(name='Tea', quantity=1)
+
+    def names(self, response):
+        return [item.name for item in response.context['items']]
+
+    def test_lists_read_the_replica_as_of_the_last_copy(self):
+        url = reverse('inventory:inventory_list')
+        self.assertEqual(self.names(self.client.get(url)), ['Milk'])
+        export_rows = b''.join(self.client.get(reverse('inventory:export', args=['items', 'csv'])).streaming_content)
+        self.assertNotIn(b'Tea', export_rows)
+        # Pages elsewhere read the primary
+        self.assertContains(self.client.get(reverse('inventory:update_stock', args=[self.tea.pk])), 'Tea')
+
+        replica.sync()
+        self.assertEqual(self.names(self.client.get(url)), ['Milk', 'Tea'])
+
+    def test_browsers_read_their_own_writes(self):
+        url = reverse('inventory:inventory_list')
+        response = self.client.post(reverse('inventory:toggle_open', args=[self.tea.pk]))
+        self.assertIn(replica.STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.names(self.client.get(url)), ['Milk', 'Tea'])
+        # Other browsers still get the replica's copy
+        self.assertEqual(self.names(Client().get(url)), ['Milk'])
+
+    def test_writes_go_to_the_primary(self):
+        with replica.reads_for(RequestFactory().get('/')):
+            self.assertTrue(replica.active())
+            milk = Item.objects.get(pk=self.milk.pk)
+            self.assertEqual(milk._state.db, replica.ALIAS)
+            milk.quantity = 5
+            milk.save()
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.quantity, 5)
+
+    def test_sync_command(self):
+        out = StringIO()
+        call_command('sync_replica', once=True, stdout=out)
+        self.assertIn('Copied the database to the replica', out.getvalue())
+        self.assertEqual(Item.objects.using(replica.ALIAS).count(), 2)
+
+
+class FixedPointTests(TestCase):
+    def setUp(self):
+        self.item = Item.objects.create(name='Flour', quantity=Decimal('1.25'), quantity_needed=0)
+        self.barcode = Barcode.objects.create(code='444', item=self.item, quantity=Decimal('0.35'))
+
+    def stored(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT quantity, quantity_needed FROM {Item._meta.db_table} WHERE id = %s",
+                           [self.item.pk])
+            return cursor.fetchone()
+
+    def test_quantities_are_stored_as_hundredths(self):
+        self.assertEqual(self.stored(), (125, 0))
+        item = Item.objects.get(pk=self.item.pk)
+        self.assertEqual(item.quantity, Decimal('1.25'))
+        self.assertEqual(str(item.quantity), '1.25')
+        self.assertEqual(Barcode.objects.values_list('quantity', flat=True).get(), Decimal('0.35'))
+        self.assertTrue(Item.objects.filter(quantity__gt=Decimal('1.2')).exists())
+
+    def test_updates_scale_their_literals(self):
+        stock.add_stock(self.item.pk, Decimal('0.5'))
+        stock.open_package(self.item.pk)
+        self.assertEqual(self.stored(), (175, 100))
+        stock.remove_stock(self.item.pk, Decimal('0.75'))
+        stock.purchase(self.item.pk, 2)
+        self.assertEqual(self.stored(), (300, 0))
+        stock.apply_scan_batch([('444', 'remove'), ('444', 'remove'), ('444', 'add')])
+        self.assertEqual(self.stored(), (265, 65))
+
+    def test_ledger_adds_up_in_hundredths(self):
+        ledger.take_snapshot()
+        stock.apply_scan_batch([('444', 'add')] * 3)
+        state = ledger.state_at(item_ids=[self.item.pk])[self.item.pk]
+        self.assertEqual(state['quantity'], Decimal('2.30'))
+        self.assertEqual(state['quantity_needed'], 0)
+        self.assertEqual(ledger.verify(), {})
@@ -1,13 +1,22 @@
 # inventory/urls.py
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# ASGI deployments (ASYNC_VIEWS on) serve the busiest pages with the async views
+hot_views = async_views if settings.ASYNC_VIEWS else views
 
 app_name = 'inventory'
 
 urlpatterns = [
     # List views
-    path('', views.inventory_list, name='inventory_list'),
-    path('shopping/', views.shopping_list, name='shopping_list'),
+    path('', hot_views.inventory_list, name='inventory_list'),
+    path('shopping/', hot_views.shopping_list, name='shopping_list'),
+    # Live updates for open list pages (long poll)
+    path('changes/', hot_views.item_changes, name='item_changes'),
+
+    # Search (and typeahead suggestions)
+    path('search/', views.search_items, name='search'),
 
     # Item Creation
     path('add/', views.add_item, name='add_item'),
@@ -21,12 +30,21 @@ urlpatterns = [
     path('remove_needed/<int:item_id>/', views.remove_from_shopping_list, name='remove_from_shopping_list'),
     path('toggle_open/<int:item_id>/', views.toggle_open_status, name='toggle_open'),
     path('delete/<int:item_id>/', views.delete_item, name='delete_item'),
+    # Several items at once, selected on a list page
+    path('bulk/', views.bulk_action, name='bulk_action'),
     
     # Barcode functionality
     path('barcodes/', views.barcode_list, name='barcode_list'),
     path('barcodes/add/', views.add_barcode, name='add_barcode'),
     path('barcodes/edit/<int:barcode_id>/', views.edit_barcode, name='edit_barcode'),
     path('barcodes/delete/<int:barcode_id>/', views.delete_barcode, name='delete_barcode'),
-    path('scan/', views.scan_barcode, name='scan_barcode'),
+    path('scan/', hot_views.scan_barcode, name='scan_barcode'),
+    path('scan/batch/', views.scan_batch, name='scan_batch'),
+    # The scan page's offline queue
+    path('scan/sync/', views.scan_sync, name='scan_sync'),
+    path('scan/cache/', views.barcode_cache_stats, name='barcode_cache_stats'),
     path('item/<int:item_id>/edit/', views.edit_item, name='edit_item'),
+
+    # Streaming exports, e.g. export/shopping.csv or export/barcodes.ndjson
+    path('export/<slug:dataset>.<slug:fmt>', views.export_data, name='export'),
 ]
@@ -1,33 +1,164 @@
 # inventory/views.py
+import hashlib
+import json
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.urls import reverse
-from django.http import HttpResponseNotAllowed
-from django.db.models import F, Q # Import F and Q for database operations
+from django.utils.crypto import constant_time_compare
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.utils.safestring import mark_safe
+from django.views.decorators.csrf import csrf_exempt
 from .models import Item, Barcode
 # Import the forms you just defined
-from .forms import ItemForm, AddToShoppingListForm, PurchaseForm, QuantityUpdateForm, BarcodeForm, BarcodeScanForm
+from .forms import ItemForm, AddToShoppingListForm, PurchaseForm, QuantityUpdateForm, BarcodeForm, BarcodeScanForm, BulkActionForm
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from . import counters, export, metrics, search, sites
+from .replica import lag, replica_reads
+from .barcode_cache import barcode_cache
+from .feed import change_feed
+from .pagination import keyset_paginate, wants_partial
+from .stock import (apply_scan, apply_scan_batch, purchase, scan_message, sync_scans, MAX_SCAN_BATCH, SCAN_ACTIONS,
+                    clear_needed, delete_items, move_items, purchase_needed)
 
+def render_list(request, queryset, key, rows_name, template, rows_template, context):
+    """Renders one keyset page of a list view, or just its rows for a "load more" request."""
+    page = keyset_paginate(request, queryset, key)
+    return render_page(request, page, rows_name, template, rows_template, context)
+
+def render_page(request, page, rows_name, template, rows_template, context):
+    context.update({rows_name: page, 'page': page})
+    if wants_partial(request):
+        response = render(request, rows_template, context)
+        if page.has_next:
+            response['X-Next-Page'] = page.next_url
+        return response
+    return render(request, template, context)
+
+def list_validators(request, versions, keys):
+    """
+    (ETag, Last-Modified timestamp) of a list page, from the version counters
+    `keys` of the tables it shows. Nothing else is read, so a 304 costs one
+    query on the counter table.
+    """
+    stamps = [versions.get(key, 0) for key in keys]
+    # The feed instance too: a page kept from before a restart has a dead feed cursor.
+    # And the site, whose versions are its own (the path is the same on every site)
+    tag = hashlib.md5(
+        f'{request.site_id}|{request.get_full_path()}|{stamps}|{change_feed.instance}'.encode()
+    ).hexdigest()
+    return f'"{tag}"', max(stamps) // 1_000_000
+
+def not_modified(request, validators):
+    """The 304 response to a conditional GET whose copy is still current, else None."""
+    # A pending flash message must be rendered, so such requests always get the page
+    if request.method != 'GET' or 'messages' in request.COOKIES:
+        return None
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, validators)
+    return response
+
+def set_validators(response, validators):
+    etag, last_modified = validators
+    response.headers.setdefault('ETag', etag)
+    response.headers.setdefault('Last-Modified', http_date(last_modified))
+    # Revalidated on every load; the page (CSRF tokens, messages) is per visitor
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+@replica_reads
 def inventory_list(request):
     # Show items physically present (sealed quantity > 0 OR an open unit exists)
-    items_in_stock = Item.objects.filter(Q(quantity__gt=0) | Q(is_open=True)).order_by('name') # Explicit ordering
+    values = counters.snapshot()
+    validators = list_validators(request, values, [counters.ITEMS_VERSION])
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    # Only the columns the rows show, as ItemRow objects rather than model instances
+    items_in_stock = Item.objects.in_stock().rows()
     context = {
-        'items': items_in_stock,
         'page_title': 'Items in Inventory',
-        'list_type': 'inventory'
+        'list_type': 'inventory',
+        # Taken before the rows are read, so the page misses no later change
+        # (nor any the replica has yet to copy)
+        'feed_cursor': change_feed.cursor(lag()),
+        'totals': counters.totals_from(values),
     }
-    return render(request, 'inventory/item_list.html', context)
+    return set_validators(render_list(request, items_in_stock, 'name', 'items',
+                                      'inventory/item_list.html', 'inventory/item_rows.html', context), validators)
 
+@replica_reads
 def shopping_list(request):
     # Show items with quantity_needed > 0
-    items_needed = Item.objects.filter(quantity_needed__gt=0).order_by('name') # Explicit ordering
+    values = counters.snapshot()
+    validators = list_validators(request, values, [counters.ITEMS_VERSION])
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    items_needed = Item.objects.needed().rows()
     context = {
-        'items': items_needed,
         'page_title': 'Shopping List',
-        'list_type': 'shopping'
+        'list_type': 'shopping',
+        'feed_cursor': change_feed.cursor(lag()),
+        'totals': counters.totals_from(values),
     }
-    return render(request, 'inventory/item_list.html', context)
+    return set_validators(render_list(request, items_needed, 'name', 'items',
+                                      'inventory/item_list.html', 'inventory/item_rows.html', context), validators)
+
+# The list pages the change feed can serve, by list_type
+FEED_LISTS = {
+    'inventory': lambda: Item.objects.in_stock().rows(),
+    'shopping': lambda: Item.objects.needed().rows(),
+}
+
+def feed_request(request):
+    """The list type and wait (?timeout=, at most FEED_TIMEOUT seconds) of an item_changes request."""
+    list_type = request.GET.get('list')
+    if list_type not in FEED_LISTS:
+        raise Http404(f"No list {list_type}")
+    limit = getattr(settings, 'FEED_TIMEOUT', 25)
+    try:
+        timeout = min(max(float(request.GET.get('timeout', limit)), 0), limit)
+    except ValueError:
+        timeout = limit
+    return list_type, timeout
+
+def changed_rows(request, list_type, cursor, item_ids, items, totals):
+    """The item_changes response: each changed row re-rendered, or None if it left the list."""
+    rows = dict.fromkeys(item_ids)
+    for item in items:
+        rows[item.pk] = render_to_string('inventory/item_rows.html', {'items': [item], 'list_type': list_type}, request)
+    return JsonResponse({
+        'cursor': cursor,
+        'rows': rows,
+        'totals': render_to_string('inventory/totals.html', {'totals': totals}),
+    })
+
+def item_changes(request):
+    """
+    Poll endpoint behind the live list pages: returns just the rows of the
+    items changed after ?cursor=. Unlike the async view it never waits for a
+    change, as that would hold a worker thread per open page; the 'wait' in
+    the response tells the page when to ask again.
+    """
+    list_type, _ = feed_request(request)
+    cursor, item_ids = change_feed.changes_since(request.GET.get('cursor'))
+    wait = getattr(settings, 'FEED_POLL_SECONDS', 5)
+    if item_ids is None:
+        return JsonResponse({'cursor': cursor, 'reset': True})
+    if not item_ids:
+        return JsonResponse({'cursor': cursor, 'rows': {}, 'wait': wait})
+    items = FEED_LISTS[list_type]().filter(pk__in=item_ids)
+    # Asked again at once: more changes may have come in meanwhile
+    return changed_rows(request, list_type, cursor, item_ids, items, counters.totals())
 
 def add_item(request):
     # Handles initial creation of an item
@@ -96,12 +227,9 @@ def mark_purchased(request, item_id):
     if request.method == 'POST':
         form = PurchaseForm(request.POST)
         if form.is_valid():
-            purchased_qty = form.cleaned_data['quantity_purchased']
-            # Add purchased amount to the sealed quantity using F expression for safety
-            item.quantity = F('quantity') + purchased_qty
-            # Remove from shopping list
-            item.quantity_needed = 0
-            item.save()
+            # Add purchased amount to the sealed quantity and remove from shopping list
+            # in one UPDATE, so a scan landing in between is not overwritten
+            purchase(item.pk, form.cleaned_data['quantity_purchased'])
             return redirect('inventory:shopping_list') # Back to shopping list
     else: # GET request
         # Pre-fill form with the amount that was needed
@@ -176,6 +304,32 @@ def delete_item(request, item_id):
      else:
          return HttpResponseNotAllowed(['POST'])
 
+def bulk_action(request):
+    """
+    Applies one action to the items selected on a list page, as one
+    set-based update (see the bulk actions in inventory/stock.py).
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    back = 'inventory:shopping_list' if request.POST.get('list_type') == 'shopping' else 'inventory:inventory_list'
+    form = BulkActionForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, ' '.join(error for errors in form.errors.values() for error in errors))
+        return redirect(back)
+
+    action, item_ids = form.cleaned_data['action'], form.cleaned_data['items']
+    if action == 'purchase':
+        message = f"Purchased {purchase_needed(item_ids)} items"
+    elif action == 'clear':
+        message = f"Removed {clear_needed(item_ids)} items from the shopping list"
+    elif action == 'move':
+        location = form.cleaned_data['location'] or None
+        message = f"Moved {move_items(item_ids, location)} items to {location or 'no location'}"
+    else:
+        message = f"Deleted {delete_items(item_ids)} items"
+    messages.success(request, message)
+    return redirect(back)
+
 def edit_item(request, item_id):
     """View to edit an item's details including location."""
     item = get_object_or_404(Item, pk=item_id)
@@ -202,14 +356,48 @@ def edit_item(request, item_id):
     }
     return render(request, 'inventory/item_form.html', context)
 
+# Results on the search page, and suggestions per typeahead request
+SEARCH_RESULTS = 50
+TYPEAHEAD_RESULTS = 8
+
+def search_items(request):
+    """Search page over item names, locations and barcodes; ?typeahead=1 returns JSON suggestions."""
+    query = request.GET.get('q', '').strip()
+    if request.GET.get('typeahead') == '1':
+        # Answered from the search index alone, without loading the items
+        matches = search.search(query, TYPEAHEAD_RESULTS) if len(query) >= search.MIN_TYPEAHEAD_LENGTH else []
+        return JsonResponse({'results': [
+            {'id': item_id, 'name': name, 'location': location,
+             'url': reverse('inventory:update_stock', args=[item_id])}
+            for item_id, name, location in matches
+        ]})
+    matches = search.search(query, SEARCH_RESULTS)
+    found = Item.objects.filter(pk__in=[item_id for item_id, name, location in matches]).rows()
+    items = {row.id: row for row in found}
+    context = {
+        'page_title': 'Search',
+        'query': query,
+        'list_type': 'search',
+        'items': [items[item_id] for item_id, name, location in matches if item_id in items],
+    }
+    return render(request, 'inventory/search.html', context)
+
+@replica_reads
 def barcode_list(request):
     """View to display all barcodes."""
-    barcodes = Barcode.objects.all().order_by('code')
+    # The rows show item columns too, so an item edit changes the page
+    validators = list_validators(request, counters.versions(*counters.VERSIONS), counters.VERSIONS)
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    # Join the item columns the table shows instead of loading each item per row
+    barcodes = (Barcode.objects.select_related('item')
+                .only('code', 'quantity', 'description', 'item__name', 'item__unit'))
     context = {
-        'barcodes': barcodes,
         'page_title': 'Manage Barcodes'
     }
-    return render(request, 'inventory/barcode_list.html', context)
+    return set_validators(render_list(request, barcodes, 'code', 'barcodes',
+                                      'inventory/barcode_list.html', 'inventory/barcode_rows.html', context), validators)
 
 def add_barcode(request):
     """View to add a new barcode."""
@@ -253,72 +441,57 @@ def delete_barcode(request, barcode_id):
     else:
         return HttpResponseNotAllowed(['POST'])
 
+def recent_scans():
+    """The 5 most recent barcodes, with the item columns the scan page shows joined in."""
+    return (Barcode.objects.select_related('item')
+            .only('code', 'quantity', 'item__name', 'item__unit', 'item__location')
+            .order_by('-id')[:5])
+
+def rescan(barcode_value, action):
+    """
+    Retries an 'add' or 'open' scan whose UPDATE matched no row. Those can only
+    fail when the cached barcode or its item was deleted (by another process,
+    whose deletions a per-process cache does not hear of), so the entry is
+    dropped and the code resolved again. Returns (barcode, applied).
+    """
+    barcode_cache.invalidate(sites.current(), barcode_value)
+    barcode = barcode_cache.resolve(barcode_value)
+    return barcode, barcode is not None and apply_scan(barcode, action)
+
+def report_scan(request, barcode_value, barcode, action, applied):
+    """Flashes the outcome of a scan (`barcode` is None for an unknown code)."""
+    if barcode is None:
+        messages.error(request, f"Barcode {barcode_value} not found. Please add it first.")
+    elif applied:
+        base_msg = scan_message(action, barcode.quantity, barcode.name, barcode.unit)
+
+        # Add location info if available and send message with appropriate class
+        if barcode.location:
+            full_msg = f"{base_msg}<span class='location-section'>Store in: {barcode.location}</span>"
+            messages.success(request, mark_safe(full_msg))
+        else:
+            messages.success(request, base_msg)
+    elif action == 'remove':
+        messages.error(request, f"Not enough {barcode.name} in inventory to remove")
+    else:
+        messages.error(request, f"Could not update {barcode.name}. Please scan again.")
+
 def scan_barcode(request):
     """View to scan and process barcodes."""
-    recent_scans = Barcode.objects.all().order_by('-id')[:5]  # Show 5 most recent barcodes
-    
     if request.method == 'POST':
         form = BarcodeScanForm(request.POST)
         if form.is_valid():
             barcode_value = form.cleaned_data['barcode']
             action = form.cleaned_data['action']
             
-            try:
-                barcode = Barcode.objects.get(code=barcode_value)
-                item = barcode.item
-                
-                # Create base message without location info
-                if action == 'add':
-                    # Add to inventory and decrease shopping list (never below zero)
-                    item.quantity = F('quantity') + barcode.quantity
-                    
-                    # If item is on shopping list, decrease needed quantity (but never below zero)
-                    if item.quantity_needed > 0:
-                        # We need to refresh from DB to get current values before comparing
-                        item.save()
-                        item.refresh_from_db()
-                        
-                        # Calculate new needed quantity (never below zero)
-                        new_needed = max(0, item.quantity_needed - barcode.quantity)
-                        item.quantity_needed = new_needed
-                        item.save()
-                        
-                        base_msg = f"Added {barcode.quantity} {item.unit or ''} of {item.name} to inventory and updated shopping list"
-                    else:
-                        item.save()
-                        base_msg = f"Added {barcode.quantity} {item.unit or ''} of {item.name} to inventory"
-                
-                elif action == 'remove':
-                    # Remove from inventory and add to shopping list if not already there
-                    if item.quantity >= barcode.quantity:
-                        item.quantity = F('quantity') - barcode.quantity
-                        
-                        # If not on shopping list, add it with quantity 1
-                        if item.quantity_needed == 0:
-                            item.quantity_needed = 1
-                            
-                        item.save()
-                        base_msg = f"Removed {barcode.quantity} {item.unit or ''} of {item.name} from inventory and updated shopping list"
-                    else:
-                        messages.error(request, f"Not enough {item.name} in inventory to remove")
-                
-                elif action == 'open':
-                    # Mark a package as open and increase shopping list quantity
-                    item.is_open = True
-                    item.quantity_needed = F('quantity_needed') + 1
-                    item.save()
-                    base_msg = f"Marked {item.name} as open and added to shopping list"
-                
-                # Add location info if available and send message with appropriate class
-                if item.location:
-                    full_msg = f"{base_msg}<span class='location-section'>Store in: {item.location}</span>"
-                    messages.success(request, mark_safe(full_msg))
-                else:
-                    messages.success(request, base_msg)
-                
-            except Barcode.DoesNotExist:
-                messages.error(request, f"Barcode {barcode_value} not found. Please add it first.")
-            
+            # Resolved from the barcode cache, so a scan is normally a single UPDATE
+            barcode = barcode_cache.resolve(barcode_value)
+            # Each action is a single conditional UPDATE against the current row
+            applied = barcode is not None and apply_scan(barcode, action)
+            if barcode is not None and not applied and action != 'remove':
+                barcode, applied = rescan(barcode_value, action)
+            report_scan(request, barcode_value, barcode, action, applied)
+
             # Return a new form with the same action selected
             form = BarcodeScanForm(initial={'action': action})
     else:
@@ -326,7 +499,137 @@ def scan_barcode(request):
     
     context = {
         'form': form,
-        'recent_scans': recent_scans,
+        'recent_scans': recent_scans(),
         'page_title': 'Scan Barcode'
     }
     return render(request, 'inventory/scan_barcode.html', context)
+
+
+def has_scan_token(request):
+    """Whether the request carries one of the SCAN_API_TOKENS as "Authorization: Bearer <token>"."""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and any(constant_time_compare(token, known)
+                                              for known in settings.SCAN_API_TOKENS)
+
+
+@csrf_exempt
+def scan_batch(request):
+    """
+    Bulk scan API for scanner stations.
+
+    Stations are not browsers, so instead of a session and CSRF token they send
+    one of the SCAN_API_TOKENS as "Authorization: Bearer <token>".
+    Expects a JSON body of the form {"events": [{"code": "...", "action": "add"}, ...]}
+    (each event may also be a [code, action] pair) and answers with one result per event.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    if not has_scan_token(request):
+        response = JsonResponse({'error': 'Send a scan API token as "Authorization: Bearer <token>"'}, status=401)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+
+    try:
+        payload = json.loads(request.body)
+        events = [
+            (event['code'], event['action']) if isinstance(event, dict) else tuple(event)
+            for event in payload['events']
+        ]
+        if any(len(event) != 2 for event in events):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"events": [{"code": ..., "action": ...}, ...]}'}, status=400)
+
+    if len(events) > MAX_SCAN_BATCH:
+        return JsonResponse({'error': f'At most {MAX_SCAN_BATCH} events per batch'}, status=400)
+
+    results = apply_scan_batch([(str(code), action) for code, action in events])
+    applied = sum(1 for result in results if result['status'] == 'ok')
+    return JsonResponse({
+        'applied': applied,
+        'failed': len(results) - applied,
+        'results': results,
+    })
+
+
+def read_synced_scan(entry):
+    """
+    One scan of a sync request as a dict for stock.sync_scans(), with an
+    'error' message (or None): a bad scan is reported as invalid on its own
+    rather than failing the whole batch.
+    """
+    if not isinstance(entry, dict):
+        entry = {}
+    key, code, action = (str(entry.get(name, '')) for name in ('key', 'code', 'action'))
+    try:
+        scanned = parse_datetime(entry.get('scanned'))
+    except (ValueError, TypeError):
+        scanned = None
+    if scanned is not None and timezone.is_naive(scanned):
+        scanned = timezone.make_aware(scanned)
+    scan = {'key': key if 0 < len(key) <= 64 else None, 'code': code, 'action': action, 'scanned': scanned,
+            'error': None}
+    if scan['key'] is None:
+        scan['error'] = "Missing or invalid scan key"
+    elif not code:
+        scan['error'] = "Missing barcode"
+    elif len(code) > 100:
+        scan['error'] = "Barcode longer than 100 characters"
+    elif action not in SCAN_ACTIONS:
+        scan['error'] = f"Unknown action '{action[:20]}'"
+    elif scanned is None:
+        scan['error'] = "Missing or invalid scan time"
+    return scan
+
+
+def scan_sync(request):
+    """
+    Sync API for the scan page's offline queue.
+
+    Expects a JSON body of the form {"scans": [{"key": "...", "code": "...", "action": "add",
+    "scanned": "<ISO 8601 time>"}, ...]}, `key` being unique to the scan, and answers with one
+    result per scan (a malformed scan gets an 'invalid' one). Sending the same scans again is
+    safe: see stock.sync_scans().
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        payload = json.loads(request.body)
+        entries = payload['scans']
+        if not isinstance(entries, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"scans": [{"key": ..., "code": ..., "action": ..., '
+                                      '"scanned": ...}, ...]}'}, status=400)
+
+    if len(entries) > MAX_SCAN_BATCH:
+        return JsonResponse({'error': f'At most {MAX_SCAN_BATCH} scans per batch'}, status=400)
+
+    results = sync_scans([read_synced_scan(entry) for entry in entries])
+    return JsonResponse({
+        'applied': sum(1 for result in results if result['status'] == 'ok' and not result['replayed']),
+        'results': results,
+    })
+
+
+@staff_member_required
+def barcode_cache_stats(request):
+    """Hit/miss counters of this process's barcode cache."""
+    return JsonResponse(barcode_cache.stats())
+
+
+@staff_member_required
+def request_metrics(request):
+    """Per-view request metrics of this process, in the Prometheus text format."""
+    return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@replica_reads
+def export_data(request, dataset, fmt):
+    """Streams items (all, in stock or on the shopping list) or barcodes as CSV or NDJSON."""
+    if dataset not in export.DATASETS or fmt not in export.STREAMS:
+        raise Http404(f"No export {dataset}.{fmt}")
+    response = StreamingHttpResponse(export.STREAMS[fmt](dataset), content_type=export.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
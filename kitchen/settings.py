@@ -49,12 +49,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack (inventory/metrics.py)
+    "inventory.metrics.MetricsMiddleware",
+    # Activates the site of the request's host (inventory/sites.py)
+    "inventory.sites.SiteMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    # Keeps browsers that just wrote off the read replica (inventory/replica.py)
+    "inventory.replica.ReplicaMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django_browser_reload.middleware.BrowserReloadMiddleware",
 ]
@@ -65,7 +71,8 @@ ROOT_URLCONF = "kitchen.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates, plus render timing for the request metrics
+        "BACKEND": "inventory.metrics.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "kitchen" / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -85,13 +92,121 @@ WSGI_APPLICATION = "kitchen.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# SQLITE_PROFILE=production switches SQLite to write-ahead logging (readers no
+# longer wait for writers), waits for a busy database instead of failing with
+# "database is locked", and keeps connections open between requests. The
+# PRAGMAs are applied to each new connection by inventory/sqlite.py;
+# `manage.py bench_sqlite` compares the profiles.
+SQLITE_PROFILES = {
+    "default": {},
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+    },
+}
+SQLITE_PROFILE = config("SQLITE_PROFILE", default="default")
+SQLITE_PRAGMAS = SQLITE_PROFILES[SQLITE_PROFILE]
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": config(
+            "CONN_MAX_AGE", default=600 if SQLITE_PROFILE == "production" else 0, cast=int
+        ),
+        "CONN_HEALTH_CHECKS": SQLITE_PROFILE == "production",
     }
 }
 
+# Read replica (inventory/replica.py): set REPLICA_DB to a second SQLite file
+# and run `manage.py sync_replica`, which copies the primary into it every
+# REPLICA_SYNC_SECONDS; the list pages and exports then read from it.
+# REPLICA_LAG_SECONDS is how far behind it is taken to be at most: a browser
+# reads from the primary for that long after writing. Leave REPLICA_DB unset
+# to run the tests, which set up a replica of their own where they need one.
+REPLICA_DB = config("REPLICA_DB", default="")
+REPLICA_SYNC_SECONDS = config("REPLICA_SYNC_SECONDS", default=5, cast=float)
+REPLICA_LAG_SECONDS = config("REPLICA_LAG_SECONDS", default=15, cast=float)
+if REPLICA_DB:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": REPLICA_DB,
+        # No test database of its own
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["inventory.replica.ReplicaRouter"]
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Shared between worker processes on the same host
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "kitchen" / "cache",
+    },
+    # Rendered list rows; stale versions of a row are never read again and
+    # age out by TIMEOUT or culling
+    "rows": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "inventory-rows",
+        "TIMEOUT": 24 * 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 50000},
+    },
+}
+
+# Barcode lookups made by the scan views (inventory/barcode_cache.py).
+# Leave BARCODE_CACHE_ALIAS empty for a per-process LRU, or set it to a CACHES
+# alias such as "shared" when running several worker processes.
+BARCODE_CACHE_SIZE = config("BARCODE_CACHE_SIZE", default=50000, cast=int)
+BARCODE_CACHE_ALIAS = config("BARCODE_CACHE_ALIAS", default="")
+
+# Rendered rows of the inventory and shopping lists (inventory/fragments.py).
+# Set ROW_CACHE_ALIAS to "shared" to share them between worker processes, or
+# to an empty value to render every row on every request.
+ROW_CACHE_ALIAS = config("ROW_CACHE_ALIAS", default="rows")
+
+
+# Rows per page on the inventory, shopping and barcode lists (?page_size= can
+# ask for a different size up to the maximum)
+LIST_PAGE_SIZE = config("LIST_PAGE_SIZE", default=100, cast=int)
+LIST_MAX_PAGE_SIZE = config("LIST_MAX_PAGE_SIZE", default=500, cast=int)
+
+# Bearer tokens accepted by the scan batch API (/inventory/scan/batch/), comma
+# separated. Scanner stations send "Authorization: Bearer <token>" instead of
+# a CSRF token; with none set the API refuses every request.
+SCAN_API_TOKENS = [token for token in config("SCAN_API_TOKENS", default="").split(",") if token]
+
+# Live updates of the open list pages (inventory/feed.py). The change feed
+# lives in the memory of one server process: pages only hear of the writes
+# made through the process answering them, so run a single (threaded or ASGI)
+# process for live updates.
+# With ASYNC_VIEWS an open page's request for changes is held open for up to
+# FEED_TIMEOUT seconds on the event loop. The sync view would hold a worker
+# thread that long per open page, so it answers at once and the page asks
+# again after FEED_POLL_SECONDS.
+FEED_TIMEOUT = config("FEED_TIMEOUT", default=25, cast=int)
+FEED_POLL_SECONDS = config("FEED_POLL_SECONDS", default=5, cast=int)
+
+
+# Serve the inventory, shopping and scan pages with the async views in
+# inventory/async_views.py. Turn on when running under ASGI (kitchen/asgi.py);
+# under WSGI the sync views avoid an event loop per request.
+ASYNC_VIEWS = config("ASYNC_VIEWS", default=False, cast=bool)
+
+
+# Requests slower than this many milliseconds are logged with their SQL to the
+# "inventory.metrics" logger (0 turns the slow-request log off)
+SLOW_REQUEST_MS = config("SLOW_REQUEST_MS", default=0, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
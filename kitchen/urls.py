@@ -22,11 +22,14 @@ from django.conf.urls.static import static
 from django.shortcuts import redirect # Import redirect
 
 from kitchen.core import views as core_views
+from inventory import views as inventory_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     # Include inventory URLs under the 'inventory/' path
     path('inventory/', include('inventory.urls', namespace='inventory')),
+    # Request metrics for Prometheus (staff only)
+    path('metrics', inventory_views.request_metrics, name='metrics'),
     # Add django_browser_reload URLs
     path("__reload__/", include("django_browser_reload.urls")),
     # Redirect the root URL to the inventory list